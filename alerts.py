@@ -0,0 +1,195 @@
+import bisect
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from prices import ASSOCIATION_SOURCE, PRODUCTS, SIDES
+
+# ==============================================================================
+# PRICE ALERT ENGINE (แจ้งเตือนเมื่อราคาผ่านเกณฑ์ที่ผู้ใช้ตั้งไว้)
+# ==============================================================================
+DIRECTIONS = ("above", "below")
+
+# (source, product, side) เช่น ("goldtraders", "gold_bar_965", "sell")
+FeedKey = Tuple[str, str, str]
+
+
+@dataclass(slots=True)
+class Alert:
+    id: int
+    token: str          # FCM registration token ของเครื่องผู้ใช้
+    source: str         # "goldtraders" หรือชื่อร้าน (เช่น "Hua Seng Heng")
+    product: str
+    side: str
+    direction: str      # "above" = ราคาขึ้นทะลุ, "below" = ราคาลงต่ำกว่า
+    threshold: float
+
+    @property
+    def feed(self) -> FeedKey:
+        return (self.source, self.product, self.side)
+
+    def to_record(self) -> List[Any]:
+        """รูปแบบกะทัดรัดสำหรับเก็บลง state store"""
+        return [self.token, self.source, self.product, self.side, self.direction, self.threshold]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "source": self.source,
+            "product": self.product,
+            "side": self.side,
+            "direction": self.direction,
+            "threshold": self.threshold,
+        }
+
+
+class ThresholdIndex:
+    """
+    เก็บเกณฑ์ราคาแบบเรียงลำดับ (parallel sorted lists) ต่อ 1 feed + 1 direction
+    - ค้นหาช่วงราคาที่ถูกข้ามด้วย bisect: O(log n + k)
+    """
+    __slots__ = ("prices", "ids")
+
+    def __init__(self):
+        self.prices: List[float] = []
+        self.ids: List[int] = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, price: float, alert_id: int):
+        pos = bisect.bisect_right(self.prices, price)
+        self.prices.insert(pos, price)
+        self.ids.insert(pos, alert_id)
+
+    def remove(self, price: float, alert_id: int) -> bool:
+        lo = bisect.bisect_left(self.prices, price)
+        hi = bisect.bisect_right(self.prices, price)
+        for pos in range(lo, hi):
+            if self.ids[pos] == alert_id:
+                del self.prices[pos]
+                del self.ids[pos]
+                return True
+        return False
+
+    def pop_range(self, lo: int, hi: int) -> List[int]:
+        # ตัดทั้งช่วงทีเดียว (1 memmove) แทนการลบทีละตัว
+        matched = self.ids[lo:hi]
+        del self.prices[lo:hi]
+        del self.ids[lo:hi]
+        return matched
+
+    def pop_crossed_upward(self, old: float, new: float) -> List[int]:
+        """เกณฑ์ในช่วง [old, new) -> ราคาขึ้นจาก <= เกณฑ์ ไปเป็น > เกณฑ์"""
+        return self.pop_range(bisect.bisect_left(self.prices, old), bisect.bisect_left(self.prices, new))
+
+    def pop_crossed_downward(self, old: float, new: float) -> List[int]:
+        """เกณฑ์ในช่วง (new, old] -> ราคาลงจาก >= เกณฑ์ ไปเป็น < เกณฑ์"""
+        return self.pop_range(bisect.bisect_right(self.prices, new), bisect.bisect_right(self.prices, old))
+
+
+class AlertEngine:
+    """
+    Subscription store + matching engine
+    - on_tick(feed, price): เทียบราคาเดิม (A) กับราคาใหม่ (B) แล้วคืน alert ที่ถูกข้าม
+    - Alert เป็นแบบ one-shot: ยิงแล้วลบออกทันที (กันแจ้งเตือนซ้ำเวลาราคาแกว่ง)
+    """
+
+    def __init__(self, max_alerts_per_token: int = 50):
+        self.max_alerts_per_token = max_alerts_per_token
+        self._alerts: Dict[int, Alert] = {}
+        self._by_token: Dict[str, Set[int]] = {}
+        self._indexes: Dict[Tuple[FeedKey, str], ThresholdIndex] = {}
+        self._last_prices: Dict[FeedKey, float] = {}
+        self._next_id = 1
+
+    def __len__(self):
+        return len(self._alerts)
+
+    # --- Subscription Store ---
+    def validate(self, source: str, product: str, side: str, direction: str, threshold: float) -> Optional[str]:
+        if product not in PRODUCTS:
+            return f"Unknown product '{product}' (expected one of {', '.join(PRODUCTS)})"
+        if side not in SIDES:
+            return f"Unknown side '{side}' (expected buy/sell)"
+        if direction not in DIRECTIONS:
+            return f"Unknown direction '{direction}' (expected above/below)"
+        if not source:
+            return "Source is required"
+        if threshold <= 0:
+            return "Threshold must be positive"
+        return None
+
+    def add(self, token: str, source: str, product: str, side: str, direction: str, threshold: float,
+            alert_id: Optional[int] = None) -> Alert:
+        """alert_id ใช้ตอน restore จาก state store เท่านั้น (ปกติจะออกเลขใหม่ให้)"""
+        owned = self._by_token.setdefault(token, set())
+        if alert_id is None and len(owned) >= self.max_alerts_per_token:
+            raise ValueError(f"Too many alerts for this device (max {self.max_alerts_per_token})")
+
+        if alert_id is None:
+            alert_id = self._next_id
+        self._next_id = max(self._next_id, alert_id + 1)
+
+        alert = Alert(alert_id, token, source or ASSOCIATION_SOURCE, product, side, direction, float(threshold))
+        self._alerts[alert.id] = alert
+        owned.add(alert.id)
+        self._index_for(alert.feed, alert.direction).add(alert.threshold, alert.id)
+        return alert
+
+    def remove(self, alert_id: int, token: Optional[str] = None) -> bool:
+        alert = self._alerts.get(alert_id)
+        if alert is None or (token is not None and alert.token != token):
+            return False
+        self._discard(alert)
+        return True
+
+    def list_for_token(self, token: str) -> List[Alert]:
+        return [self._alerts[i] for i in sorted(self._by_token.get(token, ()))]
+
+    def _index_for(self, feed: FeedKey, direction: str) -> ThresholdIndex:
+        key = (feed, direction)
+        index = self._indexes.get(key)
+        if index is None:
+            index = self._indexes[key] = ThresholdIndex()
+        return index
+
+    def _discard(self, alert: Alert, indexed: bool = True):
+        self._alerts.pop(alert.id, None)
+        owned = self._by_token.get(alert.token)
+        if owned is not None:
+            owned.discard(alert.id)
+            if not owned:
+                del self._by_token[alert.token]
+        if not indexed:
+            return
+        index = self._indexes.get((alert.feed, alert.direction))
+        if index is not None:
+            index.remove(alert.threshold, alert.id)
+
+    # --- Matching ---
+    def on_tick(self, feed: FeedKey, price: float) -> List[Tuple[Alert, float]]:
+        """บันทึกราคาใหม่ของ feed และคืน [(alert, price)] ที่ราคาวิ่งข้ามเกณฑ์"""
+        old = self._last_prices.get(feed)
+        self._last_prices[feed] = price
+        # รอบแรกยังไม่มีราคาเดิม -> ไม่ยิง (เหมือน logic ของ NOTIF_CACHE)
+        if old is None or old == price:
+            return []
+
+        if price > old:
+            index = self._indexes.get((feed, "above"))
+            matched_ids = index.pop_crossed_upward(old, price) if index else []
+        else:
+            index = self._indexes.get((feed, "below"))
+            matched_ids = index.pop_crossed_downward(old, price) if index else []
+
+        matches = [(self._alerts[alert_id], price) for alert_id in matched_ids]
+        for alert, _ in matches:
+            self._discard(alert, indexed=False)
+        return matches
+
+    def on_prices(self, source: str, prices: Dict[Tuple[str, str], float]) -> List[Tuple[Alert, float]]:
+        """ป้อนราคาทั้งชุดของ source เดียว (เช่น ผลจาก association_prices / shop_prices)"""
+        matches = []
+        for (product, side), price in prices.items():
+            matches.extend(self.on_tick((source, product, side), price))
+        return matches
@@ -0,0 +1,360 @@
+import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from history import parse_round, parse_thai_date
+from prices import association_prices, SIDES
+
+# ==============================================================================
+# ANALYTICS (OHLC / SMA / EMA / Volatility คำนวณฝั่ง Server แบบ incremental)
+# ==============================================================================
+BKK_OFFSET = 7 * 3600  # จัด bucket ตามเวลาไทย (เที่ยงคืนไทย = ขอบวัน)
+RESOLUTIONS = {"5m": 300, "15m": 900, "1h": 3600, "1d": 86400}
+EMA_SPANS = (5, 12, 26)
+SERIES_PRODUCTS = ("gold_bar_965", "ornament_965")  # ราคาจากสมาคมค้าทองคำ
+BKK_TZ = datetime.timezone(datetime.timedelta(hours=7))
+ROUND_SLOTS = 1000  # point key = ordinal ของวัน x ROUND_SLOTS + รอบที่ (รอบต่อวันไม่ถึง 1000)
+EMA_MAX_SCALE = 1e100  # chunk ของ EMA แบบ closed form: (1 - alpha)^-k ต้องไม่ล้น float64
+
+
+def point_key(row: Dict[str, Any]) -> Optional[int]:
+    """(วันที่, รอบที่) -> int64 ที่เรียงตามลำดับรอบ (หลายรอบในนาทีเดียวกันไม่ชนกัน)"""
+    date = parse_thai_date(row.get("date", ""))
+    round_no = parse_round(row.get("round"))
+    if date is None or round_no is None or not 0 <= round_no < ROUND_SLOTS:
+        return None
+    return date.toordinal() * ROUND_SLOTS + round_no
+
+
+def day_key(day_start: int) -> int:
+    """เวลาเริ่มวัน (epoch, เที่ยงคืนไทย) -> point key ตัวแรกของวันนั้น"""
+    return datetime.datetime.fromtimestamp(day_start, BKK_TZ).date().toordinal() * ROUND_SLOTS
+
+
+def ema_fill(prices: np.ndarray, span: int, out: np.ndarray):
+    """
+    EMA ทั้งชุดแบบ vectorized: y[i] = d^(i+1) * (y[-1] + alpha * sum(x[j] / d^(j+1), j <= i)), d = 1 - alpha
+    ทำเป็น chunk ที่ d^-k ยังไม่ล้น แล้วส่ง y ตัวท้ายต่อให้ chunk ถัดไป (จุดแรก y[0] = x[0])
+    """
+    if len(prices) == 0:
+        return
+    alpha = 2.0 / (span + 1)
+    decay = 1.0 - alpha
+    chunk = max(1, int(np.log(EMA_MAX_SCALE) / -np.log(decay)))
+    powers = decay ** np.arange(1, chunk + 1)
+    previous = float(prices[0])
+    for start in range(0, len(prices), chunk):
+        x = prices[start:start + chunk]
+        scale = powers[:len(x)]
+        values = scale * (previous + alpha * np.cumsum(x / scale))
+        out[start:start + len(x)] = values
+        previous = float(values[-1])
+
+
+def row_timestamp(row: Dict[str, Any]) -> Optional[int]:
+    """date '19/10/2569' + time '09:05' (เวลาไทย) -> epoch seconds"""
+    date = parse_thai_date(row.get("date", ""))
+    if date is None:
+        return None
+    parts = (row.get("time") or "").strip().split(":")
+    try:
+        hour, minute = int(parts[0]), int(parts[1])
+        second = int(parts[2]) if len(parts) > 2 else 0
+    except (ValueError, IndexError):
+        return None
+    moment = datetime.datetime(date.year, date.month, date.day, hour, minute, second, tzinfo=BKK_TZ)
+    return int(moment.timestamp())
+
+
+def format_ts(ts: int) -> str:
+    return datetime.datetime.fromtimestamp(ts, BKK_TZ).isoformat()
+
+
+class CandleSeries:
+    """แท่งเทียน 1 resolution: เพิ่มทีละจุด O(1), rebuild ทั้งชุดแบบ vectorized"""
+
+    def __init__(self, seconds: int):
+        self.seconds = seconds
+        self.starts: List[int] = []
+        self.open: List[float] = []
+        self.high: List[float] = []
+        self.low: List[float] = []
+        self.close: List[float] = []
+        self.rounds: List[int] = []
+        self.first: List[int] = []  # index ของจุดแรกในแต่ละแท่ง (ใช้ตอนแก้จุดท้าย)
+
+    def bucket(self, ts: int) -> int:
+        return (ts + BKK_OFFSET) // self.seconds * self.seconds - BKK_OFFSET
+
+    def add(self, ts: int, price: float, index: int):
+        start = self.bucket(ts)
+        if self.starts and self.starts[-1] == start:
+            self.high[-1] = max(self.high[-1], price)
+            self.low[-1] = min(self.low[-1], price)
+            self.close[-1] = price
+            self.rounds[-1] += 1
+            return
+        self.starts.append(start)
+        self.open.append(price)
+        self.high.append(price)
+        self.low.append(price)
+        self.close.append(price)
+        self.rounds.append(1)
+        self.first.append(index)
+
+    def revise_last(self, prices: np.ndarray):
+        """จุดท้ายถูกแก้ราคา (เวลาอยู่แท่งเดิม) -> คำนวณแท่งท้ายใหม่จากจุดในแท่งนั้นเท่านั้น"""
+        bucket = prices[self.first[-1]:]
+        self.open[-1] = float(bucket[0])
+        self.high[-1] = float(bucket.max())
+        self.low[-1] = float(bucket.min())
+        self.close[-1] = float(bucket[-1])
+
+    def rebuild(self, ts: np.ndarray, prices: np.ndarray):
+        if len(ts) == 0:
+            self.__init__(self.seconds)
+            return
+        buckets = (ts + BKK_OFFSET) // self.seconds * self.seconds - BKK_OFFSET
+        first = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        last = np.r_[first[1:] - 1, len(ts) - 1]
+        self.starts = buckets[first].tolist()
+        self.open = prices[first].tolist()
+        self.close = prices[last].tolist()
+        self.high = np.maximum.reduceat(prices, first).tolist()
+        self.low = np.minimum.reduceat(prices, first).tolist()
+        self.rounds = (last - first + 1).tolist()
+        self.first = first.tolist()
+
+    def tail(self, limit: int) -> List[Dict[str, Any]]:
+        start = max(0, len(self.starts) - limit)
+        return [
+            {
+                "t": format_ts(self.starts[i]),
+                "open": self.open[i],
+                "high": self.high[i],
+                "low": self.low[i],
+                "close": self.close[i],
+                "rounds": self.rounds[i],
+            }
+            for i in range(start, len(self.starts))
+        ]
+
+
+class PriceSeries:
+    """
+    ราคา 1 ชุด (เช่น ทองแท่ง ขายออก) เก็บเป็น column ของ NumPy (int64 key + int64 เวลา + float64 ราคา)
+    - เรียง / ระบุจุดด้วย point key (วันที่, รอบที่) ไม่ใช่เวลาระดับนาที -> หลายรอบในนาทีเดียวกันเป็นคนละจุด
+    - append: อัปเดต prefix sum / EMA / candles แบบ O(1), แก้ราคาจุดท้าย (รอบเดิม) ก็ O(1)
+    - แถวมาไม่เรียง (แก้ไขย้อนหลัง, import) -> rebuild ทั้งชุดแบบ vectorized
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.n = 0
+        self._key = np.empty(capacity, dtype=np.int64)
+        self._ts = np.empty(capacity, dtype=np.int64)
+        self._price = np.empty(capacity, dtype=np.float64)
+        self._cumsum = np.zeros(capacity + 1, dtype=np.float64)  # _cumsum[i] = sum(price[:i])
+        self._ema = {span: np.empty(capacity, dtype=np.float64) for span in EMA_SPANS}
+        self.candles = {label: CandleSeries(seconds) for label, seconds in RESOLUTIONS.items()}
+
+    @property
+    def keys(self) -> np.ndarray:
+        return self._key[:self.n]
+
+    @property
+    def ts(self) -> np.ndarray:
+        return self._ts[:self.n]
+
+    @property
+    def prices(self) -> np.ndarray:
+        return self._price[:self.n]
+
+    def _grow(self, needed: int):
+        capacity = len(self._ts)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        self._key = np.resize(self._key, capacity)
+        self._ts = np.resize(self._ts, capacity)
+        self._price = np.resize(self._price, capacity)
+        self._cumsum = np.resize(self._cumsum, capacity + 1)
+        self._ema = {span: np.resize(values, capacity) for span, values in self._ema.items()}
+
+    def _revise_last(self, ts: int, price: float) -> bool:
+        """แก้จุดท้าย (รอบเดิม) แบบ O(1): คืน False ถ้าเวลาใหม่ย้ายไปแท่งอื่น (ต้อง rebuild)"""
+        last = self.n - 1
+        if any(c.bucket(ts) != c.starts[-1] for c in self.candles.values()):
+            return False
+        self._ts[last] = ts
+        self._price[last] = price
+        self._cumsum[self.n] = self._cumsum[last] + price
+        for span, values in self._ema.items():
+            alpha = 2.0 / (span + 1)
+            values[last] = price if last == 0 else values[last - 1] + alpha * (price - values[last - 1])
+        for candles in self.candles.values():
+            candles.revise_last(self.prices)
+        return True
+
+    def append(self, key: int, ts: int, price: float) -> bool:
+        """คืน True ถ้าต้อง rebuild (แถวย้อนลำดับ) -> ให้ผู้เรียก rebuild ครั้งเดียวหลังจบ batch"""
+        n = self.n
+        if n and key == self._key[n - 1] and self._revise_last(ts, price):
+            return False
+        if n and key <= self._key[n - 1]:
+            pos = int(np.searchsorted(self._key[:n], key))
+            if pos < n and self._key[pos] == key:
+                self._ts[pos] = ts
+                self._price[pos] = price
+            else:
+                self._grow(n + 1)
+                for column in (self._key, self._ts, self._price):
+                    column[pos + 1:n + 1] = column[pos:n]
+                self._key[pos] = key
+                self._ts[pos] = ts
+                self._price[pos] = price
+                self.n += 1
+            return True
+
+        self._grow(n + 1)
+        self._key[n] = key
+        self._ts[n] = ts
+        self._price[n] = price
+        self._cumsum[n + 1] = self._cumsum[n] + price
+        for span, values in self._ema.items():
+            alpha = 2.0 / (span + 1)
+            values[n] = price if n == 0 else values[n - 1] + alpha * (price - values[n - 1])
+        for candles in self.candles.values():
+            candles.add(ts, price, n)
+        self.n += 1
+        return False
+
+    def load(self, keys: np.ndarray, ts: np.ndarray, prices: np.ndarray):
+        """แทนที่ทั้งชุด (bulk import): sort ตาม key, key ซ้ำใช้ค่าหลังสุด แล้ว rebuild ครั้งเดียว"""
+        order = np.argsort(keys, kind="stable")
+        keys, ts, prices = keys[order], ts[order], prices[order]
+        keep = np.r_[keys[1:] != keys[:-1], True] if len(keys) else np.ones(0, dtype=bool)
+        keys, ts, prices = keys[keep], ts[keep], prices[keep]
+        self._grow(len(keys))
+        self.n = len(keys)
+        self._key[:self.n] = keys
+        self._ts[:self.n] = ts
+        self._price[:self.n] = prices
+        self.rebuild()
+
+    def rebuild(self):
+        ts, prices = self.ts, self.prices
+        self._cumsum[0] = 0.0
+        np.cumsum(prices, out=self._cumsum[1:self.n + 1])
+        for span, values in self._ema.items():
+            ema_fill(prices, span, values)
+        for candles in self.candles.values():
+            candles.rebuild(ts, prices)
+
+    # --- Queries (ไม่โตตามความยาวประวัติ: ใช้เฉพาะช่วงท้าย) ---
+    def sma(self, window: int, points: int) -> np.ndarray:
+        end = np.arange(max(window, self.n - points + 1), self.n + 1)
+        return (self._cumsum[end] - self._cumsum[end - window]) / window
+
+    def ema(self, span: int, points: int) -> np.ndarray:
+        return self._ema[span][max(0, self.n - points):self.n]
+
+    def day_slice(self, day_start: int) -> np.ndarray:
+        first = day_key(day_start)
+        lo = int(np.searchsorted(self.keys, first, side="left"))
+        hi = int(np.searchsorted(self.keys, first + ROUND_SLOTS, side="left"))
+        return self._price[lo:hi]
+
+
+class AnalyticsEngine:
+    def __init__(self):
+        self.series: Dict[Tuple[str, str], PriceSeries] = {
+            (product, side): PriceSeries() for product in SERIES_PRODUCTS for side in SIDES
+        }
+
+    def get(self, product: str, side: str) -> Optional[PriceSeries]:
+        return self.series.get((product, side))
+
+    def ingest(self, rows: List[Dict[str, Any]]) -> int:
+        """ป้อนแถวใหม่จาก HistoryStore.ingest (ลำดับเวลา) คืนจำนวนจุดที่เพิ่ม"""
+        dirty = set()
+        added = 0
+        for row in rows:
+            point, ts = point_key(row), row_timestamp(row)
+            if point is None or ts is None:
+                continue
+            for key, price in association_prices(row).items():
+                series = self.series.get(key)
+                if series is not None:
+                    if series.append(point, ts, price):
+                        dirty.add(key)
+                    added += 1
+        for key in dirty:
+            self.series[key].rebuild()
+        return added
+
+    def load(self, rows: List[Dict[str, Any]]):
+        """สร้างทุก series ใหม่จากประวัติทั้งชุด (ใช้หลัง import ประวัติจำนวนมาก)"""
+        columns: Dict[Tuple[str, str], Tuple[List[int], List[int], List[float]]] = {
+            key: ([], [], []) for key in self.series
+        }
+        for row in rows:
+            point, ts = point_key(row), row_timestamp(row)
+            if point is None or ts is None:
+                continue
+            for key, price in association_prices(row).items():
+                column = columns.get(key)
+                if column is not None:
+                    column[0].append(point)
+                    column[1].append(ts)
+                    column[2].append(price)
+        for key, (points, ts, prices) in columns.items():
+            self.series[key].load(
+                np.array(points, dtype=np.int64), np.array(ts, dtype=np.int64), np.array(prices, dtype=np.float64)
+            )
+
+    def candles(self, product: str, side: str, resolution: str, limit: int) -> List[Dict[str, Any]]:
+        return self.series[(product, side)].candles[resolution].tail(limit)
+
+    def indicators(self, product: str, side: str, sma_windows: List[int], points: int) -> Dict[str, Any]:
+        series = self.series[(product, side)]
+        ts = series.ts[max(0, series.n - points):]
+        result = {
+            "t": [format_ts(t) for t in ts.tolist()],
+            "price": series.prices[max(0, series.n - points):].tolist(),
+            "sma": {},
+            "ema": {},
+        }
+        for window in sma_windows:
+            values = np.round(series.sma(window, points), 2).tolist()
+            # จุดแรกๆ ที่ยังไม่ครบ window -> None ให้ความยาวเท่ากับ t
+            result["sma"][str(window)] = [None] * (len(ts) - len(values)) + values
+        for span in EMA_SPANS:
+            result["ema"][str(span)] = np.round(series.ema(span, points), 2).tolist()
+        return result
+
+    def daily(self, product: str, side: str, days: int) -> List[Dict[str, Any]]:
+        series = self.series[(product, side)]
+        candles = series.candles["1d"]
+        start = max(0, len(candles.starts) - days)
+        summary = []
+        for i in range(start, len(candles.starts)):
+            day_prices = series.day_slice(candles.starts[i])
+            changes = np.diff(day_prices)
+            day_range = candles.high[i] - candles.low[i]
+            summary.append({
+                "date": format_ts(candles.starts[i])[:10],
+                "open": candles.open[i],
+                "high": candles.high[i],
+                "low": candles.low[i],
+                "close": candles.close[i],
+                "change": candles.close[i] - candles.open[i],
+                "range": day_range,
+                "range_pct": round(day_range / candles.open[i] * 100, 4) if candles.open[i] else None,
+                # ความผันผวน = ส่วนเบี่ยงเบนมาตรฐานของการปรับราคาแต่ละรอบ (บาท)
+                "volatility": round(float(changes.std()), 2) if len(changes) else 0.0,
+                "adjustments": int(np.count_nonzero(changes)),
+                "rounds": candles.rounds[i],
+            })
+        return summary
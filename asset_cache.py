@@ -0,0 +1,268 @@
+import asyncio
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Any, FrozenSet, Optional, Tuple, TYPE_CHECKING
+from urllib.parse import urlsplit
+
+from state_store import StateStore
+
+# import เฉพาะตอนเช็ค type -> import module นี้ไม่ต้องโหลด Playwright
+if TYPE_CHECKING:
+    from playwright.async_api import BrowserContext, Route
+
+# ==============================================================================
+# ASSET CACHE (route ของ Playwright: บล็อก third-party + เสิร์ฟ JS/CSS จาก disk)
+# ==============================================================================
+# Tracker / โฆษณา / chat widget ที่ไม่มีผลกับตารางราคา -> abort ทันที (match ทั้ง subdomain)
+DEFAULT_DENYLIST = frozenset({
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "doubleclick.net",
+    "facebook.net",
+    "facebook.com",
+    "connect.facebook.net",
+    "analytics.tiktok.com",
+    "hotjar.com",
+    "clarity.ms",
+    "tawk.to",
+    "embed.tawk.to",
+    "zopim.com",
+    "livechatinc.com",
+    "criteo.com",
+    "adnxs.com",
+    "cdn.onesignal.com",
+})
+
+
+@dataclass(frozen=True)
+class SiteRule:
+    """
+    กติกาการ cache ต่อ host
+    - cache_types: resource type ที่เก็บลง disk ได้ (document/xhr/fetch มีราคาอยู่ -> ห้ามใส่ ยกเว้นหน้า static จริงๆ)
+    - never: regex ของ path ที่ห้าม cache แม้ type จะตรง (เช่น script ที่ฝังราคา)
+    """
+    cache_types: FrozenSet[str] = frozenset({"script"})
+    max_age_seconds: int = 6 * 3600
+    never: Tuple[str, ...] = ()
+    _never: Tuple["re.Pattern", ...] = field(default=(), init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "_never", tuple(re.compile(pattern) for pattern in self.never))
+
+    def allows(self, resource_type: str, path: str) -> bool:
+        return resource_type in self.cache_types and not any(p.search(path) for p in self._never)
+
+
+# JS bundle / CSS ของแต่ละเว็บเปลี่ยนไม่บ่อย, ราคามาทาง document / XHR เสมอ (ไม่ถูก cache)
+SITE_RULES: Dict[str, SiteRule] = {
+    "goldtraders.or.th": SiteRule(cache_types=frozenset({"script", "stylesheet"}), never=(r"(?i)/api/", r"(?i)\.ashx")),
+    "mtsgold.co.th": SiteRule(never=(r"(?i)price",)),
+    "huasengheng.com": SiteRule(never=(r"(?i)price",)),
+    "chinhuaheng.com": SiteRule(never=(r"(?i)price",)),
+    "ausiris.co.th": SiteRule(never=(r"(?i)price",)),
+    "aurora.co.th": SiteRule(never=(r"(?i)price",)),
+}
+# Host อื่นๆ (CDN ของ library เช่น jQuery) -> cache script ได้นานกว่า
+DEFAULT_RULE = SiteRule(max_age_seconds=24 * 3600)
+
+
+def host_matches(host: str, domains) -> Optional[str]:
+    """'www.googletagmanager.com' ตรงกับ 'googletagmanager.com' -> คืน domain ที่ตรง"""
+    parts = host.lower().split(".")
+    for i in range(len(parts) - 1):
+        candidate = ".".join(parts[i:])
+        if candidate in domains:
+            return candidate
+    return None
+
+
+def new_cycle_stats() -> Dict[str, int]:
+    return {"hits": 0, "misses": 0, "blocked": 0, "bytes_saved": 0, "bytes_fetched": 0}
+
+
+class AssetCache:
+    """
+    Cache แบบ content-addressed บน disk
+    - blob เก็บที่ <dir>/<sha[:2]>/<sha256> (URL ต่างกันแต่ไฟล์เหมือนกัน -> เก็บชุดเดียว)
+    - index (URL -> sha, content-type, เวลาเก็บ) อยู่ใน StateStore -> อ่านจาก memory, เขียนไฟล์เบื้องหลัง
+    - ลำดับ LRU (OrderedDict) + จำนวน URL ต่อ blob + ยอดรวม bytes เก็บใน memory
+      -> store / eviction เป็น O(1) ต่อ entry, ไม่ต้องไล่ทั้ง index ทุกครั้งที่เก็บ
+    - เกิน max_bytes -> ลบ entry ที่ไม่ได้ใช้นานสุดก่อน (blob ถูกลบเมื่อไม่มี URL อ้างถึงแล้ว)
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 64 * 1024 * 1024, denylist=DEFAULT_DENYLIST,
+                 rules: Optional[Dict[str, SiteRule]] = None, max_entry_bytes: int = 4 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.denylist = frozenset(denylist)
+        self.rules = SITE_RULES if rules is None else rules
+        os.makedirs(directory, exist_ok=True)
+        self.index = StateStore(os.path.join(directory, "index.json"), debounce_seconds=5.0, name="AssetCache")
+        self._lru: "OrderedDict[str, None]" = OrderedDict()
+        self._refs: Dict[str, int] = {}         # sha -> จำนวน URL ที่ชี้มา
+        self._blob_sizes: Dict[str, int] = {}
+        self.total_bytes = 0                    # ผลรวมขนาด blob (นับ blob ที่ใช้ร่วมกันครั้งเดียว)
+        for url, entry in sorted(self.index.snapshot().items(), key=lambda item: item[1][2]):
+            self._lru[url] = None
+            self._retain(entry[0], entry[3])
+        self._evict()
+        self.cycle = new_cycle_stats()
+        self.last_cycle: Optional[Dict[str, int]] = None
+        self.totals = new_cycle_stats()
+
+    def rule_for(self, host: str) -> SiteRule:
+        domain = host_matches(host, self.rules)
+        return self.rules[domain] if domain else DEFAULT_RULE
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest)
+
+    # --- Playwright routing ---
+    async def attach(self, context: "BrowserContext"):
+        """ติดตั้ง router ให้ทุกหน้าใน context (route ระดับ page เช่น block_heavy_resources ทำงานก่อน)"""
+        try:
+            await context.route("**/*", self.handle)
+        except Exception as e:
+            # backend บางตัว (เช่น Lightpanda) อาจยังไม่รองรับ interception -> ทำงานต่อแบบไม่มี cache
+            print(f"   ⚠️ [Assets] Routing unavailable: {e}")
+
+    async def handle(self, route: "Route"):
+        request = route.request
+        parts = urlsplit(request.url)
+        if parts.scheme not in ("http", "https"):
+            await route.fallback()
+            return
+        if host_matches(parts.hostname or "", self.denylist):
+            self._count("blocked")
+            await route.abort("blockedbyclient")
+            return
+
+        rule = self.rule_for(parts.hostname or "")
+        if request.method != "GET" or not rule.allows(request.resource_type, parts.path):
+            await route.fallback()
+            return
+
+        cached = await self.lookup(request.url, rule)
+        if cached is not None:
+            body, content_type = cached
+            self._count("hits")
+            self._count("bytes_saved", len(body))
+            await route.fulfill(status=200, body=body, headers={
+                "content-type": content_type,
+                "access-control-allow-origin": "*",
+            })
+            return
+
+        try:
+            response = await route.fetch()
+        except Exception:
+            await route.fallback()
+            return
+        self._count("misses")
+        if response.status == 200:
+            body = await response.body()
+            self._count("bytes_fetched", len(body))
+            if len(body) <= self.max_entry_bytes:
+                await self.store(request.url, body, response.headers.get("content-type", "application/octet-stream"))
+        await route.fulfill(response=response)
+
+    # --- Storage ---
+    async def lookup(self, url: str, rule: SiteRule) -> Optional[Tuple[bytes, str]]:
+        entry = self.index.get(url)
+        if not entry:
+            return None
+        digest, content_type, stored_at, _size = entry
+        if time.time() - stored_at > rule.max_age_seconds:
+            return None
+        try:
+            body = await asyncio.to_thread(self._read, digest)
+        except OSError:
+            self._drop(url)
+            return None
+        if url in self._lru:
+            self._lru.move_to_end(url)
+        return body, content_type
+
+    async def store(self, url: str, body: bytes, content_type: str):
+        digest = hashlib.sha256(body).hexdigest()
+        try:
+            await asyncio.to_thread(self._write, digest, body)
+        except OSError as e:
+            print(f"   ⚠️ [Assets] Cannot store {url}: {e}")
+            return
+        previous = self.index.get(url)
+        self.index.set(url, [digest, content_type, time.time(), len(body)])
+        self._retain(digest, len(body))
+        if previous:
+            self._release(previous[0])  # เก็บ blob ใหม่ก่อนปล่อยตัวเดิม -> เนื้อหาเดิมไม่ถูกลบทิ้ง
+        self._lru[url] = None
+        self._lru.move_to_end(url)
+        self._evict()
+
+    def _read(self, digest: str) -> bytes:
+        with open(self.blob_path(digest), "rb") as f:
+            return f.read()
+
+    def _write(self, digest: str, body: bytes):
+        path = self.blob_path(digest)
+        if os.path.exists(path):
+            return  # content-addressed: มีไฟล์นี้อยู่แล้ว
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+
+    def _retain(self, digest: str, size: int):
+        refs = self._refs.get(digest, 0)
+        if refs == 0:
+            self._blob_sizes[digest] = size
+            self.total_bytes += size
+        self._refs[digest] = refs + 1
+
+    def _release(self, digest: str):
+        refs = self._refs.get(digest, 0) - 1
+        if refs > 0:
+            self._refs[digest] = refs
+            return
+        self._refs.pop(digest, None)
+        self.total_bytes -= self._blob_sizes.pop(digest, 0)
+        try:
+            os.remove(self.blob_path(digest))
+        except OSError:
+            pass
+
+    def _drop(self, url: str):
+        entry = self.index.get(url)
+        self.index.delete(url)
+        self._lru.pop(url, None)
+        if entry:
+            self._release(entry[0])
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self._lru:
+            self._drop(next(iter(self._lru)))
+
+    # --- Stats ---
+    def _count(self, key: str, amount: int = 1):
+        self.cycle[key] += amount
+        self.totals[key] += amount
+
+    def end_cycle(self) -> Dict[str, int]:
+        """ปิดยอดของรอบ scrape นี้ (bytes ที่ประหยัดได้ ฯลฯ) แล้วเริ่มนับใหม่"""
+        self.last_cycle, self.cycle = self.cycle, new_cycle_stats()
+        return self.last_cycle
+
+    def status(self) -> Dict[str, Any]:
+        return {"entries": len(self._lru), "bytes": self.total_bytes, "last_cycle": self.last_cycle,
+                "totals": self.totals}
+
+    def close(self):
+        self.index.close()
@@ -0,0 +1,275 @@
+import asyncio
+import itertools
+import time
+from typing import Dict, Any, Awaitable, Callable, List, Optional, TYPE_CHECKING
+
+# import เฉพาะตอนเช็ค type -> import module นี้ไม่ต้องโหลด Playwright
+if TYPE_CHECKING:
+    from playwright.async_api import Browser, BrowserContext, Playwright
+
+# ==============================================================================
+# BROWSER BACKENDS (Chromium ในเครื่อง หรือ pool ของ remote CDP endpoint)
+# ==============================================================================
+LOCAL = "local"
+DEFAULT_BACKEND = "chromium"
+
+CHROMIUM_ARGS = [
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-gpu',
+    '--disable-extensions',
+    '--no-zygote'
+]
+
+
+def parse_backends(spec: str) -> Dict[str, List[str]]:
+    """
+    'chromium=local;lightpanda=http://lp-1:9222,http://lp-2:9222'
+    -> {"chromium": ["local"], "lightpanda": ["http://lp-1:9222", "http://lp-2:9222"]}
+    """
+    backends: Dict[str, List[str]] = {}
+    for part in (spec or "").split(";"):
+        name, sep, targets = part.partition("=")
+        name = name.strip()
+        if not name or not sep:
+            continue
+        urls = [url.strip() for url in targets.split(",") if url.strip()]
+        if urls:
+            backends[name] = urls
+    return backends or {DEFAULT_BACKEND: [LOCAL]}
+
+
+def parse_routes(spec: str) -> Dict[str, str]:
+    """'goldtraders=lightpanda,mts_gold=lightpanda' -> {source: backend}"""
+    routes = {}
+    for part in (spec or "").split(","):
+        source, sep, backend = part.partition("=")
+        if source.strip() and sep and backend.strip():
+            routes[source.strip()] = backend.strip()
+    return routes
+
+
+class Endpoint:
+    """Browser 1 ตัว (launch เอง หรือ connect_over_cdp) + สถานะสุขภาพ / backoff ตอน reconnect"""
+
+    def __init__(self, url: str, connect_timeout_ms: int = 10000, max_backoff: float = 60.0):
+        self.url = url
+        self.connect_timeout_ms = connect_timeout_ms
+        self.max_backoff = max_backoff
+        self.browser: Optional["Browser"] = None
+        self.failures = 0
+        self.retry_at = 0.0
+        self.last_error: Optional[str] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def is_local(self) -> bool:
+        return self.url == LOCAL
+
+    @property
+    def connected(self) -> bool:
+        return self.browser is not None and self.browser.is_connected()
+
+    async def ensure(self, playwright: "Playwright") -> Optional["Browser"]:
+        """คืน browser ที่ใช้ได้ (reconnect ถ้าหลุด) หรือ None ถ้ายังอยู่ในช่วง backoff"""
+        if self.connected:
+            return self.browser
+        async with self._lock:
+            if self.connected:
+                return self.browser
+            if time.monotonic() < self.retry_at:
+                return None
+            try:
+                if self.is_local:
+                    browser = await playwright.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+                else:
+                    browser = await playwright.chromium.connect_over_cdp(self.url, timeout=self.connect_timeout_ms)
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                # backoff แบบ exponential (2, 4, 8, ... วินาที) ไม่ให้ยิง endpoint ที่ล่มทุกรอบ
+                self.retry_at = time.monotonic() + min(self.max_backoff, 2.0 ** self.failures)
+                print(f"   ⚠️ [Browser] Cannot reach {self.url}: {e}")
+                return None
+            if self.failures:
+                print(f"   🔌 [Browser] Reconnected to {self.url}")
+            self.browser = browser
+            self.failures = 0
+            self.last_error = None
+            return browser
+
+    async def close(self):
+        browser, self.browser = self.browser, None
+        if browser is not None:
+            try:
+                # remote: ปิดเฉพาะ context ของเรา + ตัดการเชื่อมต่อ (browser farm ยังทำงานต่อ)
+                await browser.close()
+            except Exception as e:
+                print(f"   ⚠️ [Browser] Close Warning ({self.url}): {e}")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "url": self.url if self.is_local else self.url.split("?")[0],
+            "connected": self.connected,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+
+class Backend:
+    """กลุ่ม endpoint ที่ใช้แทนกันได้ -> กระจาย context แบบ round-robin, ข้ามตัวที่ล่ม"""
+
+    def __init__(self, name: str, urls: List[str], **endpoint_options):
+        self.name = name
+        self.endpoints = [Endpoint(url, **endpoint_options) for url in urls]
+        self._turn = itertools.count()
+
+    async def new_context(self, playwright: "Playwright", **options) -> Optional["BrowserContext"]:
+        start = next(self._turn)
+        for i in range(len(self.endpoints)):
+            endpoint = self.endpoints[(start + i) % len(self.endpoints)]
+            browser = await endpoint.ensure(playwright)
+            if browser is None:
+                continue
+            try:
+                return await browser.new_context(**options)
+            except Exception as e:
+                # หลุดระหว่างทาง -> ทิ้ง connection ไว้ให้ ensure() ต่อใหม่รอบหน้า
+                print(f"   ⚠️ [Browser] {self.name} new_context failed on {endpoint.url}: {e}")
+                await endpoint.close()
+        return None
+
+    async def close(self):
+        await asyncio.gather(*(endpoint.close() for endpoint in self.endpoints))
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "healthy": any(endpoint.connected for endpoint in self.endpoints),
+            "endpoints": [endpoint.status() for endpoint in self.endpoints],
+        }
+
+
+class BrowserPool:
+    """
+    Browser ทุก backend ของ process นี้ + การเลือก backend ต่อแหล่งข้อมูล
+    - backend "local" = launch Chromium ในเครื่อง, นอกนั้นเป็น URL ของ CDP (Lightpanda / Chromium farm)
+    - source ที่ไม่มี route หรือ backend ของมันล่มทั้งหมด -> ใช้ default backend แทน
+    """
+
+    def __init__(self, backends: Dict[str, List[str]], routes: Optional[Dict[str, str]] = None,
+                 default: str = DEFAULT_BACKEND, connect_timeout_ms: int = 10000):
+        self.backends = {
+            name: Backend(name, urls, connect_timeout_ms=connect_timeout_ms)
+            for name, urls in backends.items()
+        }
+        self.default = default if default in self.backends else next(iter(self.backends))
+        self.routes = {source: backend for source, backend in (routes or {}).items() if backend in self.backends}
+        self._playwright: Optional["Playwright"] = None
+
+    @property
+    def running(self) -> bool:
+        return self._playwright is not None
+
+    async def start(self):
+        if self._playwright is not None:
+            return
+        from playwright.async_api import async_playwright
+        self._playwright = await async_playwright().start()
+        # ต่อ / launch default backend ไว้ก่อน (ตัวอื่นต่อเมื่อมีคนใช้)
+        await self.backends[self.default].endpoints[0].ensure(self._playwright)
+
+    async def stop(self):
+        if self._playwright is None:
+            return
+        try:
+            await asyncio.gather(*(backend.close() for backend in self.backends.values()))
+            await self._playwright.stop()
+        except Exception as e:
+            print(f"   ⚠️ Shutdown Warning: {e}")
+        finally:
+            self._playwright = None
+
+    async def check(self):
+        """Health check: ต่อ endpoint ที่หลุดกลับ (ตาม backoff) ก่อนเริ่มรอบ scrape"""
+        if self._playwright is None:
+            return
+        await asyncio.gather(*(
+            endpoint.ensure(self._playwright)
+            for backend in self.backends.values() for endpoint in backend.endpoints
+            if not endpoint.is_local or backend.name == self.default
+        ))
+
+    def backend_for(self, source: str) -> str:
+        return self.routes.get(source, self.default)
+
+    async def new_context(self, source: str, **options) -> "BrowserContext":
+        if self._playwright is None:
+            raise RuntimeError("Browser pool is not running")
+        name = self.backend_for(source)
+        context = await self.backends[name].new_context(self._playwright, **options)
+        if context is None and name != self.default:
+            print(f"   ↪️ [Browser] {name} unavailable for {source}, falling back to {self.default}")
+            context = await self.backends[self.default].new_context(self._playwright, **options)
+        if context is None:
+            raise RuntimeError(f"No browser available for {source}")
+        return context
+
+    def session(self, setup: Optional[Callable[["BrowserContext"], Awaitable[None]]] = None,
+                **context_options) -> "BrowserSession":
+        return BrowserSession(self, context_options, setup)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "default": self.default,
+            "routes": self.routes,
+            "backends": {name: backend.status() for name, backend in self.backends.items()},
+        }
+
+
+class BrowserSession:
+    """
+    Context ของ 1 รอบ scrape: สร้าง context ต่อ backend ครั้งแรกที่ source ขอ แล้วแชร์กันในรอบนั้น
+    ใช้แบบ `async with pool.session(...) as session:` -> ปิดทุก context ตอนจบรอบเสมอ
+    """
+
+    def __init__(self, pool: BrowserPool, context_options: Dict[str, Any],
+                 setup: Optional[Callable[["BrowserContext"], Awaitable[None]]] = None):
+        self.pool = pool
+        self.context_options = context_options
+        self.setup = setup  # เช่น ติดตั้ง route ให้ context ก่อนเปิดหน้าแรก
+        self._contexts: Dict[str, "asyncio.Task[BrowserContext]"] = {}
+
+    async def context(self, source: str) -> "BrowserContext":
+        name = self.pool.backend_for(source)
+        task = self._contexts.get(name)
+        if task is None or (task.done() and task.exception() is not None):
+            # เก็บเป็น Task -> หลาย source ขอพร้อมกัน (gather) ได้ context เดียวกัน
+            task = asyncio.ensure_future(self._open(source))
+            self._contexts[name] = task
+        return await task
+
+    async def _open(self, source: str) -> "BrowserContext":
+        context = await self.pool.new_context(source, **self.context_options)
+        if self.setup is not None:
+            await self.setup(context)
+        return context
+
+    async def close(self):
+        for task in self._contexts.values():
+            try:
+                context = await task
+            except Exception:
+                continue
+            try:
+                await context.close()
+            except Exception as e:
+                print(f"   ⚠️ [Browser] Context Close Warning: {e}")
+        self._contexts.clear()
+
+    async def __aenter__(self) -> "BrowserSession":
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
@@ -0,0 +1,146 @@
+import datetime
+import time
+from typing import Dict, Any, List, Optional
+
+from prices import PRODUCTS, SIDES, association_prices, parse_price, shop_prices
+
+# ==============================================================================
+# SHOP COMPARISON (ทำข้อมูลร้านให้อยู่ในรูปแบบเดียวกัน + เทียบราคากับสมาคมฯ)
+# ==============================================================================
+BKK_TZ = datetime.timezone(datetime.timedelta(hours=7))
+
+
+def format_epoch(ts: Optional[float]) -> Optional[str]:
+    if ts is None:
+        return None
+    return datetime.datetime.fromtimestamp(ts, BKK_TZ).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def price_diff(a: Optional[float], b: Optional[float]) -> Optional[float]:
+    return round(a - b, 2) if a is not None and b is not None else None
+
+
+def normalize_shop(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    ผลลัพธ์ดิบจาก shop.py -> รูปแบบกลาง
+    {"name", "quotes": {"gold_bar_965": {"buy": 41100.0, "sell": 41200.0}, ...}, "buy_back": {...}, "error"}
+    """
+    quotes: Dict[str, Dict[str, Optional[float]]] = {}
+    for (product, side), price in shop_prices(result).items():
+        quotes.setdefault(product, {"buy": None, "sell": None})[side] = price
+
+    buy_back = None
+    raw_buy_back = (result.get("data") or {}).get("ornament_buy_back")
+    if isinstance(raw_buy_back, dict):
+        buy_back = {unit: parse_price(raw_buy_back.get(unit)) for unit in ("baht", "gram")}
+
+    return {
+        "name": result.get("name"),
+        "quotes": quotes,
+        "buy_back": buy_back,
+        "error": result.get("error"),
+    }
+
+
+EMPTY_COMPARISON: Dict[str, Any] = {"products": {}, "shops": [], "reference": None}
+
+
+class ShopComparison:
+    """
+    เก็บราคาร้านล่าสุดที่ดึงสำเร็จ (ต่อร้าน) + สร้าง view เปรียบเทียบ 1 ครั้งต่อรอบ
+    - ร้านที่รอบนี้ error จะใช้ราคาชุดเดิมต่อ แต่บอกอายุข้อมูล (staleness) ให้ client รู้
+    - view ที่ rebuild() คืนไปอยู่ใน CacheSnapshot (publish พร้อมกัน) -> version กับ view ตรงกันเสมอ
+    """
+
+    def __init__(self, stale_after_seconds: int = 900):
+        self.stale_after_seconds = stale_after_seconds
+        self._shops: Dict[str, Dict[str, Any]] = {}
+
+    def update_shops(self, results: List[Dict[str, Any]], now: Optional[float] = None):
+        now = now if now is not None else time.time()
+        for result in results:
+            shop = normalize_shop(result)
+            previous = self._shops.get(shop["name"])
+            if shop["quotes"]:
+                shop["last_success_ts"] = now
+            else:
+                # ดึงไม่สำเร็จ -> เก็บ error ล่าสุดไว้ แต่ใช้ราคาชุดก่อนหน้า
+                shop["quotes"] = previous["quotes"] if previous else {}
+                shop["buy_back"] = previous["buy_back"] if previous else None
+                shop["last_success_ts"] = previous["last_success_ts"] if previous else None
+            shop["checked_ts"] = now
+            self._shops[shop["name"]] = shop
+
+    def rebuild(self, association_row: Optional[Dict[str, Any]], now: Optional[float] = None) -> Dict[str, Any]:
+        """คำนวณ best price / spread / premium ใหม่ (เรียกก่อน publish ของแต่ละรอบ scrape)"""
+        now = now if now is not None else time.time()
+        reference = association_prices(association_row) if association_row else {}
+        shops = []
+        products: Dict[str, Dict[str, Any]] = {}
+
+        for shop in self._shops.values():
+            entries = {}
+            for product, quote in shop["quotes"].items():
+                buy, sell = quote.get("buy"), quote.get("sell")
+                ref_buy, ref_sell = reference.get((product, "buy")), reference.get((product, "sell"))
+                entries[product] = {
+                    "buy": buy,
+                    "sell": sell,
+                    "spread": price_diff(sell, buy),
+                    "premium_buy": price_diff(buy, ref_buy),
+                    "premium_sell": price_diff(sell, ref_sell),
+                }
+                # ร้านที่ราคาเก่าเกินไม่เอามาจัดอันดับ best price
+                last_success = shop["last_success_ts"]
+                if last_success is not None and now - last_success <= self.stale_after_seconds:
+                    self._track_best(products, product, shop["name"], buy, sell)
+            shops.append({
+                "name": shop["name"],
+                "products": entries,
+                "buy_back": shop["buy_back"],
+                "error": shop["error"],
+                "last_success_ts": shop["last_success_ts"],
+                "checked_ts": shop["checked_ts"],
+            })
+
+        for product in products:
+            products[product]["reference"] = {
+                side: reference.get((product, side)) for side in SIDES
+            } if any((product, side) in reference for side in SIDES) else None
+
+        return {
+            "products": {product: products[product] for product in PRODUCTS if product in products},
+            "shops": shops,
+            "reference": {"source": "goldtraders", "round": association_row.get("round"),
+                          "time": association_row.get("time")} if association_row else None,
+        }
+
+    @staticmethod
+    def _track_best(products: Dict[str, Dict[str, Any]], product: str, name: str,
+                    buy: Optional[float], sell: Optional[float]):
+        best = products.setdefault(product, {"best_buy": None, "best_sell": None})
+        # best_buy = ร้านที่รับซื้อแพงสุด (ดีสำหรับคนขาย), best_sell = ร้านที่ขายถูกสุด (ดีสำหรับคนซื้อ)
+        if buy is not None and (best["best_buy"] is None or buy > best["best_buy"]["price"]):
+            best["best_buy"] = {"shop": name, "price": buy}
+        if sell is not None and (best["best_sell"] is None or sell < best["best_sell"]["price"]):
+            best["best_sell"] = {"shop": name, "price": sell}
+
+    def view(self, comparison: Optional[Dict[str, Any]], now: Optional[float] = None) -> Dict[str, Any]:
+        """เติมอายุข้อมูลต่อร้าน (ค่าที่เปลี่ยนตามเวลา) ลงใน view ที่ rebuild() คำนวณไว้แล้ว"""
+        comparison = comparison or EMPTY_COMPARISON
+        now = now if now is not None else time.time()
+        shops = []
+        for shop in comparison["shops"]:
+            last_success = shop["last_success_ts"]
+            age = int(now - last_success) if last_success is not None else None
+            shops.append({
+                "name": shop["name"],
+                "products": shop["products"],
+                "buy_back": shop["buy_back"],
+                "error": shop["error"],
+                "last_success_at": format_epoch(last_success),
+                "checked_at": format_epoch(shop["checked_ts"]),
+                "age_seconds": age,
+                "stale": age is None or age > self.stale_after_seconds,
+            })
+        return {"products": comparison["products"], "shops": shops, "reference": comparison["reference"]}
@@ -0,0 +1,91 @@
+from typing import Dict, Any, Optional, Tuple, TYPE_CHECKING
+
+# import เฉพาะตอนเช็ค type -> import module นี้ไม่ต้องโหลด Playwright
+if TYPE_CHECKING:
+    from playwright.async_api import Page
+
+# ==============================================================================
+# CONTENT HASH (เทียบ hash ของตารางฝั่ง browser -> ไม่เปลี่ยนก็ไม่ต้อง extract)
+# ==============================================================================
+# innerText ของทุก element ที่ตรง selector -> "ความยาว:fnv1a:djb2" (คำนวณใน browser, ส่งกลับมาแค่ string สั้นๆ)
+REGION_HASH_JS = """
+(selector) => {
+    const nodes = document.querySelectorAll(selector);
+    if (!nodes.length) return null;
+    let text = "";
+    for (const node of nodes) text += node.innerText + "\\u0000";
+    let fnv = 0x811c9dc5, djb = 5381;
+    for (let i = 0; i < text.length; i++) {
+        const c = text.charCodeAt(i);
+        fnv = Math.imul(fnv ^ c, 0x01000193);
+        djb = (Math.imul(djb, 33) + c) | 0;
+    }
+    return text.length + ":" + (fnv >>> 0).toString(16) + ":" + (djb >>> 0).toString(16);
+}
+"""
+
+
+async def region_hash(page: "Page", selector: str) -> Optional[str]:
+    """Hash ของส่วนที่ตรง selector (None = หาไม่เจอ / ประเมินไม่ได้ -> ให้ extract ตามปกติ)"""
+    try:
+        return await page.evaluate(REGION_HASH_JS, selector)
+    except Exception:
+        return None
+
+
+class ContentHashes:
+    """
+    จำ hash ล่าสุดที่ extract + publish สำเร็จแล้วต่อ region (เช่น "new:gold")
+    - unchanged(): hash ตรงกับรอบก่อน -> ข้าม extract (นับเป็น skip)
+    - commit(): บันทึก hash หลัง publish แล้วเท่านั้น (ถ้ารอบนั้นพังกลางทาง รอบหน้าจะ extract ใหม่)
+      พร้อม source ของข้อมูลที่ publish -> source เปลี่ยน (New <-> Classic / None) ลืม hash เดิมทั้งหมด
+      hash ที่จำไว้จึงตรงกับข้อมูลใน cache เสมอ (ไม่ข้าม extract แล้วเอาแถวของอีก source มาใช้)
+    - worker process: สร้างจาก known() ของฝั่ง API แล้วส่ง counters() กลับไป absorb()
+    """
+
+    def __init__(self, known: Optional[Dict[str, str]] = None):
+        self._hashes: Dict[str, str] = dict(known or {})
+        self.source: Optional[str] = None
+        self._checks: Dict[str, int] = {}
+        self._skips: Dict[str, int] = {}
+
+    def unchanged(self, key: str, digest: Optional[str]) -> bool:
+        self._checks[key] = self._checks.get(key, 0) + 1
+        if digest is None or self._hashes.get(key) != digest:
+            return False
+        self._skips[key] = self._skips.get(key, 0) + 1
+        return True
+
+    def commit(self, hashes: Dict[str, Optional[str]], source: Optional[str] = None):
+        if source != self.source:
+            self._hashes.clear()
+            self.source = source
+        for key, digest in hashes.items():
+            if digest is not None:
+                self._hashes[key] = digest
+
+    def known(self) -> Dict[str, str]:
+        return dict(self._hashes)
+
+    def counters(self) -> Dict[str, Tuple[int, int]]:
+        return {key: (checks, self._skips.get(key, 0)) for key, checks in self._checks.items()}
+
+    def absorb(self, counters: Dict[str, Tuple[int, int]]):
+        """รวมยอด check / skip ที่นับใน worker process เข้ากับสถิติของ process นี้"""
+        for key, (checks, skips) in counters.items():
+            self._checks[key] = self._checks.get(key, 0) + checks
+            self._skips[key] = self._skips.get(key, 0) + skips
+
+    def status(self) -> Dict[str, Any]:
+        regions = {}
+        for key, checks in sorted(self._checks.items()):
+            skips = self._skips.get(key, 0)
+            regions[key] = {"checks": checks, "skips": skips, "skip_ratio": round(skips / checks, 3)}
+        total_checks = sum(self._checks.values())
+        total_skips = sum(self._skips.values())
+        return {
+            "checks": total_checks,
+            "skips": total_skips,
+            "skip_ratio": round(total_skips / total_checks, 3) if total_checks else None,
+            "regions": regions,
+        }
@@ -0,0 +1,189 @@
+import asyncio
+from typing import Dict, Any, Optional, TYPE_CHECKING
+
+from content_hash import ContentHashes, region_hash
+from prices import ASSOCIATION_SOURCE
+
+# import เฉพาะตอนเช็ค type -> import module นี้ไม่ต้องโหลด Playwright
+if TYPE_CHECKING:
+    from playwright.async_api import Page
+    from browsers import BrowserSession
+
+# ==============================================================================
+# GOLD TRADERS SCRAPING (แยกฟังก์ชันตามเวอร์ชันเว็บ)
+# ==============================================================================
+
+# --- LOGIC A: เว็บเวอร์ชันใหม่ (Clean URL) ---
+async def scrape_new_version(page: "Page", known: ContentHashes) -> Dict[str, Any]:
+    print("   👉 Trying New Version Logic...")
+    # Timeout 15s -> 60s (เผื่อเว็บช้ามาก)
+    await page.goto("https://www.goldtraders.or.th/updatepricelist", timeout=60000)
+    # Timeout 5s -> 30s
+    # NEW LOGIC: รอจนกว่าจะมีข้อมูลมากกว่า 2 แถว (Header + Data) ป้องกันการดึงว่าง
+    try:
+        await page.wait_for_function("document.querySelectorAll('table tbody tr').length > 2", timeout=30000)
+    except:
+        print("   ⚠️ Wait Timeout: Table rows did not load in time.") 
+
+    # 1. Gold Bar (ตารางเหมือนรอบก่อน -> ไม่ต้อง extract, gold_data = None)
+    gold_data = None
+    hashes = {"new:gold": await region_hash(page, "table tbody")}
+    if known.unchanged("new:gold", hashes["new:gold"]):
+        print("   ⏭️ Gold table unchanged - skip extraction")
+    else:
+        gold_data = []
+        rows = await page.locator("table tbody tr").all()
+        print(f"   [Debug] New Version Found {len(rows)} rows")
+        for row in rows:
+            cells = await row.locator("td").all()
+            if len(cells) >= 10:
+                texts = await asyncio.gather(*[cell.inner_text() for cell in cells])
+                gold_data.append({
+                    "date": texts[0].strip(),
+                    "time": texts[1].strip(),
+                    "round": texts[2].strip(),
+                    "bullion_buy": texts[3].strip(),
+                    "bullion_sell": texts[4].strip(),
+                    "ornament_buy": texts[5].strip(),
+                    "ornament_sell": texts[6].strip(),
+                    "gold_spot": texts[7].strip(),
+                    "thb": texts[8].strip(),
+                    "change": texts[9].replace('\n', '').strip()
+                })
+
+        # Validation: ถ้าไม่เจอข้อมูลทองคำแท่งเลย ให้ถือว่า "ล้มเหลว" เพื่อไปใช้ Classic แทน
+        if not gold_data:
+            raise Exception("Zero Gold Bar rows found in New Version")
+
+    # 2. Jewelry Percent
+    jewelry_data = []
+    try:
+        await page.goto("https://www.goldtraders.or.th/dailyprices", timeout=30000)
+        
+        # Logic from User (Proven to work):
+        await page.wait_for_selector("td:has-text('96.5%')", timeout=20000)
+        
+        # เจาะจงตารางที่มีคำว่า "96.5%" เท่านั้น
+        target_table = page.locator("table").filter(has_text="96.5%")
+        
+        hashes["new:jewelry"] = await region_hash(page, "table")
+        if known.unchanged("new:jewelry", hashes["new:jewelry"]):
+            jewelry_data = None
+        elif await target_table.count() > 0:
+            rows = await target_table.locator("tbody tr").all()
+            for row in rows:
+                cells = await row.locator("td").all()
+                if len(cells) >= 4:
+                    texts = await asyncio.gather(*[cell.inner_text() for cell in cells])
+                    jewelry_data.append({
+                        "type": texts[0].strip(),
+                        "buy": texts[2].strip(),
+                        "sell": texts[3].strip()
+                    })
+    except Exception as e:
+        print(f"   ⚠️ New Version Jewelry Error: {e}")
+
+    # ได้ข้อมูลว่าง -> ไม่จำ hash (รอบหน้า extract ใหม่)
+    if gold_data == []:
+        hashes.pop("new:gold", None)
+    if jewelry_data == []:
+        hashes.pop("new:jewelry", None)
+    return {"gold": gold_data, "jewelry": jewelry_data, "source": "New Website", "hashes": hashes}
+
+# --- LOGIC B: เว็บเวอร์ชันเก่า (Classic .aspx) ---
+async def scrape_classic_version(page: "Page", known: ContentHashes) -> Dict[str, Any]:
+    print("   👉 Trying Classic Version Logic (Fallback)...")
+    await page.goto("https://www.goldtraders.or.th/UpdatePriceList.aspx", timeout=30000)
+    await page.wait_for_selector("#DetailPlace_MainGridView", timeout=15000)
+
+    # 1. Gold Bar
+    gold_data = None
+    hashes = {"classic:gold": await region_hash(page, "#DetailPlace_MainGridView")}
+    if known.unchanged("classic:gold", hashes["classic:gold"]):
+        print("   ⏭️ Gold table unchanged - skip extraction")
+    else:
+        gold_data = []
+        rows = await page.locator("#DetailPlace_MainGridView tr:has(td)").all()
+        for row in rows:
+            cells = await row.locator("td").all()
+            if len(cells) >= 9:
+                texts = await asyncio.gather(*[cell.inner_text() for cell in cells])
+                raw_dt = texts[0].strip().split()
+                d_part = raw_dt[0] if len(raw_dt) > 0 else ""
+                t_part = raw_dt[1] if len(raw_dt) > 1 else ""
+                
+                gold_data.append({
+                    "date": d_part,
+                    "time": t_part,
+                    "round": texts[1].strip(),
+                    "bullion_buy": texts[2].strip(),
+                    "bullion_sell": texts[3].strip(),
+                    "ornament_buy": texts[4].strip(),
+                    "ornament_sell": texts[5].strip(),
+                    "gold_spot": texts[6].strip(),
+                    "thb": texts[7].strip(),
+                    "change": texts[8].strip()
+                })
+
+    # 2. Jewelry Percent
+    jewelry_data = []
+    try:
+        await page.goto("https://www.goldtraders.or.th/DailyPrices.aspx", timeout=15000)
+        await page.wait_for_selector("#DetailPlace_MainGridView", timeout=5000)
+        hashes["classic:jewelry"] = await region_hash(page, "#DetailPlace_MainGridView")
+        if known.unchanged("classic:jewelry", hashes["classic:jewelry"]):
+            jewelry_data = None
+        else:
+            rows = await page.locator("#DetailPlace_MainGridView tr:has(td)").all()
+            for row in rows:
+                cells = await row.locator("td").all()
+                if len(cells) >= 4:
+                    texts = await asyncio.gather(*[cell.inner_text() for cell in cells])
+                    jewelry_data.append({
+                        "type": texts[0].strip(),
+                        "buy": texts[2].strip(),
+                        "sell": texts[3].strip()
+                    })
+    except Exception as e:
+        print(f"   ⚠️ Classic Version Jewelry Error: {e}")
+
+    # ได้ข้อมูลว่าง -> ไม่จำ hash (รอบหน้า extract ใหม่)
+    if gold_data == []:
+        hashes.pop("classic:gold", None)
+    if jewelry_data == []:
+        hashes.pop("classic:jewelry", None)
+    return {"gold": gold_data, "jewelry": jewelry_data, "source": "Classic Website", "hashes": hashes}
+
+# --- Sticky Session + Discovery Mode ---
+async def scrape_goldtraders(session: "BrowserSession", current_source: str,
+                             known: ContentHashes) -> Optional[Dict[str, Any]]:
+    """ลองเว็บเวอร์ชันที่ใช้ได้รอบก่อน (current_source) ก่อน แล้วค่อยหาใหม่ -> None = ล้มเหลวทั้งหมด"""
+    page = await (await session.context(ASSOCIATION_SOURCE)).new_page()
+    result_data = None
+
+    # --- PHASE 1: Fast Track ---
+    if current_source == "New Website":
+        try:
+            result_data = await scrape_new_version(page, known)
+        except Exception:
+            current_source = "None"
+
+    elif current_source == "Classic Website":
+        try:
+            result_data = await scrape_classic_version(page, known)
+        except Exception:
+            current_source = "None"
+
+    # --- PHASE 2: Discovery Mode ---
+    if current_source == "None" or result_data is None:
+        # print(f"🔍 Discovery Mode: Finding active website...")
+        try:
+            result_data = await scrape_new_version(page, known)
+        except Exception as e_new:
+            print(f"   ⚠️ Discovery Mode: New Version failed ({e_new})")
+            # [DISABLED] Fallback to Classic as per user request
+            # try:
+            #     result_data = await scrape_classic_version(page, known)
+            # except Exception as e_classic:
+            #     print(f"   ❌ All sources failed. Classic Error: {e_classic}")
+    return result_data
@@ -0,0 +1,220 @@
+import bisect
+import datetime
+import functools
+import re
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+# ==============================================================================
+# HISTORY STORE (ประวัติราคาทุกรอบ + index สำหรับ Delta API)
+# ==============================================================================
+# sort key = (ปี-เดือน-วัน แบบ ISO, รอบที่) -> เรียงตามเวลาได้ตรงๆ
+RowKey = Tuple[str, int]
+
+_DIGITS = re.compile(r"\d+")
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_thai_date(text: str) -> Optional[datetime.date]:
+    """'19/10/2569' (พ.ศ.) หรือ '19/10/2026' (ค.ศ.) -> date (cache ไว้: แถวในวันเดียวกันใช้ string ซ้ำกัน)"""
+    parts = _DIGITS.findall(text or "")
+    if len(parts) != 3:
+        return None
+    day, month, year = (int(p) for p in parts)
+    if year > 2400:
+        year -= 543
+    try:
+        return datetime.date(year, month, day)
+    except ValueError:
+        return None
+
+
+def parse_round(text: Any) -> Optional[int]:
+    match = _DIGITS.search(str(text or ""))
+    return int(match.group()) if match else None
+
+
+def row_key(row: Dict[str, Any]) -> Optional[RowKey]:
+    date = parse_thai_date(row.get("date", ""))
+    round_no = parse_round(row.get("round"))
+    if date is None or round_no is None:
+        return None
+    return (date.isoformat(), round_no)
+
+
+def format_cursor(key: Optional[RowKey]) -> Optional[str]:
+    """Cursor ที่ส่งให้ client: '2026-10-19:12'"""
+    return f"{key[0]}:{key[1]}" if key else None
+
+
+def parse_cursor(cursor: str) -> Optional[RowKey]:
+    """รับได้ทั้ง '2026-10-19:12' และรูปแบบเดียวกับในตาราง '19/10/2569:12'"""
+    date_part, sep, round_part = cursor.strip().rpartition(":")
+    if not sep:
+        return None
+    round_no = parse_round(round_part)
+    if round_no is None:
+        return None
+    try:
+        date = datetime.date.fromisoformat(date_part)
+    except ValueError:
+        date = parse_thai_date(date_part)
+    if date is None:
+        return None
+    return (date.isoformat(), round_no)
+
+
+def merge_rows(keys: List[RowKey], rows: List[Dict[str, Any]],
+               incoming) -> Tuple[List[RowKey], List[Dict[str, Any]], List[RowKey]]:
+    """
+    รวมแถวที่ import เข้ากับชุดเดิม: merge + sort ครั้งเดียว O((n + m) log)
+    -> (keys ใหม่, rows ใหม่, key ที่ใหม่หรือเปลี่ยน) ไม่แตะ store -> รันใน thread แยกได้
+    """
+    merged = dict(zip(keys, rows))
+    changed: Dict[RowKey, None] = {}  # ordered set (key ซ้ำในไฟล์นับครั้งเดียว)
+    for row in incoming:
+        key = row_key(row)
+        if key is None or merged.get(key) == row:
+            continue
+        merged[key] = row
+        changed[key] = None
+    if not changed:
+        return keys, rows, []
+    ordered = sorted(merged)
+    return ordered, [merged[key] for key in ordered], list(changed)
+
+
+class HistoryStore:
+    """
+    เก็บทุกรอบราคาที่เคยเห็น (ข้ามวันได้) เรียงตามเวลา
+    - keys / rows เป็น parallel sorted lists -> since=<cursor> ใช้ bisect: O(log n + k)
+    - log เก็บ (version, key) ตามลำดับที่รับเข้ามา -> since_version ใช้ bisect: O(log n + k)
+    - log ยาวเกิน max_log -> ตัดครึ่งเก่าทิ้ง แล้วขยับ floor (version ที่ต่ำกว่า floor ตอบเป็น delta ไม่ได้แล้ว)
+    """
+
+    def __init__(self, max_log: int = 50000):
+        self.keys: List[RowKey] = []
+        self.rows: List[Dict[str, Any]] = []
+        self.max_log = max_log
+        self.floor = 0  # since_version(N) ตอบได้ถูกต้องเมื่อ N >= floor
+        self._log_versions: List[int] = []
+        self._log_keys: List[RowKey] = []
+
+    def reset_floor(self, version: int):
+        """ตอน boot: แถวที่ restore มาเป็นสถานะ ณ version นี้ -> ไม่รู้ว่าก่อนหน้านั้นมีอะไรเปลี่ยน"""
+        self.floor = version
+        self._log_versions.clear()
+        self._log_keys.clear()
+
+    def _compact(self):
+        if len(self._log_versions) <= self.max_log:
+            return
+        cut = len(self._log_versions) - self.max_log // 2
+        # แถวที่ถูกตัดมี version <= floor ใหม่ -> client ที่อยู่ต่ำกว่านั้นต้อง resync ทั้งชุด
+        self.floor = max(self.floor, self._log_versions[cut - 1])
+        del self._log_versions[:cut]
+        del self._log_keys[:cut]
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def head(self) -> Optional[str]:
+        return format_cursor(self.keys[-1]) if self.keys else None
+
+    def ingest(self, rows: List[Dict[str, Any]], version: int) -> List[Dict[str, Any]]:
+        """รับแถวจาก scrape (ลำดับอะไรก็ได้) คืนเฉพาะแถวที่ใหม่หรือเปลี่ยนแปลง"""
+        changed = []
+        for row in rows:
+            key = row_key(row)
+            if key is None:
+                continue
+            pos = bisect.bisect_left(self.keys, key)
+            if pos < len(self.keys) and self.keys[pos] == key:
+                if self.rows[pos] == row:
+                    continue
+                self.rows[pos] = row  # สมาคมฯ แก้ไขตัวเลขย้อนหลัง
+            else:
+                self.keys.insert(pos, key)
+                self.rows.insert(pos, row)
+            self._log_versions.append(version)
+            self._log_keys.append(key)
+            changed.append(row)
+        self._compact()
+        return changed
+
+    def snapshot(self) -> Tuple[List[RowKey], List[Dict[str, Any]]]:
+        """สำเนา keys / rows สำหรับ merge_rows() ใน thread (ingest บน event loop แก้ list เดิมได้ระหว่างนั้น)"""
+        return list(self.keys), list(self.rows)
+
+    def bulk_load(self, rows, version: int) -> int:
+        """
+        Import จำนวนมาก (เช่น CSV ย้อนหลังหลายปี) แบบ synchronous: merge_rows() แล้วสลับทั้งชุด
+        แทนการ insert ทีละแถว (O(n) ต่อแถว) -> คืนจำนวนแถวที่ใหม่หรือเปลี่ยน
+        """
+        return self._swap(*merge_rows(self.keys, self.rows, rows), version)
+
+    def apply_merge(self, merged: Tuple[List[RowKey], List[Dict[str, Any]], List[RowKey]], incoming,
+                    version: int, base_version: int) -> int:
+        """
+        สลับผลของ merge_rows() ที่ทำจาก snapshot() ณ base_version (ใน thread) เข้า store
+        - แถวที่ scrape เข้ามาระหว่าง merge (version > base_version) ใส่ทับลงไปอีกครั้ง: ข้อมูลสดชนะไฟล์ import
+        - log ถูกตัดผ่าน base_version ไปแล้ว (ไม่รู้ว่าแถวไหนเปลี่ยน) -> merge ใหม่บน loop
+        """
+        keys, rows, changed = merged
+        if not changed:
+            return 0
+        late = self.since_version(base_version)
+        if late is None:
+            return self.bulk_load(incoming, version)
+        for row in late:
+            key = row_key(row)
+            pos = bisect.bisect_left(keys, key)
+            if pos < len(keys) and keys[pos] == key:
+                rows[pos] = row
+            else:
+                keys.insert(pos, key)
+                rows.insert(pos, row)
+        return self._swap(keys, rows, changed, version)
+
+    def _swap(self, keys: List[RowKey], rows: List[Dict[str, Any]], changed: List[RowKey], version: int) -> int:
+        if not changed:
+            return 0
+        # สลับทั้งชุดทีเดียว (iter_range ที่วิ่งอยู่ใช้ key cursor -> ไม่ข้าม/ไม่ซ้ำ)
+        self.rows = rows
+        self.keys = keys
+        self._log_versions.extend([version] * len(changed))
+        self._log_keys.extend(changed)
+        self._compact()
+        return len(changed)
+
+    def iter_range(self, start: Optional[RowKey] = None, end: Optional[RowKey] = None,
+                   chunk_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        """
+        แถวในช่วง [start, end] เป็นก้อนละ chunk_size (สำหรับ streaming export)
+        - จำแค่ key ของแถวสุดท้ายที่ส่งไป แล้ว bisect ใหม่ทุกก้อน -> ingest ระหว่าง stream ได้ ไม่ต้อง copy ทั้งชุด
+        """
+        last: Optional[RowKey] = None
+        while True:
+            keys = self.keys
+            if last is None:
+                lo = bisect.bisect_left(keys, start) if start is not None else 0
+            else:
+                lo = bisect.bisect_right(keys, last)
+            hi = bisect.bisect_right(keys, end) if end is not None else len(keys)
+            hi = min(hi, lo + chunk_size)
+            if lo >= hi:
+                return
+            chunk = self.rows[lo:hi]
+            last = keys[hi - 1]
+            yield chunk
+
+    def since_cursor(self, key: RowKey) -> List[Dict[str, Any]]:
+        return self.rows[bisect.bisect_right(self.keys, key):]
+
+    def since_version(self, version: int) -> Optional[List[Dict[str, Any]]]:
+        """None = version เก่ากว่า floor (ก่อน restart / log ถูกตัดไปแล้ว) -> client ต้องโหลดทั้งชุดใหม่"""
+        if version < self.floor:
+            return None
+        start = bisect.bisect_right(self._log_versions, version)
+        keys = sorted(set(self._log_keys[start:]))
+        return [self.rows[bisect.bisect_left(self.keys, key)] for key in keys]
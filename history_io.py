@@ -0,0 +1,60 @@
+import csv
+import io
+import json
+from typing import Dict, Any, Iterable, Iterator, List
+
+# ==============================================================================
+# HISTORY EXPORT / IMPORT (NDJSON + CSV แบบเป็นก้อน, อ่าน CSV ย้อนหลังจากไฟล์)
+# ==============================================================================
+# ลำดับ column เดียวกับตาราง Gold Traders (ไฟล์ที่ export ได้ import กลับได้ทันที)
+HISTORY_FIELDS = (
+    "date", "time", "round",
+    "bullion_buy", "bullion_sell", "ornament_buy", "ornament_sell",
+    "gold_spot", "thb", "change",
+)
+REQUIRED_FIELDS = ("date", "round")
+
+
+def ndjson_chunk(rows: List[Dict[str, Any]]) -> bytes:
+    """1 แถว = 1 บรรทัด JSON (client อ่านทีละบรรทัดได้โดยไม่ต้องรอทั้งไฟล์)"""
+    return "".join(
+        json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n" for row in rows
+    ).encode("utf-8")
+
+
+def csv_header() -> bytes:
+    return csv_chunk([dict(zip(HISTORY_FIELDS, HISTORY_FIELDS))])
+
+
+def csv_chunk(rows: List[Dict[str, Any]]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([row.get(field, "") for field in HISTORY_FIELDS] for row in rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+def read_csv(path: str) -> Iterator[Dict[str, str]]:
+    """
+    อ่าน CSV ที่มี header (column ตาม HISTORY_FIELDS, ลำดับไหนก็ได้, column อื่นไม่สนใจ)
+    - utf-8-sig: รองรับไฟล์ที่ save จาก Excel (มี BOM)
+    - ใช้ csv.reader + index ของ column แทน DictReader (เร็วกว่าเมื่อไฟล์ใหญ่)
+    """
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        header = [name.strip().lower() for name in next(reader, [])]
+        missing = [name for name in REQUIRED_FIELDS if name not in header]
+        if missing:
+            raise ValueError(f"{path}: missing column(s) {', '.join(missing)}")
+        columns = [(field, header.index(field)) for field in HISTORY_FIELDS if field in header]
+        width = max(index for _, index in columns) + 1
+        for record in reader:
+            if len(record) < width:
+                continue  # บรรทัดว่าง / ขาด column
+            yield {field: record[index].strip() for field, index in columns}
+
+
+def read_csv_files(paths: Iterable[str]) -> List[Dict[str, str]]:
+    rows: List[Dict[str, str]] = []
+    for path in paths:
+        rows.extend(read_csv(path))
+    return rows
@@ -1,31 +1,63 @@
-from fastapi import FastAPI, Response
+import time
+_IMPORT_STARTED_AT = time.perf_counter()
+
+from fastapi import FastAPI, Query, Request, Response, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from playwright.async_api import async_playwright, Browser, Page
-import uvicorn
 import asyncio
 import datetime
+import glob
+import hmac
+import math
 from typing import Dict, Any, Optional, List
 import os
-import json
-import firebase_admin
-from firebase_admin import credentials, messaging
-from shop import scrape_all_shops
+from prices import ASSOCIATION_SOURCE, association_prices, shop_prices
+from alerts import AlertEngine
+from webhooks import WebhookHub
+from state_store import StateStore
+from payloads import PayloadCache, etag_matches
+import wire
+from history import HistoryStore, merge_rows, parse_cursor, parse_thai_date
+from history_io import csv_chunk, csv_header, ndjson_chunk, read_csv_files
+from analytics import AnalyticsEngine, RESOLUTIONS, SERIES_PRODUCTS
+from compare import ShopComparison
+from snapshot import CacheSnapshot, PERSISTED_FIELDS, latest_row
+from browsers import parse_backends, parse_routes
+from refresh import RefreshCoordinator
+from asset_cache import DEFAULT_DENYLIST
+from content_hash import ContentHashes
+from market_calendar import MarketCalendar
+from ratelimit import (
+    AdmissionControl, AdmissionMiddleware, LagMonitor, TokenBucketTable,
+    PRIORITY_BULK, PRIORITY_CRITICAL, PRIORITY_OPERATOR, PRIORITY_READ
+)
+from workers import (
+    DisabledScraper, InlineScraper, ScraperSettings, ScraperUnavailable, SHOPS_SCOPE, WorkerLimits, WorkerPool, parse_groups
+)
+
+# Playwright / firebase_admin เป็น dependency หนัก (import รวมกันหลายวินาที)
+# -> import แบบ lazy ตอนใช้งานจริง เพื่อให้ Server bind port ได้ทันที
 
 # ==============================================================================
 # 1. CENTRAL DATA STORE (กองกลางเก็บข้อมูล)
 # ==============================================================================
-GLOBAL_CACHE: Dict[str, Any] = {
-    "gold_bar_data": [],      # เก็บประวัติราคาทองคำแท่ง
-    "jewelry_percent": [],    # เก็บราคาทองรูปพรรณ (เฉพาะ %)
-    "shop_data": [],          # เก็บข้อมูลจาก 5 ร้านทอง
-    "last_updated": None,     # เวลาที่อัปเดตล่าสุด
-    "market_status": "Initializing...",
-    "source_type": "None"     # เก็บสถานะว่าใช้เว็บไหนอยู่ (New/Classic/None)
-}
-
-playwright_instance = None
-browser_instance: Optional[Browser] = None
+# Snapshot ปัจจุบัน (immutable) -> เปลี่ยนได้ทางเดียวคือ publish_cache() สลับ reference ทั้งก้อน
+# Reader ให้หยิบ GLOBAL_CACHE มาเก็บในตัวแปร local ครั้งเดียวต่อ request แล้วใช้ตัวนั้นตลอด
+GLOBAL_CACHE: CacheSnapshot = CacheSnapshot()
+
+# Body ของ endpoint ใหญ่ๆ (board/history) ที่ encode + gzip/brotli ไว้แล้วต่อ version
+PAYLOADS = PayloadCache(max_age_seconds=float(os.getenv("PAYLOAD_MAX_AGE_SECONDS", "15")))
+
+# ประวัติทุกรอบที่เคยเห็น (index ตาม cursor / version สำหรับ Delta API)
+HISTORY = HistoryStore()
+# OHLC / SMA / EMA ที่คำนวณต่อยอดทุกครั้งที่มีรอบใหม่เข้ามา
+ANALYTICS = AnalyticsEngine()
+# hash ของตารางราคารอบล่าสุด (ฝั่ง browser) -> ตารางไม่เปลี่ยนก็ข้ามการ extract + งานต่อจากนั้นทั้งหมด
+CONTENT_HASHES = ContentHashes()
+# ราคาร้านที่ normalize แล้ว + best price / spread / premium เทียบสมาคมฯ (คำนวณ 1 ครั้งต่อรอบ)
+SHOP_COMPARISON = ShopComparison(stale_after_seconds=int(os.getenv("SHOP_STALE_AFTER_MINUTES", "15")) * 60)
 
 # ==============================================================================
 # 2. FIREBASE & NOTIFICATION CONFIG (กำหนดค่า Firebase และการแจ้งเตือน)
@@ -34,78 +66,215 @@ browser_instance: Optional[Browser] = None
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 STATE_FILE = os.getenv("NOTIFICATION_STATE_FILE", os.path.join(BASE_DIR, "notification_state.json"))
 CRED_PATH = os.getenv("FIREBASE_CREDENTIALS_PATH", os.path.join(BASE_DIR, "firebase-service-account.json"))
+CACHE_SNAPSHOT_FILE = os.getenv("CACHE_SNAPSHOT_FILE", os.path.join(BASE_DIR, "cache_snapshot.json"))
+ALERTS_STATE_FILE = os.getenv("ALERTS_STATE_FILE", os.path.join(BASE_DIR, "alerts_state.json"))
+WEBHOOKS_STATE_FILE = os.getenv("WEBHOOKS_STATE_FILE", os.path.join(BASE_DIR, "webhooks_state.json"))
+ASSET_CACHE_DIR = os.getenv("ASSET_CACHE_DIR", os.path.join(BASE_DIR, "asset_cache"))
 STALE_AFTER_MINUTES = int(os.getenv("STALE_AFTER_MINUTES", "10"))
+MARKET_CALENDAR_FILE = os.getenv("MARKET_CALENDAR_FILE", os.path.join(BASE_DIR, "market_calendar.json"))
+HISTORY_ARCHIVE_DIR = os.getenv("HISTORY_ARCHIVE_DIR", os.path.join(BASE_DIR, "history_archive"))
 
-def load_notification_state():
-    """โหลดสถานะการแจ้งเตือนจากไฟล์ JSON"""
-    default_state = {
+# เวลาทำการต่อแหล่งข้อมูล + วันหยุด (ใช้ทั้ง scheduler และการตัดสินว่าข้อมูล stale)
+# - ไฟล์ calendar / state ทั้งหมดโหลดใน load_state() ตอน lifespan เริ่ม ไม่ใช่ตอน import:
+#   worker (spawn) import main.py ซ้ำเป็น __mp_main__ -> ห้ามมี I/O กับไฟล์ state ที่ระดับ module
+CALENDAR = MarketCalendar()
+
+NOTIF_TOPIC = "gold_price_updates"
+
+# สถานะการแจ้งเตือน: อ่าน/เขียนใน memory, เขียนไฟล์เบื้องหลัง (atomic + journal กันส่งซ้ำ/ส่งตกหลัง crash)
+NOTIF_STATE = StateStore(
+    STATE_FILE,
+    defaults={
         "last_gold_bar_sell": None,
         "last_update_time": None,
         "last_sent_at": None
-    }
-    try:
-        if os.path.exists(STATE_FILE):
-            with open(STATE_FILE, 'r', encoding='utf-8') as f:
-                state = json.load(f)
-                print(f"✅ [NotifState] Loaded state from {STATE_FILE}")
-                return state
-    except Exception as e:
-        print(f"⚠️ [NotifState] Load failed: {e}")
-    return default_state
+    },
+    journal=True,
+    name="NotifState",
+    indent=2,
+    autoload=False
+)
 
-def save_notification_state(state):
-    """บันทึกสถานะการแจ้งเตือนลงไฟล์ JSON"""
-    try:
-        with open(STATE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(state, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"⚠️ [NotifState] Save failed: {e}")
+# Snapshot ของ GLOBAL_CACHE สำหรับ Warm Start (ไม่ต้องมี journal เพราะเขียนทั้งก้อนทุกรอบอยู่แล้ว)
+CACHE_STATE = StateStore(CACHE_SNAPSHOT_FILE, debounce_seconds=0, name="Snapshot", autoload=False)
 
-# โหลดสถานะเริ่มต้น
-current_state = load_notification_state()
+_messaging_module = None
 
-NOTIF_CACHE = {
-    "last_gold_bar_sell": current_state.get("last_gold_bar_sell"),
-    "last_update_time": current_state.get("last_update_time"),
-    "last_sent_at": current_state.get("last_sent_at"),
-    "topic_name": "gold_price_updates"
-}
+def get_messaging():
+    """เริ่มต้น Firebase Admin SDK ตอนใช้งานครั้งแรก (ไม่ทำตอน import module)"""
+    global _messaging_module
+    if _messaging_module is not None:
+        return _messaging_module
 
-# เริ่มต้น Firebase Admin SDK
-try:
-    if os.path.exists(CRED_PATH):
-        cred = credentials.Certificate(CRED_PATH)
-        firebase_admin.initialize_app(cred)
-        print(f"✅ [Firebase] SDK Initialized Successfully (Using: {os.path.basename(CRED_PATH)})")
-    else:
-        print(f"⚠️ [Firebase] Warning: Credentials not found at {CRED_PATH}. Push notifications disabled.")
-except Exception as e:
-    print(f"❌ [Firebase] Initialization Error: {e}")
+    import firebase_admin
+    from firebase_admin import credentials, messaging
+    try:
+        if os.path.exists(CRED_PATH):
+            cred = credentials.Certificate(CRED_PATH)
+            firebase_admin.initialize_app(cred)
+            print(f"✅ [Firebase] SDK Initialized Successfully (Using: {os.path.basename(CRED_PATH)})")
+        else:
+            print(f"⚠️ [Firebase] Warning: Credentials not found at {CRED_PATH}. Push notifications disabled.")
+    except Exception as e:
+        print(f"❌ [Firebase] Initialization Error: {e}")
+    _messaging_module = messaging
+    return messaging
 
 async def send_push_notification(title: str, body: str, data: Dict[str, str] = None):
     """ส่ง Push Notification ผ่าน FCM Topic"""
     try:
+        messaging = get_messaging()
         message = messaging.Message(
             notification=messaging.Notification(
                 title=title,
                 body=body,
             ),
             data=data or {},
-            topic=NOTIF_CACHE["topic_name"],
+            topic=NOTIF_TOPIC,
         )
         response = messaging.send(message)
         print(f"🔔 [Push] Sent Success: {response}")
         
         # อัปเดตสถานะการส่งสำเร็จหลังจากส่งจริงเท่านั้น
-        NOTIF_CACHE["last_sent_at"] = get_thai_time().isoformat()
-        save_notification_state({
-            "last_gold_bar_sell": NOTIF_CACHE["last_gold_bar_sell"],
-            "last_update_time": NOTIF_CACHE["last_update_time"],
-            "last_sent_at": NOTIF_CACHE["last_sent_at"]
-        })
+        NOTIF_STATE.update(last_sent_at=get_thai_time().isoformat())
     except Exception as e:
         print(f"❌ [Push] Send Error: {e}")
 
+# Alert รายคน (ส่งตรงเข้า device token ไม่ใช่ topic)
+ALERTS = AlertEngine(max_alerts_per_token=int(os.getenv("MAX_ALERTS_PER_DEVICE", "50")))
+# เก็บ alert ลงไฟล์: key = alert id, value = Alert.to_record()
+ALERTS_STATE = StateStore(ALERTS_STATE_FILE, debounce_seconds=5.0, journal=True, name="AlertState", autoload=False)
+FCM_BATCH_SIZE = 500  # FCM send_each รับได้สูงสุด 500 ข้อความต่อครั้ง
+
+# event loop ถือแค่ weak reference ของ task -> ต้องเก็บไว้เอง ไม่งั้น task ที่ยังส่งไม่เสร็จอาจถูก GC ทิ้งกลางทาง
+BACKGROUND_TASKS = set()
+
+def spawn_background(coro) -> "asyncio.Task":
+    task = asyncio.create_task(coro)
+    BACKGROUND_TASKS.add(task)
+    task.add_done_callback(BACKGROUND_TASKS.discard)
+    return task
+
+# Webhook ของ partner (server-to-server): ส่งเมื่อราคาสมาคมฯ / ร้านเปลี่ยน ตาม filter ของแต่ละ subscription
+# เก็บลงไฟล์: key = webhook id, value = Subscription.to_record() (มี secret สำหรับ HMAC)
+WEBHOOKS_STATE = StateStore(WEBHOOKS_STATE_FILE, debounce_seconds=5.0, journal=True, name="WebhookState", autoload=False)
+WEBHOOKS = WebhookHub(
+    concurrency=int(os.getenv("WEBHOOK_CONCURRENCY", "100")),
+    per_host=int(os.getenv("WEBHOOK_PER_HOST", "10")),
+    timeout_seconds=float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "5")),
+    max_attempts=int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5")),
+    max_subscriptions=int(os.getenv("WEBHOOK_MAX_SUBSCRIPTIONS", "5000")),
+    allow_private_targets=os.getenv("WEBHOOK_ALLOW_PRIVATE_TARGETS", "").lower() in ("1", "true", "yes"),
+    on_remove=lambda webhook_id: WEBHOOKS_STATE.delete(str(webhook_id))
+)
+
+def load_state():
+    """โหลด calendar + state ทั้งหมดจากไฟล์ แล้วคืน alert / webhook เข้า engine (เรียกครั้งเดียวใน lifespan)"""
+    CALENDAR.load(MARKET_CALENDAR_FILE)
+    for store in (NOTIF_STATE, CACHE_STATE, ALERTS_STATE, WEBHOOKS_STATE):
+        store.load()
+    for alert_id, record in ALERTS_STATE.snapshot().items():
+        ALERTS.add(*record, alert_id=int(alert_id))
+    for webhook_id, (url, secret, products, sources, sides, min_change) in WEBHOOKS_STATE.snapshot().items():
+        WEBHOOKS.add(url, products, sources, sides, min_change, secret=secret, subscription_id=int(webhook_id))
+
+PRODUCT_LABELS = {
+    "gold_bar_965": "ทองแท่ง 96.5%",
+    "gold_bar_9999": "ทองแท่ง 99.99%",
+    "ornament_965": "รูปพรรณ 96.5%",
+}
+
+def build_alert_message(alert, price: float):
+    source_label = "สมาคมค้าทองคำ" if alert.source == ASSOCIATION_SOURCE else alert.source
+    side_label = "ขายออก" if alert.side == "sell" else "รับซื้อ"
+    direction_label = "สูงกว่า" if alert.direction == "above" else "ต่ำกว่า"
+    messaging = get_messaging()
+    return messaging.Message(
+        notification=messaging.Notification(
+            title="🎯 ราคาทองถึงเป้าหมายแล้ว!",
+            body=f"{PRODUCT_LABELS.get(alert.product, alert.product)} ({source_label}) {side_label} {price:,.0f} "
+                 f"{direction_label} {alert.threshold:,.0f}",
+        ),
+        data={
+            "type": "price_alert",
+            "alert_id": str(alert.id),
+            "source": alert.source,
+            "product": alert.product,
+            "side": alert.side,
+            "direction": alert.direction,
+            "threshold": str(alert.threshold),
+            "price": str(price),
+        },
+        token=alert.token,
+    )
+
+def is_permanent_fcm_error(error: Exception) -> bool:
+    """token ใช้ไม่ได้แล้ว (ลบแอป / token ผิด) -> ส่งซ้ำก็ไม่มีวันสำเร็จ"""
+    from firebase_admin import exceptions
+    messaging = get_messaging()
+    return isinstance(error, (messaging.UnregisteredError, messaging.SenderIdMismatchError,
+                              exceptions.InvalidArgumentError))
+
+def settle_alert(alert, delivered: bool):
+    """
+    หลังส่ง: สำเร็จ / token เสีย -> ลบออกจาก state, ส่งไม่ผ่านชั่วคราว -> คืน alert เข้า engine (รอราคาข้ามเกณฑ์รอบหน้า)
+    - ถ้าผู้ใช้ลบ alert ระหว่างที่กำลังส่ง (ไม่อยู่ใน state แล้ว) จะไม่คืนกลับ
+    """
+    if delivered:
+        ALERTS_STATE.delete(str(alert.id))
+    elif ALERTS_STATE.get(str(alert.id)) is not None:
+        ALERTS.add(alert.token, alert.source, alert.product, alert.side, alert.direction, alert.threshold,
+                   alert_id=alert.id)
+
+async def send_alert_notifications(matches):
+    """ส่ง Alert ที่ match แล้วเป็นชุดๆ (batch ละ 500) ผ่าน FCM send_each -> ลบ alert ออกจาก state เมื่อส่งสำเร็จเท่านั้น"""
+    sent = failed = rearmed = 0
+    for start in range(0, len(matches), FCM_BATCH_SIZE):
+        batch = matches[start:start + FCM_BATCH_SIZE]
+        try:
+            messages = [build_alert_message(alert, price) for alert, price in batch]
+            # send_each เป็น blocking I/O -> โยนไป thread เพื่อไม่ให้ขวาง event loop
+            batch_response = await asyncio.to_thread(get_messaging().send_each, messages)
+            outcomes = [(r.success, r.exception) for r in batch_response.responses]
+        except Exception as e:
+            print(f"❌ [Alert] Batch Send Error: {e}")
+            outcomes = [(False, None)] * len(batch)
+        for (alert, _), (success, error) in zip(batch, outcomes):
+            if success:
+                sent += 1
+            else:
+                failed += 1
+            permanent = error is not None and is_permanent_fcm_error(error)
+            settle_alert(alert, delivered=success or permanent)
+            rearmed += not (success or permanent)
+    print(f"🎯 [Alert] Delivered {sent}/{len(matches)} price alerts ({failed} failed, {rearmed} re-armed)")
+
+def feed_alerts(latest_gold: Optional[Dict[str, Any]], shops: Optional[List[Dict[str, Any]]]):
+    """ป้อนราคาล่าสุดเข้า AlertEngine -> คืน [(alert, price)] ที่ราคาวิ่งข้ามเกณฑ์ (alert ถูกถอดออกจาก engine แล้ว)"""
+    matches = []
+    if latest_gold:
+        matches.extend(ALERTS.on_prices(ASSOCIATION_SOURCE, association_prices(latest_gold)))
+    for shop in shops or []:
+        if not shop.get("error"):
+            matches.extend(ALERTS.on_prices(shop["name"], shop_prices(shop)))
+    return matches
+
+def match_price_alerts(latest_gold: Optional[Dict[str, Any]], shops: Optional[List[Dict[str, Any]]]):
+    """ส่งเฉพาะ alert ที่ราคาวิ่งข้ามเกณฑ์ (ยังอยู่ใน ALERTS_STATE จนกว่าจะส่งสำเร็จ)"""
+    matches = feed_alerts(latest_gold, shops)
+    if matches:
+        spawn_background(send_alert_notifications(matches))
+
+def feed_webhooks(latest_gold: Optional[Dict[str, Any]], shops: Optional[List[Dict[str, Any]]]):
+    """ป้อนราคาล่าสุดเข้า WebhookHub -> คืนรายการราคาที่เปลี่ยนจากรอบก่อน"""
+    changes = []
+    if latest_gold:
+        changes.extend(WEBHOOKS.on_prices(ASSOCIATION_SOURCE, association_prices(latest_gold)))
+    for shop in shops or []:
+        if not shop.get("error"):
+            changes.extend(WEBHOOKS.on_prices(shop["name"], shop_prices(shop)))
+    return changes
+
 # ==============================================================================
 # 3. HELPER FUNCTIONS
 # ==============================================================================
@@ -119,16 +288,59 @@ def set_no_store(response: Response):
     """กำหนดไม่ให้ Cache ข้อมูล (สำหรับข้อมูลสถานะหรือข้อมูลที่ยังไม่พร้อม)"""
     response.headers["Cache-Control"] = "no-store"
 
-def get_latest_gold_item():
-    data = GLOBAL_CACHE["gold_bar_data"]
-    if not data:
-        return {}
-    if GLOBAL_CACHE["source_type"] == "Classic Website":
-        return data[0]
-    return data[-1]
+def publish_cache(**changes) -> CacheSnapshot:
+    """สร้าง snapshot ใหม่ (version + 1) แล้วสลับ reference ทีเดียว (เรียกจาก event loop เท่านั้น)"""
+    global GLOBAL_CACHE
+    GLOBAL_CACHE = GLOBAL_CACHE.evolve(**changes)
+    # version ลงไฟล์ทุกครั้ง (write-behind) -> boot รอบหน้านับต่อได้ ไม่ซ้ำกับเลขที่ client เคยเห็น
+    CACHE_STATE.update(version=GLOBAL_CACHE.version)
+    return GLOBAL_CACHE
+
+def touch_cache(**changes) -> CacheSnapshot:
+    """เปลี่ยน field ที่ไม่ใช่ข้อมูล (เช่น last_updated) โดยไม่ขยับ version -> payload / ETag / delta log ยังใช้ต่อได้"""
+    global GLOBAL_CACHE
+    GLOBAL_CACHE = GLOBAL_CACHE.touch(**changes)
+    return GLOBAL_CACHE
 
-def get_cache_age_seconds():
-    last_updated = GLOBAL_CACHE.get("last_updated")
+def encoded_response(request: Request, cache: CacheSnapshot, name: str, build, max_age=60, s_maxage=60,
+                     wire_view=None) -> Response:
+    """
+    เสิร์ฟ body ที่ encode/compress ไว้แล้วของ snapshot นี้ ตาม Accept-Encoding ของ client
+    - ETag มาจากเนื้อ body ตอน build แรกของ version (คงที่ตลอด version) -> If-None-Match มีตัวที่ตรงตอบ 304
+    - wire_view: แปลง payload JSON -> view สำหรับ msgpack (client ส่ง Accept: application/msgpack)
+    """
+    media_type = "application/json"
+    if wire_view is not None and wire.wants_msgpack(request.headers.get("accept", "")):
+        name, media_type = f"{name}.msgpack", wire.MSGPACK_MEDIA_TYPE
+        payload = PAYLOADS.get(name, cache.version, lambda: wire_view(build(cache)), encode=wire.encode_msgpack)
+    else:
+        payload = PAYLOADS.get(name, cache.version, lambda: build(cache))
+    body, encoding = payload.select(request.headers.get("accept-encoding", ""))
+    etag = payload.etag_for(encoding)
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        response = Response(status_code=304)
+    else:
+        response = Response(content=body, media_type=media_type)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+    response.headers["ETag"] = etag
+    response.headers["Vary"] = "Accept, Accept-Encoding" if wire_view is not None else "Accept-Encoding"
+    set_public_cache(response, max_age=max_age, s_maxage=s_maxage)
+    return response
+
+def negotiated_response(request: Request, response: Response, content: Dict[str, Any], wire_view) -> Any:
+    """endpoint ที่ไม่ได้ pre-encode: msgpack ถ้า client ขอ (คง Cache-Control ที่ตั้งไว้แล้ว) ไม่งั้นคืน dict ตามเดิม"""
+    response.headers["Vary"] = "Accept"
+    if not wire.wants_msgpack(request.headers.get("accept", "")):
+        return content
+    binary = Response(content=wire.encode_msgpack(wire_view(content)), media_type=wire.MSGPACK_MEDIA_TYPE)
+    binary.headers["Vary"] = "Accept"
+    if "cache-control" in response.headers:
+        binary.headers["Cache-Control"] = response.headers["cache-control"]
+    return binary
+
+def get_cache_age_seconds(cache: CacheSnapshot):
+    last_updated = cache.last_updated
     if not last_updated:
         return None
     try:
@@ -138,16 +350,24 @@ def get_cache_age_seconds():
     except Exception:
         return None
 
-def is_data_stale():
-    if not GLOBAL_CACHE["gold_bar_data"]:
+def is_data_stale(cache: CacheSnapshot):
+    if not cache.has_gold_data:
         return True
-    market_open, _ = is_market_open()
-    if not market_open:
-        return False
-    age_seconds = get_cache_age_seconds()
+    # ข้อมูลจาก snapshot ถือว่า stale จนกว่าจะ scrape รอบแรกสำเร็จ
+    if cache.warm_start:
+        return True
+    age_seconds = get_cache_age_seconds(cache)
     if age_seconds is None:
         return True
-    return age_seconds > STALE_AFTER_MINUTES * 60
+    now = get_thai_time()
+    if CALENDAR.is_open(ASSOCIATION_SOURCE, now):
+        return age_seconds > STALE_AFTER_MINUTES * 60
+    # ตลาดปิด: ยังสดอยู่ถ้าได้ข้อมูลช่วงท้ายของรอบที่ปิดล่าสุดไว้แล้ว (วันหยุดยาวก็ไม่ stale)
+    last_close = CALENDAR.last_close(ASSOCIATION_SOURCE, now)
+    if last_close is None:
+        return False
+    updated_at = now - datetime.timedelta(seconds=age_seconds)
+    return updated_at < last_close - datetime.timedelta(minutes=STALE_AFTER_MINUTES)
 
 def get_thai_time():
     """แปลงเวลาปัจจุบันเป็นเวลาไทย (UTC+7)"""
@@ -156,305 +376,234 @@ def get_thai_time():
 
 def is_market_open():
     """
-    เช็คเวลาทำการตลาด Gold Traders
-    - จันทร์-ศุกร์: 09:00 - 17:45
-    - เสาร์: 09:00 - 09:30
-    - อาทิตย์: ปิด
+    เช็คเวลาทำการตลาด Gold Traders ตาม CALENDAR
+    - จันทร์-ศุกร์: 09:00 - 17:45, เสาร์: 09:00 - 10:00, อาทิตย์ + วันหยุดใน market_calendar.json: ปิด
     """
-    now = get_thai_time()
-    weekday = now.weekday() # 0=Mon, 6=Sun
-    current = now.time()
-
-    # วันอาทิตย์ (6): ปิดตลอดวัน
-    if weekday == 6: 
-        return False, "Closed (Sunday)"
-    
-    # Debug Time
-    # print(f"🕒 Server Thai Time: {now.strftime('%Y-%m-%d %H:%M:%S')} (Weekday: {weekday})")
-    
-    # วันเสาร์ (5): เปิดแค่ 09:00 - 10:00 (ขยายเวลาตามคำขอ)
-    if weekday == 5:
-        if datetime.time(9, 0) <= current <= datetime.time(10, 0):
-            return True, "Open (Sat Morning)"
-        return False, "Closed (Sat > 10:00)"
-
-    # วันธรรมดา (0-4): เปิด 09:00 - 17:45
-    if datetime.time(9, 0) <= current <= datetime.time(17, 45):
-        return True, "Open (Weekday)"
-        
-    return False, f"Closed (Outside Hours: {current.strftime('%H:%M')})"
+    return CALENDAR.status(ASSOCIATION_SOURCE, get_thai_time())
 
 def is_shop_open():
     """
-    เช็คเวลาทำการร้านค้า (24/7 ยกเว้นปิดเสาร์ 9:30 - จันทร์ 00:00)
+    เช็คเวลาทำการร้านค้าตาม CALENDAR (24 ชม. ยกเว้นเสาร์ 9:30 - จันทร์ 00:00 และวันหยุด)
     """
-    now = get_thai_time()
-    weekday = now.weekday()
-    current_time = now.time()
-    
-    # Debug Shop Time
-    print(f"🕒 Checker: {now.strftime('%H:%M')} | Weekday: {weekday}")
-
-    # วันอาทิตย์ (6): ปิดตลอดวัน
-    if weekday == 6:
-        return False, "Closed (Sunday)"
-
-    # วันเสาร์ (5): ปิดหลัง 09:30
-    if weekday == 5:
-        if current_time >= datetime.time(9, 30):
-            return False, "Closed (Saturday > 09:30)"
+    return CALENDAR.status(SHOPS_SCOPE, get_thai_time())
 
-    # วันอื่นๆ (จันทร์-ศุกร์): เปิดตลอด
-    return True, "Open (24h)"
-
-# ==============================================================================
-# 3. SCRAPING LOGIC (แยกฟังก์ชันตามเวอร์ชันเว็บ)
-# ==============================================================================
-
-# --- LOGIC A: เว็บเวอร์ชันใหม่ (Clean URL) ---
-async def scrape_new_version(page: Page) -> Dict[str, Any]:
-    print("   👉 Trying New Version Logic...")
-    # Timeout 15s -> 60s (เผื่อเว็บช้ามาก)
-    await page.goto("https://www.goldtraders.or.th/updatepricelist", timeout=60000)
-    # Timeout 5s -> 30s
-    # NEW LOGIC: รอจนกว่าจะมีข้อมูลมากกว่า 2 แถว (Header + Data) ป้องกันการดึงว่าง
-    try:
-        await page.wait_for_function("document.querySelectorAll('table tbody tr').length > 2", timeout=30000)
-    except:
-        print("   ⚠️ Wait Timeout: Table rows did not load in time.") 
-
-    # 1. Gold Bar
-    gold_data = []
-    rows = await page.locator("table tbody tr").all()
-    print(f"   [Debug] New Version Found {len(rows)} rows")
-    for row in rows:
-        cells = await row.locator("td").all()
-        if len(cells) >= 10:
-            texts = await asyncio.gather(*[cell.inner_text() for cell in cells])
-            gold_data.append({
-                "date": texts[0].strip(),
-                "time": texts[1].strip(),
-                "round": texts[2].strip(),
-                "bullion_buy": texts[3].strip(),
-                "bullion_sell": texts[4].strip(),
-                "ornament_buy": texts[5].strip(),
-                "ornament_sell": texts[6].strip(),
-                "gold_spot": texts[7].strip(),
-                "thb": texts[8].strip(),
-                "change": texts[9].replace('\n', '').strip()
-            })
-
-    # Validation: ถ้าไม่เจอข้อมูลทองคำแท่งเลย ให้ถือว่า "ล้มเหลว" เพื่อไปใช้ Classic แทน
-    if not gold_data:
-        raise Exception("Zero Gold Bar rows found in New Version")
-
-    # 2. Jewelry Percent
-    jewelry_data = []
-    try:
-        await page.goto("https://www.goldtraders.or.th/dailyprices", timeout=30000)
-        
-        # Logic from User (Proven to work):
-        await page.wait_for_selector("td:has-text('96.5%')", timeout=20000)
-        
-        # เจาะจงตารางที่มีคำว่า "96.5%" เท่านั้น
-        target_table = page.locator("table").filter(has_text="96.5%")
-        
-        if await target_table.count() > 0:
-            rows = await target_table.locator("tbody tr").all()
-            for row in rows:
-                cells = await row.locator("td").all()
-                if len(cells) >= 4:
-                    texts = await asyncio.gather(*[cell.inner_text() for cell in cells])
-                    jewelry_data.append({
-                        "type": texts[0].strip(),
-                        "buy": texts[2].strip(),
-                        "sell": texts[3].strip()
-                    })
-    except Exception as e:
-        print(f"   ⚠️ New Version Jewelry Error: {e}")
-
-    return {"gold": gold_data, "jewelry": jewelry_data, "source": "New Website"}
-
-# --- LOGIC B: เว็บเวอร์ชันเก่า (Classic .aspx) ---
-async def scrape_classic_version(page: Page) -> Dict[str, Any]:
-    print("   👉 Trying Classic Version Logic (Fallback)...")
-    await page.goto("https://www.goldtraders.or.th/UpdatePriceList.aspx", timeout=30000)
-    await page.wait_for_selector("#DetailPlace_MainGridView", timeout=15000)
-
-    # 1. Gold Bar
-    gold_data = []
-    rows = await page.locator("#DetailPlace_MainGridView tr:has(td)").all()
-    for row in rows:
-        cells = await row.locator("td").all()
-        if len(cells) >= 9:
-            texts = await asyncio.gather(*[cell.inner_text() for cell in cells])
-            raw_dt = texts[0].strip().split()
-            d_part = raw_dt[0] if len(raw_dt) > 0 else ""
-            t_part = raw_dt[1] if len(raw_dt) > 1 else ""
-            
-            gold_data.append({
-                "date": d_part,
-                "time": t_part,
-                "round": texts[1].strip(),
-                "bullion_buy": texts[2].strip(),
-                "bullion_sell": texts[3].strip(),
-                "ornament_buy": texts[4].strip(),
-                "ornament_sell": texts[5].strip(),
-                "gold_spot": texts[6].strip(),
-                "thb": texts[7].strip(),
-                "change": texts[8].strip()
-            })
-
-    # 2. Jewelry Percent
-    jewelry_data = []
+def restore_cache_snapshot():
+    """Warm Start: โหลดข้อมูลชุดล่าสุดกลับเข้า Cache ตอน boot (ระบุว่า stale จนกว่าจะ scrape ใหม่)"""
+    global GLOBAL_CACHE
+    # เก็บเฉพาะ field ที่ยังมีอยู่ (ไฟล์จาก deploy ก่อนหน้าอาจมี key ที่ถูกเปลี่ยนชื่อ/ลบไปแล้ว)
+    persisted = {key: value for key, value in CACHE_STATE.snapshot().items() if key in PERSISTED_FIELDS}
+    version = persisted.pop("version", 0)
+    if not isinstance(version, int) or version < 0:
+        print(f"⚠️ [Snapshot] Ignoring invalid version {version!r}")
+        version = 0
+    # นับ version ต่อจากก่อน restart + since_version ที่เก่ากว่านั้นต้อง resync (410) แม้ restore ข้อมูลไม่สำเร็จ
+    GLOBAL_CACHE = CacheSnapshot(version=version)
+    HISTORY.reset_floor(version)
+    if not persisted:
+        return
     try:
-        await page.goto("https://www.goldtraders.or.th/DailyPrices.aspx", timeout=15000)
-        await page.wait_for_selector("#DetailPlace_MainGridView", timeout=5000)
-        rows = await page.locator("#DetailPlace_MainGridView tr:has(td)").all()
-        for row in rows:
-            cells = await row.locator("td").all()
-            if len(cells) >= 4:
-                texts = await asyncio.gather(*[cell.inner_text() for cell in cells])
-                jewelry_data.append({
-                    "type": texts[0].strip(),
-                    "buy": texts[2].strip(),
-                    "sell": texts[3].strip()
-                })
+        restored = GLOBAL_CACHE.evolve(**persisted, warm_start=True)
+        # แถวที่ restore คือสถานะ ณ version เดิม -> ไม่นับเป็นแถวใหม่ของ delta
+        ANALYTICS.ingest(HISTORY.ingest(restored.gold_bar_data, version))
+        if restored.shop_data:
+            SHOP_COMPARISON.update_shops(restored.shop_data, now=time.time() - (get_cache_age_seconds(restored) or 0))
+        comparison = SHOP_COMPARISON.rebuild(restored.latest_gold)
     except Exception as e:
-        print(f"   ⚠️ Classic Version Jewelry Error: {e}")
-
-    return {"gold": gold_data, "jewelry": jewelry_data, "source": "Classic Website"}
+        # snapshot เสีย/รูปแบบเก่า -> boot แบบ cold (รอ scrape รอบแรก) แทนที่จะทำให้ lifespan ล้ม
+        print(f"⚠️ [Snapshot] Restore failed, starting cold: {e}")
+        return
+    # ราคาตั้งต้นของ alert / webhook -> รอบ scrape แรกหลัง restart จับราคาที่ข้ามเกณฑ์ / เปลี่ยนได้เลย
+    # (ยังไม่มีราคาเดิม จึงไม่มี alert ถูกยิงตรงนี้)
+    feed_alerts(restored.latest_gold, restored.shop_data)
+    feed_webhooks(restored.latest_gold, restored.shop_data)
+    cache = publish_cache(**persisted, warm_start=True, cursor=HISTORY.head, shop_comparison=comparison)
+    print(f"♻️ [Snapshot] Restored {len(cache.gold_bar_data)} rows (updated {cache.last_updated})")
+
+def archive_files(name: Optional[str] = None) -> List[str]:
+    """ไฟล์ CSV ใน HISTORY_ARCHIVE_DIR (ระบุชื่อได้เฉพาะไฟล์ในโฟลเดอร์นี้ ห้ามมี path)"""
+    if name is None:
+        return sorted(glob.glob(os.path.join(HISTORY_ARCHIVE_DIR, "*.csv")))
+    if os.path.basename(name) != name or not name.endswith(".csv"):
+        raise ValueError(f"Invalid archive file name: {name}")
+    path = os.path.join(HISTORY_ARCHIVE_DIR, name)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(name)
+    return [path]
+
+async def import_history_files(paths: List[str]) -> Dict[str, Any]:
+    """
+    Bulk import CSV ย้อนหลัง: parse + merge/sort ใน thread แยก -> สลับเข้า HISTORY ครั้งเดียว -> rebuild analytics ครั้งเดียว
+    """
+    global ANALYTICS
+    started_at = time.perf_counter()
+    rows = await asyncio.to_thread(read_csv_files, paths)
+    # merge จากสำเนา ณ version นี้ (ไม่ขวาง event loop) แล้วเติมแถวที่ scrape เข้ามาระหว่างนั้นตอนสลับ
+    base_version = GLOBAL_CACHE.version
+    merged = await asyncio.to_thread(merge_rows, *HISTORY.snapshot(), rows)
+    imported = HISTORY.apply_merge(merged, rows, GLOBAL_CACHE.version + 1, base_version)
+    if imported:
+        publish_cache(cursor=HISTORY.head)
+        # Analytics ชุดใหม่สร้างใน thread (ไม่ขวาง event loop) แล้วสลับทีเดียว
+        # + เติมแถวที่ scrape เข้ามาระหว่างนั้น (version > version ของสำเนาที่ load)
+        # log ถูก compact ผ่าน version นั้นไปแล้ว (since_version -> None) -> load ใหม่จากประวัติทั้งชุดอีกรอบ
+        engine = AnalyticsEngine()
+        while True:
+            loaded_version = GLOBAL_CACHE.version
+            await asyncio.to_thread(engine.load, list(HISTORY.rows))
+            late = HISTORY.since_version(loaded_version)
+            if late is not None:
+                break
+        engine.ingest(late)
+        ANALYTICS = engine
+    elapsed = time.perf_counter() - started_at
+    result = {
+        "files": [os.path.basename(path) for path in paths],
+        "rows_read": len(rows),
+        "rows_imported": imported,
+        "history_rows": len(HISTORY),
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(len(rows) / elapsed) if elapsed > 0 else None,
+    }
+    print(f"🗄️ [History] Imported {imported}/{len(rows)} rows from {len(paths)} file(s) in {elapsed:.2f}s")
+    return result
 
 # ==============================================================================
-# 4. ORCHESTRATOR & LIFECYCLE MANAGEMENT
+# 3. SCRAPER (worker process ที่มี browser ของตัวเอง หรือใน process นี้)
 # ==============================================================================
+SCRAPER_SETTINGS = ScraperSettings(
+    # Browser: launch Chromium ในเครื่อง (ค่าเริ่มต้น) หรือ pool ของ remote CDP (Lightpanda / Chromium farm)
+    # BROWSER_BACKENDS="chromium=http://chrome-1:9222,http://chrome-2:9222;lightpanda=http://lightpanda:9222"
+    # BROWSER_ROUTES="goldtraders=lightpanda,mts_gold=lightpanda" (source ที่ไม่ระบุใช้ chromium)
+    backends=parse_backends(os.getenv("BROWSER_BACKENDS", "chromium=local")),
+    routes=parse_routes(os.getenv("BROWSER_ROUTES", "")),
+    connect_timeout_ms=int(os.getenv("BROWSER_CONNECT_TIMEOUT_MS", "10000")),
+    # JS/CSS ของหน้าเว็บที่ scrape เก็บลง disk ข้ามรอบ + บล็อก tracker/โฆษณา (worker ละโฟลเดอร์ย่อย)
+    asset_dir=ASSET_CACHE_DIR,
+    asset_max_bytes=int(os.getenv("ASSET_CACHE_MAX_MB", "64")) * 1024 * 1024,
+    denylist=DEFAULT_DENYLIST | {d.strip() for d in os.getenv("ASSET_DENYLIST_EXTRA", "").split(",") if d.strip()},
+    user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
 
-async def start_browser():
-    global playwright_instance, browser_instance
-    if browser_instance: return 
-
-    # print("🚀 [System] Waking up... Starting Browser Engine")
-    playwright_instance = await async_playwright().start()
-    browser_instance = await playwright_instance.chromium.launch(
-        headless=True,
-        args=[
-            '--no-sandbox', 
-            '--disable-setuid-sandbox', 
-            '--disable-dev-shm-usage',
-            '--disable-gpu',
-            '--disable-extensions',
-            '--no-zygote'
-        ]
+# SCRAPER_MODE=process (ค่าเริ่มต้น): Gold Traders / ร้านทอง scrape ใน process ลูกแยกกัน
+#   -> Chromium ค้าง / parse หนัก / driver crash ไม่กระทบ API, ใช้ได้หลาย core
+# SCRAPER_MODE=inline: scrape ใน process นี้ (ประหยัด RAM สำหรับเครื่องเล็ก)
+# SCRAPER_MODE=off: ไม่ scrape เลย (เสิร์ฟจาก snapshot / import อย่างเดียว)
+SCRAPER_MODE = os.getenv("SCRAPER_MODE", "process")
+if SCRAPER_MODE == "off":
+    SCRAPER = DisabledScraper()
+elif SCRAPER_MODE == "inline":
+    SCRAPER = InlineScraper(SCRAPER_SETTINGS)
+else:
+    SCRAPER = WorkerPool(
+        SCRAPER_SETTINGS,
+        parse_groups(os.getenv("SCRAPER_WORKER_GROUPS", f"{ASSOCIATION_SOURCE};{SHOPS_SCOPE}")),
+        WorkerLimits(
+            job_timeout_seconds=float(os.getenv("WORKER_JOB_TIMEOUT_SECONDS", "300")),
+            max_rss_bytes=int(os.getenv("WORKER_MAX_RSS_MB", "1024")) * 1024 * 1024,
+            max_jobs=int(os.getenv("WORKER_MAX_JOBS", "500")),
+            nice=int(os.getenv("WORKER_NICE", "5"))
+        )
     )
 
-async def stop_browser():
-    global playwright_instance, browser_instance
-    if not browser_instance: return 
-
-    print("💤 [System] Hibernate Mode... Shutting down Browser Engine")
-    try:
-        if browser_instance:
-            await browser_instance.close()
-        if playwright_instance:
-            await playwright_instance.stop()
-    except Exception as e:
-        print(f"   ⚠️ Shutdown Warning: {e}")
-    finally:
-        browser_instance = None
-        playwright_instance = None
+# ==============================================================================
+# 4. ORCHESTRATOR & LIFECYCLE MANAGEMENT
+# ==============================================================================
 
-async def update_all_data(scrape_gold: bool = True, scrape_shops: bool = False):
-    global GLOBAL_CACHE
+async def update_all_data(scrape_gold: bool = True, scrape_shops: bool = False) -> Optional[CacheSnapshot]:
+    """Scrape 1 รอบแล้ว publish snapshot ใหม่ -> คืน snapshot นั้น (None = browser ไม่พร้อม)"""
     now_str = get_thai_time().strftime('%H:%M:%S')
     
     # ดึงค่า Source ที่จำไว้ (Sticky Session)
-    current_source = GLOBAL_CACHE.get("source_type", "None")
-
-    if not browser_instance: 
-        print("❌ Error: Browser not running!")
-        return
+    current_source = GLOBAL_CACHE.source_type
+    scopes = {scope for scope, wanted in ((ASSOCIATION_SOURCE, scrape_gold), (SHOPS_SCOPE, scrape_shops)) if wanted}
 
-    context = await browser_instance.new_context(
-        user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-    )
-    
     try:
-        page = await context.new_page()
-        
-        result_data = None
-        
+        # เก็บผลของรอบนี้ไว้ข้างนอกก่อน แล้ว publish ทีเดียวตอนจบ (ไม่มีใครเห็นข้อมูลครึ่งๆ กลางๆ)
+        changes: Dict[str, Any] = {}
+        try:
+            scraped = await SCRAPER.scrape(scopes, current_source, CONTENT_HASHES)
+        except ScraperUnavailable as e:
+            print(f"❌ Error: {e}")
+            return None
+        result_data = scraped["gold"]
+
         # --- PHASE 1 & 2: Gold Traders (Only if requested) ---
         if scrape_gold:
-            # --- PHASE 1: Fast Track ---
-            if current_source == "New Website":
-                try:
-                    result_data = await scrape_new_version(page)
-                except Exception:
-                    current_source = "None"
-
-            elif current_source == "Classic Website":
-                try:
-                    result_data = await scrape_classic_version(page)
-                except Exception:
-                    current_source = "None"
-
-            # --- PHASE 2: Discovery Mode ---
-            if current_source == "None" or result_data is None:
-                # print(f"🔍 [{now_str}] Discovery Mode: Finding active website...")
-                try:
-                    result_data = await scrape_new_version(page)
-                except Exception as e_new:
-                    print(f"   ⚠️ Discovery Mode: New Version failed ({e_new})")
-                    # [DISABLED] Fallback to Classic as per user request
-                    # try:
-                    #     result_data = await scrape_classic_version(page)
-                    # except Exception as e_classic:
-                    #     print(f"   ❌ All sources failed. Classic Error: {e_classic}")
-
             # --- SAVE DATA ---
             if result_data:
-                if result_data["gold"]: GLOBAL_CACHE["gold_bar_data"] = result_data["gold"]
-                if result_data["jewelry"]: GLOBAL_CACHE["jewelry_percent"] = result_data["jewelry"]
-                GLOBAL_CACHE["source_type"] = result_data["source"]
-            else:
-                GLOBAL_CACHE["source_type"] = "None"
+                # ตารางทองไม่เปลี่ยน (hash ตรง) -> แถวใน cache ยังเป็นของ source เดิม ห้ามเปลี่ยน source_type
+                if result_data["gold"]:
+                    changes["gold_bar_data"] = result_data["gold"]
+                    changes["warm_start"] = False
+                    changes["source_type"] = result_data["source"]
+                if result_data["jewelry"]: changes["jewelry_percent"] = result_data["jewelry"]
+            elif GLOBAL_CACHE.source_type != "None":
+                changes["source_type"] = "None"
 
         # --- PHASE 3: Shop Scraping (Parallel) - Only if requested ---
-        if scrape_shops:
-            print(f"🏭 [{now_str}] Scraping 5 Shops...")
-            try:
-                shop_results = await scrape_all_shops(context)
-                GLOBAL_CACHE["shop_data"] = shop_results
-            except Exception as e:
-                print(f"   ❌ Shop Scraping Error: {e}")
+        # None = scrape ร้านล้มเหลวทั้งชุด (worker พัง / exception) -> คงข้อมูลร้านชุดเดิมไว้
+        shop_results = scraped["shops"]
+        if scrape_shops and shop_results is not None:
+            print(f"🏭 [{now_str}] Scraped {len(shop_results)} Shops")
+            changes["shop_data"] = shop_results
+            SHOP_COMPARISON.update_shops(shop_results)
+
+        # --- PUBLISH: index ต่างๆ ใช้ version ถัดไป แล้วสลับ snapshot ทีเดียว (ไม่มี await คั่น) ---
+        # ตารางเหมือนรอบก่อน (hash ตรง) -> ไม่มี gold_bar_data ใน changes: ขยับแค่ last_updated, ข้ามงานข้างล่าง
+        gold_changed = "gold_bar_data" in changes
+        data_changed = gold_changed or "jewelry_percent" in changes or "shop_data" in changes
+        last_updated = get_thai_time().strftime("%Y-%m-%d %H:%M:%S")
+        if gold_changed:
+            new_rows = HISTORY.ingest(changes["gold_bar_data"], GLOBAL_CACHE.version + 1)
+            if new_rows:
+                ANALYTICS.ingest(new_rows)
+        if gold_changed or scrape_shops:
+            # view เปรียบเทียบไปกับ snapshot ชุดเดียวกัน -> request ที่เห็น version ใหม่ได้ view ใหม่เสมอ
+            changes["shop_comparison"] = SHOP_COMPARISON.rebuild(latest_row(
+                changes.get("gold_bar_data", GLOBAL_CACHE.gold_bar_data),
+                changes.get("source_type", GLOBAL_CACHE.source_type)
+            ))
+        if changes:
+            cache = publish_cache(**changes, last_updated=last_updated, cursor=HISTORY.head)
+        else:
+            # ไม่มีอะไรเปลี่ยน -> version เดิม (ไม่ทิ้ง payload ที่ encode ไว้ / ไม่เพิ่มรอบว่างใน delta log)
+            cache = touch_cache(last_updated=last_updated)
+        if scrape_gold:
+            CONTENT_HASHES.commit(result_data.get("hashes", {}) if result_data else {}, cache.source_type)
 
-        GLOBAL_CACHE["last_updated"] = get_thai_time().strftime("%Y-%m-%d %H:%M:%S")
+        # --- PHASE 3.5: PER-USER PRICE ALERTS ---
+        match_price_alerts(
+            cache.latest_gold if gold_changed else None,
+            cache.shop_data if scrape_shops else None
+        )
+
+        # --- PHASE 3.6: PARTNER WEBHOOKS (เข้าคิวแล้วส่งเบื้องหลัง ไม่รอผล) ---
+        price_changes = feed_webhooks(
+            cache.latest_gold if gold_changed else None,
+            cache.shop_data if scrape_shops else None
+        )
+        if price_changes:
+            queued = WEBHOOKS.publish(price_changes, version=cache.version, updated_at=cache.last_updated)
+            if queued:
+                print(f"🪝 [Webhook] {len(price_changes)} price change(s) queued for {queued} endpoint(s)")
 
         # --- PHASE 4: CHECK FOR PRICE CHANGE & NOTIFY ---
-        if scrape_gold and GLOBAL_CACHE["gold_bar_data"]:
+        if gold_changed and cache.has_gold_data:
             # ดึงข้อมูลราคาทองแท่งล่าสุด
-            latest_data = None
-            if GLOBAL_CACHE["source_type"] == "Classic Website":
-                latest_data = GLOBAL_CACHE["gold_bar_data"][0]
-            else:
-                latest_data = GLOBAL_CACHE["gold_bar_data"][-1]
+            latest_data = cache.latest_gold
             
             current_sell = latest_data.get("bullion_sell", "").replace(",", "")
             current_ornament = latest_data.get("ornament_sell", "").replace(",", "")
             
             # ตรวจสอบว่าราคาเปลี่ยนจากครั้งก่อนหรือไม่
-            if current_sell and current_sell != NOTIF_CACHE["last_gold_bar_sell"]:
-                old_price = NOTIF_CACHE["last_gold_bar_sell"]
-                
-                # อัปเดต Cache และบันทึก State ทันที
-                NOTIF_CACHE["last_gold_bar_sell"] = current_sell
-                NOTIF_CACHE["last_update_time"] = latest_data.get("time", "")
+            if current_sell and current_sell != NOTIF_STATE.get("last_gold_bar_sell"):
+                old_price = NOTIF_STATE.get("last_gold_bar_sell")
                 
-                save_notification_state({
-                    "last_gold_bar_sell": NOTIF_CACHE["last_gold_bar_sell"],
-                    "last_update_time": NOTIF_CACHE["last_update_time"],
-                    "last_sent_at": NOTIF_CACHE["last_sent_at"]
-                })
+                # อัปเดต State ทันที (journal ลงไฟล์เบื้องหลัง ไม่ขวาง event loop)
+                NOTIF_STATE.update(
+                    last_gold_bar_sell=current_sell,
+                    last_update_time=latest_data.get("time", "")
+                )
                 
                 # ถ้าไม่ใช่ครั้งแรกที่รัน (old_price ไม่เป็น None) ให้ส่ง Notification
                 if old_price is not None:
@@ -472,7 +621,7 @@ async def update_all_data(scrape_gold: bool = True, scrape_shops: bool = False):
                     body = f"ทองแท่ง: {price_num} | รูปพรรณ: {ornament_num} ({change_text})"
                     
                     # ส่งในรูปแบบ async โดยไม่รอผลกระทบต่อ scraping cycle
-                    asyncio.create_task(send_push_notification(
+                    spawn_background(send_push_notification(
                         title=title,
                         body=body,
                         data={
@@ -483,74 +632,162 @@ async def update_all_data(scrape_gold: bool = True, scrape_shops: bool = False):
                             "update_time": latest_data.get("time", "")
                         }
                     ))
+
+        # --- PHASE 5: PERSIST SNAPSHOT (สำหรับ Warm Start รอบหน้า) ---
+        if data_changed:
+            CACHE_STATE.update(**cache.persisted())
+        else:
+            CACHE_STATE.update(last_updated=cache.last_updated)
+        return cache
     
     except Exception as e:
         print(f"🔥 Critical System Error: {e}")
-        GLOBAL_CACHE["source_type"] = "None"
-    
-    finally:
-        # 🛡️ CLEANUP: Always close the context!
-        await context.close()
+        return publish_cache(source_type="None")
+
+REFRESH_SCOPES = {ASSOCIATION_SOURCE, SHOPS_SCOPE}
+
+async def run_refresh(scopes) -> Optional[CacheSnapshot]:
+    await SCRAPER.start()
+    return await update_all_data(scrape_gold=ASSOCIATION_SOURCE in scopes, scrape_shops=SHOPS_SCOPE in scopes)
+
+# ทุกการ scrape (scheduler / POST /api/refresh / startup) ผ่าน single-flight เดียวกัน -> ไม่มี browser run ซ้อนกัน
+REFRESH = RefreshCoordinator(run_refresh, min_interval_seconds=float(os.getenv("REFRESH_MIN_INTERVAL_SECONDS", "30")))
+REFRESH_TOKEN = os.getenv("REFRESH_TOKEN")
+
+# ระยะห่างระหว่างรอบ scrape ตอนตลาด/ร้านเปิด (ตอนปิด scheduler หลับยาวจนถึงเวลาเปิดถัดไป)
+POLL_INTERVALS = {
+    ASSOCIATION_SOURCE: int(os.getenv("GOLD_POLL_SECONDS", "120")),
+    SHOPS_SCOPE: int(os.getenv("SHOP_POLL_SECONDS", "300")),
+}
+SCHEDULER_MAX_SLEEP_SECONDS = 3600  # ตื่นมาเช็คอย่างน้อยชั่วโมงละครั้ง (เผื่อไฟล์ calendar ถูกแก้)
 
 async def run_scheduler():
-    tick_counter = 0
+    # เพิ่ง scrape ครบทุก scope ตอน startup -> นับรอบถัดไปต่อจากตอนนี้
+    started = get_thai_time()
+    next_due = {scope: started + datetime.timedelta(seconds=interval) for scope, interval in POLL_INTERVALS.items()}
     while True:
+        CALENDAR.reload_if_changed()
         is_open, status_msg = is_market_open()
         is_shops_active, shop_status_msg = is_shop_open()
         
-        GLOBAL_CACHE["market_status"] = f"{status_msg} | {shop_status_msg}"
+        market_status = f"{status_msg} | {shop_status_msg}"
+        if market_status != GLOBAL_CACHE.market_status:
+            publish_cache(market_status=market_status)
         
         # Logic: 
-        # 1. Gold Traders: ทำงานเฉพาะตลาดเปิด + ทุก 2 นาที (tick % 2 == 0) -> เพื่อประหยัดค่าใช้จ่าย
-        # 2. Shops: ทำงานตลอด (ยกเว้นปิดสุดสัปดาห์) + ทุก 5 นาที (tick % 5 == 0)
+        # 1. Gold Traders: ทำงานเฉพาะตลาดเปิด (ตาม calendar) ทุก GOLD_POLL_SECONDS -> เพื่อประหยัดค่าใช้จ่าย
+        # 2. Shops: ทำงานเมื่อร้านเปิด (ตาม calendar) ทุก SHOP_POLL_SECONDS
+        open_scopes = {scope for scope, active in ((ASSOCIATION_SOURCE, is_open), (SHOPS_SCOPE, is_shops_active)) if active}
+        now = get_thai_time()
+        due = {scope for scope in open_scopes if now >= next_due[scope]}
+        if due:
+             # Wake Up (ถ้ามี refresh วิ่งอยู่และครอบคลุมแล้ว จะรอผลรอบนั้นแทน)
+             await REFRESH.run(due)
+             finished = get_thai_time()
+             for scope in due:
+                 next_due[scope] = finished + datetime.timedelta(seconds=POLL_INTERVALS[scope])
+
+        # หลับจนถึงรอบถัดไป หรือจุดเปิด/ปิดถัดไปของ calendar (แล้วแต่อันไหนถึงก่อน) แทนการตื่นทุก 60 วินาที
+        now = get_thai_time()
+        wake_candidates = [next_due[scope] for scope in open_scopes]
+        for scope in POLL_INTERVALS:
+            transition = CALENDAR.next_transition(scope, now)
+            if transition is not None:
+                wake_candidates.append(transition)
+        wake_at = min(wake_candidates, default=now + datetime.timedelta(seconds=SCHEDULER_MAX_SLEEP_SECONDS))
+        sleep_seconds = min(max(1.0, (wake_at - now).total_seconds()), SCHEDULER_MAX_SLEEP_SECONDS)
+
+        # Optimization: Hibernate (Auto-Wake / Auto-Sleep) ถ้ารอบถัดไปยังอีกนาน
+        # (ยกเว้นมี refresh แบบ on-demand กำลังใช้ browser อยู่)
+        if sleep_seconds > 60 and not REFRESH.busy:
+             await SCRAPER.hibernate()
+        if not open_scopes:
+            print(f"💤 Market Closed ({market_status}) - Sleeping until {wake_at.strftime('%a %H:%M')}")
         
-        do_scrape_gold = is_open and (tick_counter % 2 == 0)
-        do_scrape_shops = is_shops_active and (tick_counter % 5 == 0)
-
-        # Optimization: Hibernate (Auto-Wake / Auto-Sleep)
-        if do_scrape_gold or do_scrape_shops:
-             # Wake Up
-             await start_browser()
-             await update_all_data(scrape_gold=do_scrape_gold, scrape_shops=do_scrape_shops)
-        else:
-             # Hibernate
-             await stop_browser()
-             if tick_counter % 60 == 0:
-                print(f"💤 Market Closed ({GLOBAL_CACHE['market_status']}) - RAM Saved!")
-        
-        tick_counter += 1
-        await asyncio.sleep(60)
+        await asyncio.sleep(sleep_seconds)
 
 # ==============================================================================
 # 5. LIFESPAN & API ENDPOINTS
 # ==============================================================================
+# Rate limit ต่อ client + load shedding เมื่อ event loop ช้า (scheduler / แจ้งเตือนอยู่ loop เดียวกับ API)
+# route ที่ไม่อยู่ในตาราง = PRIORITY_READ, prefix ตรงตัวหรือตามด้วย "/" (ตัวแรกที่ตรงชนะ)
+ROUTE_PRIORITIES = [
+    ("/health", PRIORITY_CRITICAL),
+    ("/ready", PRIORITY_CRITICAL),
+    ("/api/refresh", PRIORITY_OPERATOR),
+    ("/api/webhooks", PRIORITY_OPERATOR),
+    ("/api/history/import", PRIORITY_OPERATOR),
+    ("/api/history", PRIORITY_BULK),
+    ("/api/analytics", PRIORITY_BULK),
+]
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "120"))
+LOOP_LAG = LagMonitor()
+ADMISSION = AdmissionControl(
+    TokenBucketTable(
+        rate_per_second=RATE_LIMIT_PER_MINUTE / 60,
+        burst=float(os.getenv("RATE_LIMIT_BURST", "30")),
+        max_clients=int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "65536"))
+    ),
+    LOOP_LAG,
+    ROUTE_PRIORITIES,
+    # operator หักเท่า bulk ก่อนตรวจ token (เดา token ได้ไม่เกิน ~rate/5 ครั้ง) แล้ว refund เมื่อผ่านสิทธิ์
+    costs={PRIORITY_OPERATOR: 5.0, PRIORITY_READ: 1.0, PRIORITY_BULK: 5.0},
+    shed_lag_seconds=float(os.getenv("LOAD_SHED_LAG_MS", "250")) / 1000,
+    api_keys=[k.strip() for k in os.getenv("RATE_LIMIT_API_KEYS", "").split(",") if k.strip()],
+    api_key_multiplier=float(os.getenv("RATE_LIMIT_API_KEY_MULTIPLIER", "10")),
+    trust_forwarded=os.getenv("TRUST_FORWARDED_FOR", "").lower() in ("1", "true", "yes"),
+    enabled=RATE_LIMIT_PER_MINUTE > 0
+)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global playwright_instance, browser_instance
     print("🚀 Hybrid System Starting (with Hibernate Mode)...")
+
+    load_state()
+    LOOP_LAG.start()
+
+    # 0. Warm Start: เสิร์ฟข้อมูลชุดล่าสุดได้ทันที ไม่ต้องรอ Chromium + scrape รอบแรก
+    restore_cache_snapshot()
     
     # 1. ย้ายการทำงานหนัก (Initial Scrape) ไปไว้ใน Background Task
     # เพื่อให้ FastAPI Start Server เสร็จทันที (ป้องกัน Error 502 / Health Check Timeout)
     async def initial_startup():
         print("⏳ Incoming: Initial Scrape (Background)...")
-        await start_browser()
+        # Import + init firebase_admin ใน thread แยก (ไม่ขวาง request แรกๆ)
+        await asyncio.to_thread(get_messaging)
+
+        # โหลดประวัติย้อนหลังจาก HISTORY_ARCHIVE_DIR (ถ้ามี) ก่อน scrape รอบแรก
+        paths = archive_files()
+        if paths:
+            try:
+                await import_history_files(paths)
+            except Exception as e:
+                print(f"⚠️ [History] Archive import failed: {e}")
         
         # Force Scrape: บังคับดึงข้อมูล 1 รอบตอนเปิด Server เสมอ (ไม่สนตลาดเปิด/ปิด)
         # เพื่อให้มีข้อมูลใน Cache ไปแสดงผล (จะได้ไม่ขึ้น waiting_for_data)
-        await update_all_data(scrape_gold=True, scrape_shops=True)
+        await REFRESH.run(REFRESH_SCOPES)
         
         # เริ่ม Scheduler หลังจาก Initial Scrape เสร็จ
-        asyncio.create_task(run_scheduler())
+        spawn_background(run_scheduler())
 
-    asyncio.create_task(initial_startup())
+    spawn_background(initial_startup())
+    print(f"⚡ [System] Serving after {time.perf_counter() - _IMPORT_STARTED_AT:.2f}s (since import)")
     
     yield
     
     print("🛑 System Stopping...")
-    await stop_browser()
+    await LOOP_LAG.stop()
+    await SCRAPER.close()
+    await WEBHOOKS.close()
+    for store in (NOTIF_STATE, CACHE_STATE, ALERTS_STATE, WEBHOOKS_STATE):
+        store.close()
 
 app = FastAPI(lifespan=lifespan)
 
+# เพิ่มก่อน CORS -> CORS อยู่ชั้นนอก (preflight ไม่ถูกนับ, 429 ยังมี CORS header ให้ browser อ่านได้)
+app.add_middleware(AdmissionMiddleware, control=ADMISSION)
+
 # Allow CORS for PWA and Web Apps
 app.add_middleware(
     CORSMiddleware,
@@ -573,134 +810,483 @@ def health_check(response: Response):
 @app.get("/ready")
 def readiness_check(response: Response):
     """Endpoint สำหรับเช็คความพร้อมของข้อมูล (Readiness)"""
+    cache = GLOBAL_CACHE
     set_no_store(response)
-    has_data = len(GLOBAL_CACHE["gold_bar_data"]) > 0
+    has_data = cache.has_gold_data
     if not has_data:
         response.status_code = 503
     
     return {
         "status": "ready" if has_data else "not_ready",
         "has_gold_data": has_data,
-        "stale": is_data_stale(),
-        "age_seconds": get_cache_age_seconds(),
-        "source": GLOBAL_CACHE["source_type"],
-        "last_updated": GLOBAL_CACHE["last_updated"],
-        "market_status": GLOBAL_CACHE["market_status"]
+        "warm_start": cache.warm_start,
+        "stale": is_data_stale(cache),
+        "age_seconds": get_cache_age_seconds(cache),
+        "source": cache.source_type,
+        "last_updated": cache.last_updated,
+        "market_status": cache.market_status,
+        "scraper": SCRAPER.status(),
+        "refresh": REFRESH.status(),
+        "webhooks": WEBHOOKS.status(),
+        "admission": ADMISSION.status(),
+        "content_hash": CONTENT_HASHES.status()
+    }
+
+def require_refresh_token(request: Request):
+    """Endpoint สำหรับผู้ดูแล: ต้องส่ง Authorization: Bearer <REFRESH_TOKEN>"""
+    if not REFRESH_TOKEN:
+        raise HTTPException(status_code=503, detail="Disabled (REFRESH_TOKEN not set)")
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip().encode(), REFRESH_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid refresh token", headers={"WWW-Authenticate": "Bearer"})
+    # ผู้ดูแลตัวจริงไม่เสียโควต้า rate limit (มี cooldown ของ RefreshCoordinator แทน)
+    ADMISSION.refund(request.scope)
+
+@app.post("/api/refresh")
+async def refresh_now(request: Request, response: Response, source: str = "all"):
+    """
+    สั่ง scrape ทันที (ต้องส่ง Authorization: Bearer <REFRESH_TOKEN>)
+    - ?source=goldtraders / shops / all
+    - คำขอที่มาพร้อมกัน (รวมถึง scheduler tick) รวมเป็น browser run เดียว ทุกคนได้ผลลัพธ์ชุดเดียวกัน
+    - ขอ source เดิมถี่กว่า REFRESH_MIN_INTERVAL_SECONDS -> 429 + Retry-After
+    """
+    set_no_store(response)
+    require_refresh_token(request)
+
+    scopes = REFRESH_SCOPES if source == "all" else {source}
+    if not scopes <= REFRESH_SCOPES:
+        raise HTTPException(status_code=422, detail=f"Unknown source (expected all, {', '.join(sorted(REFRESH_SCOPES))})")
+    wait = REFRESH.admit(scopes)
+    if wait > 0:
+        raise HTTPException(status_code=429, detail="Refreshed too recently",
+                            headers={"Retry-After": str(math.ceil(wait))})
+
+    started_at = time.perf_counter()
+    cache, coalesced = await REFRESH.run(scopes)
+    if cache is None:
+        raise HTTPException(status_code=503, detail="Browser not available")
+    return {
+        "status": "failed" if ASSOCIATION_SOURCE in scopes and cache.source_type == "None" else "success",
+        "scopes": sorted(scopes),
+        "coalesced": coalesced,
+        "duration_seconds": round(time.perf_counter() - started_at, 2),
+        "source": cache.source_type,
+        "version": cache.version,
+        "cursor": cache.cursor,
+        "stale": is_data_stale(cache),
+        "updated_at": cache.last_updated
     }
 
 @app.get("/")
 def read_root(response: Response):
+    cache = GLOBAL_CACHE
     set_public_cache(response, max_age=15, s_maxage=30)
     return {
         "message": "Thai Gold Price API (Hybrid Auto-Switch)",
-        "source_used": GLOBAL_CACHE["source_type"],
-        "market_status": GLOBAL_CACHE["market_status"],
-        "stale": is_data_stale(),
-        "age_seconds": get_cache_age_seconds(),
-        "last_updated": GLOBAL_CACHE["last_updated"]
+        "source_used": cache.source_type,
+        "market_status": cache.market_status,
+        "stale": is_data_stale(cache),
+        "age_seconds": get_cache_age_seconds(cache),
+        "last_updated": cache.last_updated
     }
 
+@app.get("/api/schema")
+def get_wire_schema(response: Response):
+    """Schema ของ binary format (msgpack) สำหรับ client ที่ส่ง Accept: application/msgpack"""
+    set_public_cache(response, max_age=3600, s_maxage=3600)
+    return {**wire.SCHEMA, "available": wire.available()}
+
 @app.get("/api/latest")
-def get_latest(response: Response):
-    data = GLOBAL_CACHE["gold_bar_data"]
+def get_latest(request: Request, response: Response):
+    cache = GLOBAL_CACHE
+    data = cache.gold_bar_data
     if not data:
         set_no_store(response)
-        return {"status": "waiting_for_data", "market_status": GLOBAL_CACHE["market_status"]}
+        return {"status": "waiting_for_data", "market_status": cache.market_status}
     
     set_public_cache(response, max_age=15, s_maxage=30)
     
     # Logic เลือกข้อมูลล่าสุดตาม Source
-    return {
+    return negotiated_response(request, response, {
         "status": "success",
-        "source": GLOBAL_CACHE["source_type"],
-        "data": get_latest_gold_item(),
-        "stale": is_data_stale(),
-        "age_seconds": get_cache_age_seconds(),
-        "updated_at": GLOBAL_CACHE["last_updated"]
-    }
+        "source": cache.source_type,
+        "data": cache.latest_gold,
+        "stale": is_data_stale(cache),
+        "age_seconds": get_cache_age_seconds(cache),
+        "updated_at": cache.last_updated
+    }, wire.latest)
 
 @app.get("/api/gold")
-def get_gold_buy_only(response: Response):
-    data = GLOBAL_CACHE["gold_bar_data"]
+def get_gold_buy_only(request: Request, response: Response):
+    cache = GLOBAL_CACHE
+    data = cache.gold_bar_data
     if not data: 
         set_no_store(response)
         return {"status": "waiting_for_data"}
 
     set_public_cache(response, max_age=15, s_maxage=30)
 
-    latest = get_latest_gold_item()
+    latest = cache.latest_gold
 
-    return {
+    return negotiated_response(request, response, {
         "status": "success",
-        "source": GLOBAL_CACHE["source_type"],
+        "source": cache.source_type,
         "bullion_buy": latest.get("bullion_buy"),
         "ornament_buy": latest.get("ornament_buy"),
-        "stale": is_data_stale(),
-        "age_seconds": get_cache_age_seconds(),
-        "updated_at": GLOBAL_CACHE["last_updated"]
+        "stale": is_data_stale(cache),
+        "age_seconds": get_cache_age_seconds(cache),
+        "updated_at": cache.last_updated
+    }, wire.gold)
+
+def build_history_payload(cache: CacheSnapshot):
+    return {
+        "count": len(cache.gold_bar_data),
+        "source": cache.source_type,
+        "data": cache.gold_bar_data,
+        "cursor": cache.cursor,
+        "version": cache.version,
+        "stale": is_data_stale(cache),
+        "age_seconds": get_cache_age_seconds(cache),
+        "updated_at": cache.last_updated
     }
 
 @app.get("/api/history")
-def get_history(response: Response):
+def get_history(request: Request, response: Response, since: Optional[str] = None,
+                since_version: Optional[int] = None):
+    """
+    Delta Mode: ส่งเฉพาะแถวที่ใหม่กว่า cursor (เรียงเก่า -> ใหม่เสมอ)
+    - ?since=2026-10-19:12  -> แถวหลังรอบที่ 12 ของวันนั้น
+    - ?since_version=N      -> แถวที่เข้ามาหลัง cache version N (410 ถ้า N เก่ากว่า HISTORY.floor หรือใหม่กว่าปัจจุบัน)
+    """
+    cache = GLOBAL_CACHE
+    if since is None and since_version is None:
+        return encoded_response(request, cache, "history", build_history_payload, max_age=60, s_maxage=120,
+                                wire_view=wire.history)
+
+    if since is not None:
+        key = parse_cursor(since)
+        if key is None:
+            raise HTTPException(status_code=422, detail="Invalid cursor (expected YYYY-MM-DD:<round>)")
+        rows = HISTORY.since_cursor(key)
+    else:
+        rows = HISTORY.since_version(since_version) if since_version <= cache.version else None
+        if rows is None:
+            # version จากก่อน restart / เก่ากว่า log ที่เก็บไว้ -> ตอบ delta ไม่ได้ ให้ client โหลดทั้งชุดใหม่
+            raise HTTPException(
+                status_code=410,
+                detail=f"since_version {since_version} is no longer available "
+                       f"(valid {HISTORY.floor}-{cache.version}); reload /api/history"
+            )
+
+    set_public_cache(response, max_age=15, s_maxage=30)
+    return negotiated_response(request, response, {
+        "status": "success",
+        "mode": "delta",
+        "count": len(rows),
+        "source": cache.source_type,
+        "data": rows,
+        "cursor": HISTORY.head,
+        "version": cache.version,
+        "stale": is_data_stale(cache),
+        "age_seconds": get_cache_age_seconds(cache),
+        "updated_at": cache.last_updated
+    }, wire.history)
+
+EXPORT_FORMATS = {
+    # format -> (media type, นามสกุลไฟล์, encoder ต่อก้อน, header)
+    "ndjson": ("application/x-ndjson", "ndjson", ndjson_chunk, None),
+    "csv": ("text/csv; charset=utf-8", "csv", csv_chunk, csv_header),
+}
+EXPORT_CHUNK_ROWS = 1000
+
+def parse_export_date(text: str) -> datetime.date:
+    try:
+        return datetime.date.fromisoformat(text)
+    except ValueError:
+        date = parse_thai_date(text)
+    if date is None:
+        raise HTTPException(status_code=422, detail=f"Invalid date: {text} (expected YYYY-MM-DD)")
+    return date
+
+@app.get("/api/history/export")
+async def export_history(fmt: str = Query("ndjson", alias="format"), start: Optional[str] = None,
+                         end: Optional[str] = None):
+    """
+    Export ประวัติทั้งหมด (หรือช่วง ?start=YYYY-MM-DD&end=YYYY-MM-DD รวมวันปลาย) แบบ streaming
+    - ?format=ndjson (ค่าเริ่มต้น) หรือ csv (column เดียวกับ /api/history/import)
+    - ส่งทีละ EXPORT_CHUNK_ROWS แถว -> memory คงที่ไม่ว่าช่วงจะยาวแค่ไหน, byte แรกออกทันที
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=422, detail=f"Unknown format (expected {', '.join(EXPORT_FORMATS)})")
+    media_type, extension, encode, header = EXPORT_FORMATS[fmt]
+    start_date = parse_export_date(start) if start else None
+    end_date = parse_export_date(end) if end else None
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=422, detail="start must not be after end")
+    chunks = HISTORY.iter_range(
+        (start_date.isoformat(), 0) if start_date else None,
+        (end_date.isoformat(), math.inf) if end_date else None,
+        EXPORT_CHUNK_ROWS,
+    )
+
+    async def body():
+        if header is not None:
+            yield header()
+        for rows in chunks:
+            yield encode(rows)
+            await asyncio.sleep(0)  # คืน event loop ระหว่างก้อน (export ยาวๆ ไม่ขวาง request อื่น)
+
+    filename = f"gold_history_{start_date or 'all'}_{end_date or 'latest'}.{extension}"
+    return StreamingResponse(body(), media_type=media_type, headers={
+        "Cache-Control": "no-store",
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    })
+
+@app.post("/api/history/import")
+async def import_history(request: Request, response: Response, file: Optional[str] = None):
+    """
+    Bulk import CSV ย้อนหลังจาก HISTORY_ARCHIVE_DIR บน server (ต้องส่ง Authorization: Bearer <REFRESH_TOKEN>)
+    - ?file=2025.csv -> เฉพาะไฟล์นั้น, ไม่ระบุ -> ทุกไฟล์ *.csv ในโฟลเดอร์
+    """
+    set_no_store(response)
+    require_refresh_token(request)
+    try:
+        paths = archive_files(file)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Archive file not found: {file}")
+    if not paths:
+        raise HTTPException(status_code=404, detail="No CSV files in archive directory")
+    try:
+        result = await import_history_files(paths)
+    except (OSError, ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=422, detail=f"Import failed: {e}")
+    return {"status": "success", **result}
+
+def check_series(product: str, side: str):
+    if product not in SERIES_PRODUCTS or side not in ("buy", "sell"):
+        raise HTTPException(status_code=422, detail=f"Unknown series (product: {', '.join(SERIES_PRODUCTS)}; side: buy/sell)")
+
+@app.get("/api/analytics/candles")
+def get_candles(request: Request, response: Response, product: str = "gold_bar_965", side: str = "sell",
+                resolution: str = "1h", limit: int = 100):
+    """แท่งเทียน OHLC (5m / 15m / 1h / 1d ตามเวลาไทย)"""
+    cache = GLOBAL_CACHE
+    check_series(product, side)
+    if resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=422, detail=f"Unknown resolution (expected {', '.join(RESOLUTIONS)})")
     set_public_cache(response, max_age=60, s_maxage=120)
-    return {
-        "count": len(GLOBAL_CACHE["gold_bar_data"]),
-        "source": GLOBAL_CACHE["source_type"],
-        "data": GLOBAL_CACHE["gold_bar_data"],
-        "stale": is_data_stale(),
-        "age_seconds": get_cache_age_seconds(),
-        "updated_at": GLOBAL_CACHE["last_updated"]
-    }
+    candles = ANALYTICS.candles(product, side, resolution, max(1, min(limit, 1000)))
+    return negotiated_response(request, response, {
+        "product": product,
+        "side": side,
+        "resolution": resolution,
+        "count": len(candles),
+        "data": candles,
+        "version": cache.version,
+        "updated_at": cache.last_updated
+    }, wire.numeric)
+
+@app.get("/api/analytics/indicators")
+def get_indicators(request: Request, response: Response, product: str = "gold_bar_965", side: str = "sell",
+                   sma: str = "5,20", points: int = 50):
+    """ราคา + SMA (window ใดก็ได้) + EMA (5/12/26) ของ N รอบล่าสุด"""
+    cache = GLOBAL_CACHE
+    check_series(product, side)
+    try:
+        windows = sorted({int(w) for w in sma.split(",") if w.strip()})
+    except ValueError:
+        raise HTTPException(status_code=422, detail="sma must be a comma-separated list of integers")
+    if any(w < 1 or w > 500 for w in windows):
+        raise HTTPException(status_code=422, detail="sma windows must be between 1 and 500")
+    set_public_cache(response, max_age=60, s_maxage=120)
+    return negotiated_response(request, response, {
+        "product": product,
+        "side": side,
+        **ANALYTICS.indicators(product, side, windows, max(1, min(points, 1000))),
+        "version": cache.version,
+        "updated_at": cache.last_updated
+    }, wire.numeric)
+
+@app.get("/api/analytics/daily")
+def get_daily_stats(request: Request, response: Response, product: str = "gold_bar_965", side: str = "sell", days: int = 30):
+    """สรุปรายวัน: OHLC, ช่วงราคา (range), ความผันผวนของการปรับราคาแต่ละรอบ"""
+    cache = GLOBAL_CACHE
+    check_series(product, side)
+    set_public_cache(response, max_age=60, s_maxage=120)
+    data = ANALYTICS.daily(product, side, max(1, min(days, 365)))
+    return negotiated_response(request, response, {
+        "product": product,
+        "side": side,
+        "count": len(data),
+        "data": data,
+        "version": cache.version,
+        "updated_at": cache.last_updated
+    }, wire.numeric)
 
 @app.get("/api/percent_jewelry")
-def get_percent(response: Response):
+def get_percent(request: Request, response: Response):
+    cache = GLOBAL_CACHE
     set_public_cache(response, max_age=60, s_maxage=120)
-    return {
-        "count": len(GLOBAL_CACHE["jewelry_percent"]),
-        "source": GLOBAL_CACHE["source_type"],
-        "data": GLOBAL_CACHE["jewelry_percent"],
-        "stale": is_data_stale(),
-        "age_seconds": get_cache_age_seconds(),
-        "updated_at": GLOBAL_CACHE["last_updated"]
-    }
+    return negotiated_response(request, response, {
+        "count": len(cache.jewelry_percent),
+        "source": cache.source_type,
+        "data": cache.jewelry_percent,
+        "stale": is_data_stale(cache),
+        "age_seconds": get_cache_age_seconds(cache),
+        "updated_at": cache.last_updated
+    }, wire.jewelry)
 
 @app.get("/api/shops")
-def get_shops(response: Response):
+def get_shops(request: Request, response: Response):
+    cache = GLOBAL_CACHE
     set_public_cache(response, max_age=60, s_maxage=120)
+    return negotiated_response(request, response, {
+        "count": len(cache.shop_data),
+        "data": cache.shop_data,
+        "stale": is_data_stale(cache),
+        "age_seconds": get_cache_age_seconds(cache),
+        "updated_at": cache.last_updated
+    }, wire.shop_list)
+
+class AlertRequest(BaseModel):
+    token: str
+    threshold: float
+    direction: str                      # above / below
+    product: str = "gold_bar_965"
+    side: str = "sell"
+    source: str = ASSOCIATION_SOURCE    # "goldtraders" หรือชื่อร้าน
+
+@app.post("/api/alerts")
+def create_alert(request: AlertRequest, response: Response):
+    """ตั้งเกณฑ์แจ้งเตือนราคา (one-shot) สำหรับ device token"""
+    set_no_store(response)
+    error = ALERTS.validate(request.source, request.product, request.side, request.direction, request.threshold)
+    if error:
+        raise HTTPException(status_code=422, detail=error)
+    try:
+        alert = ALERTS.add(request.token, request.source, request.product, request.side,
+                           request.direction, request.threshold)
+    except ValueError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    ALERTS_STATE.set(str(alert.id), alert.to_record())
+    return {"status": "success", "alert": alert.to_dict()}
+
+@app.get("/api/alerts")
+def list_alerts(token: str, response: Response):
+    set_no_store(response)
+    alerts = ALERTS.list_for_token(token)
+    return {"count": len(alerts), "data": [alert.to_dict() for alert in alerts]}
+
+@app.delete("/api/alerts/{alert_id}")
+def delete_alert(alert_id: int, token: str, response: Response):
+    set_no_store(response)
+    if not ALERTS.remove(alert_id, token=token):
+        # alert ที่กำลังส่งอยู่ไม่อยู่ใน engine แต่ยังอยู่ใน state -> ลบได้ (จะไม่ถูกคืนกลับถ้าส่งไม่ผ่าน)
+        record = ALERTS_STATE.get(str(alert_id))
+        if record is None or record[0] != token:
+            raise HTTPException(status_code=404, detail="Alert not found")
+    ALERTS_STATE.delete(str(alert_id))
+    return {"status": "deleted", "id": alert_id}
+
+class WebhookRequest(BaseModel):
+    url: str
+    products: Optional[List[str]] = None    # เช่น ["gold_bar_965"] (ไม่ระบุ = ทุกสินค้า)
+    sources: Optional[List[str]] = None     # "goldtraders" และ/หรือชื่อร้าน (ไม่ระบุ = ทั้งหมด)
+    sides: Optional[List[str]] = None       # buy / sell (ไม่ระบุ = ทั้งสองฝั่ง)
+    min_change: float = 0                   # ส่งเมื่อราคาห่างจากที่ส่งครั้งก่อนอย่างน้อยเท่านี้ (บาท)
+
+@app.post("/api/webhooks")
+async def create_webhook(body: WebhookRequest, request: Request, response: Response):
+    """
+    ลงทะเบียน webhook ของ partner (ต้องส่ง Authorization: Bearer <REFRESH_TOKEN>)
+    - คืน secret ครั้งเดียว: ผู้รับใช้ตรวจ X-Aurum-Signature (HMAC-SHA256)
+    """
+    set_no_store(response)
+    require_refresh_token(request)
+    error = WEBHOOKS.validate(body.url, body.products, body.sources, body.sides, body.min_change)
+    if error is None:
+        error = await WEBHOOKS.check_target(body.url)
+    if error:
+        raise HTTPException(status_code=422, detail=error)
+    try:
+        subscription = WEBHOOKS.add(body.url, body.products, body.sources, body.sides, body.min_change)
+    except ValueError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    WEBHOOKS_STATE.set(str(subscription.id), subscription.to_record())
+    return {"status": "success", "webhook": subscription.to_dict(), "secret": subscription.secret}
+
+@app.get("/api/webhooks")
+async def list_webhooks(request: Request, response: Response):
+    set_no_store(response)
+    require_refresh_token(request)
+    subscriptions = WEBHOOKS.subscriptions()
     return {
-        "count": len(GLOBAL_CACHE["shop_data"]),
-        "data": GLOBAL_CACHE["shop_data"],
-        "stale": is_data_stale(),
-        "age_seconds": get_cache_age_seconds(),
-        "updated_at": GLOBAL_CACHE["last_updated"]
+        "count": len(subscriptions),
+        "data": [subscription.to_dict() for subscription in subscriptions],
+        "delivery": WEBHOOKS.status(),
     }
 
-@app.get("/api/board")
-def get_board(response: Response):
-    data = GLOBAL_CACHE["gold_bar_data"]
-    if not data:
-        set_no_store(response)
-        return {"status": "waiting_for_data", "market_status": GLOBAL_CACHE["market_status"]}
+@app.delete("/api/webhooks/{webhook_id}")
+async def delete_webhook(webhook_id: int, request: Request, response: Response):
+    set_no_store(response)
+    require_refresh_token(request)
+    if not WEBHOOKS.remove(webhook_id):
+        raise HTTPException(status_code=404, detail="Webhook not found")
+    return {"status": "deleted", "id": webhook_id}
 
-    set_public_cache(response, max_age=15, s_maxage=30)
-    history_recent = data[:20] if GLOBAL_CACHE["source_type"] == "Classic Website" else data[-20:]
+def build_board_payload(cache: CacheSnapshot):
     return {
         "status": "success",
-        "source": GLOBAL_CACHE["source_type"],
-        "market_status": GLOBAL_CACHE["market_status"],
-        "updated_at": GLOBAL_CACHE["last_updated"],
-        "stale": is_data_stale(),
-        "age_seconds": get_cache_age_seconds(),
-        "latest": get_latest_gold_item(),
-        "history": history_recent,
-        "jewelry": GLOBAL_CACHE["jewelry_percent"],
-        "shops": GLOBAL_CACHE["shop_data"],
+        "source": cache.source_type,
+        "market_status": cache.market_status,
+        "updated_at": cache.last_updated,
+        "stale": is_data_stale(cache),
+        "age_seconds": get_cache_age_seconds(cache),
+        "latest": cache.latest_gold,
+        "history": cache.recent_history,
+        "cursor": cache.cursor,
+        "version": cache.version,
+        "jewelry": cache.jewelry_percent,
+        "shops": cache.shop_data,
         "counts": {
-            "history": len(GLOBAL_CACHE["gold_bar_data"]),
-            "jewelry": len(GLOBAL_CACHE["jewelry_percent"]),
-            "shops": len(GLOBAL_CACHE["shop_data"])
+            "history": len(cache.gold_bar_data),
+            "jewelry": len(cache.jewelry_percent),
+            "shops": len(cache.shop_data)
         }
     }
 
+def build_shop_comparison_payload(cache: CacheSnapshot):
+    return {
+        "status": "success",
+        **SHOP_COMPARISON.view(cache.shop_comparison),
+        "version": cache.version,
+        "stale": is_data_stale(cache),
+        "age_seconds": get_cache_age_seconds(cache),
+        "updated_at": cache.last_updated
+    }
+
+@app.get("/api/shops/compare")
+def get_shop_comparison(request: Request):
+    """
+    เปรียบเทียบราคาทุกร้าน (normalize แล้ว ราคาเป็นตัวเลข)
+    - products.<product>.best_buy / best_sell: ร้านที่รับซื้อแพงสุด / ขายถูกสุด
+    - shops[].products.<product>: spread (ขาย - ซื้อ), premium_buy / premium_sell เทียบราคาสมาคมฯ
+    - shops[].age_seconds / stale: อายุของราคาที่ดึงสำเร็จล่าสุดของแต่ละร้าน
+    """
+    return encoded_response(request, GLOBAL_CACHE, "shops_compare", build_shop_comparison_payload, max_age=60, s_maxage=120,
+                            wire_view=wire.numeric)
+
+@app.get("/api/board")
+def get_board(request: Request, response: Response):
+    cache = GLOBAL_CACHE
+    if not cache.gold_bar_data:
+        set_no_store(response)
+        return {"status": "waiting_for_data", "market_status": cache.market_status}
+    return encoded_response(request, cache, "board", build_board_payload, max_age=15, s_maxage=30,
+                            wire_view=wire.board)
+
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
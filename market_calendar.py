@@ -0,0 +1,221 @@
+import bisect
+import datetime
+import json
+import os
+from typing import Dict, Any, List, Optional, Tuple
+
+# ==============================================================================
+# MARKET CALENDAR (เวลาทำการต่อแหล่งข้อมูล + วันหยุด/วันพิเศษ + จุดเปิด/ปิดถัดไปที่คำนวณไว้ล่วงหน้า)
+# ==============================================================================
+BKK_TZ = datetime.timezone(datetime.timedelta(hours=7))
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+# ช่วงเวลาเป็นนาทีนับจากเที่ยงคืน [เปิด, ปิด) -> "24:00" = 1440 (ต่อเนื่องข้ามวันได้)
+Session = Tuple[int, int]
+WeeklySchedule = Dict[int, List[Session]]
+
+
+def parse_hhmm(text: str) -> int:
+    hour, _, minute = text.strip().partition(":")
+    value = int(hour) * 60 + int(minute or 0)
+    if not 0 <= value <= 1440:
+        raise ValueError(f"Invalid time: {text}")
+    return value
+
+
+def format_hhmm(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def parse_sessions(raw) -> List[Session]:
+    """[["09:00", "17:45"], ...] -> [(540, 1065), ...]"""
+    return [(parse_hhmm(start), parse_hhmm(end)) for start, end in raw or []]
+
+
+def parse_weekly(raw: Dict[str, Any]) -> WeeklySchedule:
+    """{"mon": [["09:00", "17:45"]], ..., "sat": [["09:00", "10:00"]]} (วันที่ไม่ระบุ = ปิด)"""
+    return {WEEKDAYS.index(day.lower()): parse_sessions(sessions) for day, sessions in raw.items()}
+
+
+# เวลาทำการตั้งต้น (ทับได้ด้วย "schedules" ในไฟล์ calendar)
+DEFAULT_SCHEDULES: Dict[str, WeeklySchedule] = {
+    # สมาคมค้าทองคำ: จันทร์-ศุกร์ 09:00-17:45, เสาร์ 09:00-10:00
+    "goldtraders": {**{day: [(9 * 60, 17 * 60 + 45)] for day in range(5)}, 5: [(9 * 60, 10 * 60)]},
+    # ร้านทอง: 24 ชม. ยกเว้นเสาร์ 09:30 - จันทร์ 00:00
+    "shops": {**{day: [(0, 1440)] for day in range(5)}, 5: [(0, 9 * 60 + 30)]},
+}
+
+
+class DayOverride:
+    """วันหยุด (sessions ว่าง) หรือวันที่เปิดพิเศษ/ย่นเวลา สำหรับบาง source หรือทุก source"""
+    __slots__ = ("name", "sources", "sessions")
+
+    def __init__(self, name: str, sources: Optional[List[str]], sessions: List[Session]):
+        self.name = name
+        self.sources = set(sources) if sources else None  # None = ทุก source
+        self.sessions = sessions
+
+    def applies_to(self, source: str) -> bool:
+        return self.sources is None or source in self.sources
+
+
+class Timeline:
+    """ช่วงเปิดทำการของ 1 source ในกรอบเวลาหนึ่ง (ช่วงที่ต่อกันถูกรวมแล้ว) -> query ด้วย bisect"""
+    __slots__ = ("window_start", "window_end", "starts", "ends")
+
+    def __init__(self, window_start: datetime.datetime, window_end: datetime.datetime,
+                 intervals: List[Tuple[datetime.datetime, datetime.datetime]]):
+        self.window_start = window_start
+        self.window_end = window_end
+        self.starts = [start for start, _ in intervals]
+        self.ends = [end for _, end in intervals]
+
+    def covers(self, now: datetime.datetime) -> bool:
+        return self.window_start <= now < self.window_end - datetime.timedelta(days=1)
+
+    def locate(self, now: datetime.datetime) -> Tuple[bool, int]:
+        """(เปิดอยู่ไหม, index ของช่วงที่เปิดอยู่ หรือช่วงถัดไปถ้าปิด)"""
+        i = bisect.bisect_right(self.starts, now) - 1
+        if i >= 0 and now < self.ends[i]:
+            return True, i
+        return False, i + 1
+
+
+class MarketCalendar:
+    """
+    ปฏิทินการซื้อขายต่อ source
+    - weekly schedule + ตารางวันหยุด/วันพิเศษ (โหลดจากไฟล์ JSON, reload เมื่อไฟล์เปลี่ยน)
+    - คำนวณช่วงเปิด-ปิดล่วงหน้า horizon_days วัน -> status / next transition เป็น O(log n)
+    """
+
+    def __init__(self, schedules: Optional[Dict[str, WeeklySchedule]] = None, horizon_days: int = 14):
+        self.base_schedules = dict(DEFAULT_SCHEDULES if schedules is None else schedules)
+        self.schedules = dict(self.base_schedules)
+        self.horizon_days = horizon_days
+        self.days: Dict[datetime.date, List[DayOverride]] = {}
+        self.path: Optional[str] = None
+        self._mtime: Optional[float] = None
+        self._timelines: Dict[str, Timeline] = {}
+
+    # --- Loading ---
+    def load(self, path: str):
+        """
+        {"schedules": {"goldtraders": {"mon": [["09:00", "17:45"]], ...}},
+         "days": [{"date": "2026-10-23", "name": "วันปิยมหาราช"},
+                  {"date": "2026-12-31", "name": "...", "sources": ["goldtraders"], "sessions": [["09:00", "12:00"]]}]}
+        """
+        self.path = path
+        try:
+            self._mtime = os.path.getmtime(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                raw = json.load(f)
+        except FileNotFoundError:
+            print(f"⚠️ [Calendar] {path} not found - using weekly schedules only")
+            return
+        except Exception as e:
+            print(f"⚠️ [Calendar] Load failed ({path}): {e}")
+            return
+
+        schedules = dict(self.base_schedules)
+        days: Dict[datetime.date, List[DayOverride]] = {}
+        try:
+            for source, weekly in (raw.get("schedules") or {}).items():
+                schedules[source] = parse_weekly(weekly)
+            for entry in raw.get("days") or []:
+                day = datetime.date.fromisoformat(entry["date"])
+                days.setdefault(day, []).append(DayOverride(
+                    entry.get("name", ""), entry.get("sources"), parse_sessions(entry.get("sessions"))
+                ))
+        except Exception as e:
+            print(f"⚠️ [Calendar] Invalid calendar file ({path}): {e}")
+            return
+        self.schedules = schedules
+        self.days = days
+        self._timelines.clear()
+        print(f"📅 [Calendar] Loaded {len(days)} special days from {os.path.basename(path)}")
+
+    def reload_if_changed(self):
+        if self.path is None:
+            return
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self.load(self.path)
+
+    # --- Per-day sessions ---
+    def override_for(self, source: str, day: datetime.date) -> Optional[DayOverride]:
+        for override in self.days.get(day, ()):
+            if override.applies_to(source):
+                return override
+        return None
+
+    def sessions_on(self, source: str, day: datetime.date) -> List[Session]:
+        override = self.override_for(source, day)
+        if override is not None:
+            return override.sessions
+        return self.schedules.get(source, {}).get(day.weekday(), [])
+
+    # --- Precomputed timeline ---
+    def _timeline(self, source: str, now: datetime.datetime) -> Timeline:
+        timeline = self._timelines.get(source)
+        if timeline is not None and timeline.covers(now):
+            return timeline
+        # เริ่มย้อนหลัง 7 วัน (ใช้หา last_close) ไปข้างหน้า horizon_days วัน
+        first_day = now.date() - datetime.timedelta(days=7)
+        window_start = datetime.datetime.combine(first_day, datetime.time(), BKK_TZ)
+        intervals: List[Tuple[datetime.datetime, datetime.datetime]] = []
+        for offset in range(7 + self.horizon_days + 1):
+            day = first_day + datetime.timedelta(days=offset)
+            midnight = datetime.datetime.combine(day, datetime.time(), BKK_TZ)
+            for start, end in sorted(self.sessions_on(source, day)):
+                start_dt = midnight + datetime.timedelta(minutes=start)
+                end_dt = midnight + datetime.timedelta(minutes=end)
+                if intervals and start_dt <= intervals[-1][1]:
+                    # ต่อเนื่องกัน (เช่น ร้านทอง 24 ชม. ข้ามเที่ยงคืน) -> รวมเป็นช่วงเดียว
+                    intervals[-1] = (intervals[-1][0], max(intervals[-1][1], end_dt))
+                elif start_dt < end_dt:
+                    intervals.append((start_dt, end_dt))
+        window_end = window_start + datetime.timedelta(days=7 + self.horizon_days + 1)
+        timeline = Timeline(window_start, window_end, intervals)
+        self._timelines[source] = timeline
+        return timeline
+
+    # --- Queries ---
+    def is_open(self, source: str, now: datetime.datetime) -> bool:
+        return self._timeline(source, now).locate(now)[0]
+
+    def next_transition(self, source: str, now: datetime.datetime) -> Optional[datetime.datetime]:
+        """เปิดอยู่ -> เวลาปิด, ปิดอยู่ -> เวลาเปิดถัดไป (None = ไม่มีในช่วง horizon)"""
+        timeline = self._timeline(source, now)
+        is_open, i = timeline.locate(now)
+        if is_open:
+            return timeline.ends[i]
+        return timeline.starts[i] if i < len(timeline.starts) else None
+
+    def last_close(self, source: str, now: datetime.datetime) -> Optional[datetime.datetime]:
+        """เวลาปิดล่าสุดที่ผ่านมาแล้ว (ไม่นับช่วงที่กำลังเปิดอยู่)"""
+        timeline = self._timeline(source, now)
+        i = bisect.bisect_right(timeline.ends, now) - 1
+        return timeline.ends[i] if i >= 0 else None
+
+    def status(self, source: str, now: datetime.datetime) -> Tuple[bool, str]:
+        """(เปิดไหม, ข้อความสถานะ) เช่น "Open (until 17:45)", "Closed (วันปิยมหาราช)", "Closed (opens Mon 09:00)" """
+        transition = self.next_transition(source, now)
+        if self.is_open(source, now):
+            if transition is None:
+                return True, "Open"
+            return True, f"Open (until {self._describe(transition, now)})"
+        override = self.override_for(source, now.date())
+        if override is not None and override.name and not override.sessions:
+            return False, f"Closed ({override.name})"
+        if transition is None:
+            return False, "Closed"
+        return False, f"Closed (opens {self._describe(transition, now)})"
+
+    @staticmethod
+    def _describe(moment: datetime.datetime, now: datetime.datetime) -> str:
+        if moment.date() == now.date():
+            return moment.strftime("%H:%M")
+        return moment.strftime("%a %d %b %H:%M")
@@ -0,0 +1,141 @@
+import gzip
+import hashlib
+import json
+import threading
+import time
+from typing import Dict, Any, Callable, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli เป็น optional -> ถ้าไม่มีก็เสิร์ฟ gzip/raw แทน
+    brotli = None
+
+# ==============================================================================
+# PRE-ENCODED PAYLOADS (encode + compress ครั้งเดียวต่อ cache version)
+# ==============================================================================
+
+
+def encode_json(content: Any) -> bytes:
+    """JSON แบบเดียวกับ JSONResponse ของ Starlette (compact, UTF-8)"""
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """'br;q=1.0, gzip;q=0.8, *;q=0' -> {'br': 1.0, 'gzip': 0.8, '*': 0.0}"""
+    weights = {}
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[token] = q
+    return weights
+
+
+def entity_tag(raw: bytes) -> str:
+    """ETag จากเนื้อ body ตอน build แรกของ version (ไม่ผูกกับเลข build ที่เริ่มนับใหม่ทุกครั้งที่ boot)"""
+    return hashlib.blake2b(raw, digest_size=12).hexdigest()
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match เป็น list ของ entity tag คั่นด้วย "," (เทียบแบบ weak: ไม่สน W/), "*" = ตรงทุกตัว"""
+    if etag.startswith("W/"):
+        etag = etag[2:]
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class EncodedPayload:
+    __slots__ = ("version", "built_at", "bodies", "etag")
+
+    def __init__(self, version: int, raw: bytes, min_size: int, gzip_level: int, brotli_quality: int,
+                 etag: Optional[str] = None):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.bodies: Dict[str, bytes] = {"identity": raw}
+        # build ซ้ำใน version เดิม (อายุครบ) ต่างกันแค่ age_seconds / stale -> ใช้ ETag เดิมต่อ
+        self.etag = etag or entity_tag(raw)
+        # body เล็กๆ บีบแล้วไม่คุ้ม header/CPU
+        if len(raw) >= min_size:
+            self.bodies["gzip"] = gzip.compress(raw, compresslevel=gzip_level, mtime=0)
+            if brotli is not None:
+                self.bodies["br"] = brotli.compress(raw, quality=brotli_quality)
+
+    def select(self, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+        """
+        เลือก body ตาม q ของ client (q สูงสุดชนะ, q เท่ากัน -> เล็กกว่าชนะ) -> (body, Content-Encoding หรือ None)
+        - identity ได้ q=1 ถ้าไม่ถูกระบุ (ยกเว้น "identity;q=0" / "*;q=0") แต่แพ้ encoding อื่นที่ q เท่ากันเพราะใหญ่กว่า
+        """
+        if not accept_encoding:
+            return self.bodies["identity"], None
+        weights = parse_accept_encoding(accept_encoding)
+        wildcard = weights.get("*")
+        best = None
+        for encoding, body in self.bodies.items():
+            if encoding == "identity":
+                q = weights.get("identity", 1.0 if wildcard is None or wildcard > 0 else 0.0)
+            else:
+                q = weights.get(encoding, wildcard or 0.0)
+            if q > 0 and (best is None or (q, -len(body)) > (best[0], -len(best[1]))):
+                best = (q, body, encoding)
+        if best is None:
+            return self.bodies["identity"], None
+        _, body, encoding = best
+        return body, None if encoding == "identity" else encoding
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        """
+        weak ETag ต่อ representation (บีบต่างกันได้ ETag ต่างกัน)
+        - weak เพราะตลอด version เดียวกัน byte ของ body เปลี่ยนได้ (age_seconds / stale) แต่ข้อมูลราคาเท่าเดิม
+        """
+        return f'W/"{self.etag}-{encoding or "identity"}"'
+
+
+class PayloadCache:
+    """
+    เก็บ body ที่ encode แล้วต่อ endpoint (ทั้ง raw / gzip / br)
+    - สร้างใหม่เมื่อ cache version เปลี่ยน หรือ body เก่ากว่า max_age_seconds
+      (เพื่อให้ stale / age_seconds ใน body คลาดเคลื่อนไม่เกิน max-age ของ CDN อยู่แล้ว)
+    - ETag เปลี่ยนตาม version เท่านั้น -> client ที่ถือ ETag เดิมยังได้ 304 หลัง build ใหม่เพราะอายุครบ
+    """
+
+    def __init__(self, max_age_seconds: float = 15.0, min_size: int = 512, gzip_level: int = 6,
+                 brotli_quality: int = 5):
+        self.max_age_seconds = max_age_seconds
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self._entries: Dict[str, EncodedPayload] = {}
+        # endpoint แบบ def ทำงานใน threadpool -> กันหลาย request build ซ้ำพร้อมกัน
+        self._lock = threading.Lock()
+
+    def get(self, name: str, version: int, build: Callable[[], Any],
+            encode: Callable[[Any], bytes] = encode_json) -> EncodedPayload:
+        entry = self._entries.get(name)
+        if entry is not None and self._is_fresh(entry, version):
+            return entry
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or not self._is_fresh(entry, version):
+                etag = entry.etag if entry is not None and entry.version == version else None
+                entry = EncodedPayload(version, encode(build()), self.min_size, self.gzip_level,
+                                       self.brotli_quality, etag=etag)
+                self._entries[name] = entry
+            return entry
+
+    def _is_fresh(self, entry: EncodedPayload, version: int) -> bool:
+        return entry.version == version and time.monotonic() - entry.built_at < self.max_age_seconds
@@ -0,0 +1,64 @@
+from typing import Dict, Any, Optional, Tuple
+
+# ==============================================================================
+# PRICE HELPERS (แปลงราคาจากข้อความ -> ตัวเลข และตั้งชื่อสินค้าให้ตรงกัน)
+# ==============================================================================
+ASSOCIATION_SOURCE = "goldtraders"
+
+# ร้านแต่ละเจ้าตั้งชื่อ key ไม่เหมือนกัน -> map ให้เป็นชื่อกลาง
+PRODUCT_ALIASES = {
+    "gold_bar_965": "gold_bar_965",
+    "gold_bar_9999": "gold_bar_9999",
+    "ornament_965": "ornament_965",
+    "gold_ornament_965": "ornament_965",
+}
+
+PRODUCTS = ("gold_bar_965", "gold_bar_9999", "ornament_965")
+SIDES = ("buy", "sell")
+
+PriceKey = Tuple[str, str]  # (product, side)
+
+
+def parse_price(text: Any) -> Optional[float]:
+    """แปลง "41,250.00" -> 41250.0 (คืน None ถ้าไม่ใช่ตัวเลข เช่น "ไม่ระบุในตาราง")"""
+    if text is None:
+        return None
+    if isinstance(text, (int, float)):
+        return float(text)
+    cleaned = str(text).replace(",", "").strip()
+    if not cleaned:
+        return None
+    try:
+        return float(cleaned)
+    except ValueError:
+        return None
+
+
+def association_prices(row: Dict[str, Any]) -> Dict[PriceKey, float]:
+    """ราคาจากแถวของสมาคมค้าทองคำ (bullion = ทองแท่ง 96.5%, ornament = รูปพรรณ 96.5%)"""
+    fields = {
+        ("gold_bar_965", "buy"): row.get("bullion_buy"),
+        ("gold_bar_965", "sell"): row.get("bullion_sell"),
+        ("ornament_965", "buy"): row.get("ornament_buy"),
+        ("ornament_965", "sell"): row.get("ornament_sell"),
+    }
+    prices = {}
+    for key, text in fields.items():
+        value = parse_price(text)
+        if value is not None:
+            prices[key] = value
+    return prices
+
+
+def shop_prices(shop_result: Dict[str, Any]) -> Dict[PriceKey, float]:
+    """ราคาจากผลลัพธ์ของ scrape ร้านทอง 1 ร้าน (ข้าม key ที่ไม่รู้จัก เช่น ornament_buy_back)"""
+    prices = {}
+    for raw_key, quote in (shop_result.get("data") or {}).items():
+        product = PRODUCT_ALIASES.get(raw_key)
+        if not product or not isinstance(quote, dict):
+            continue
+        for side in SIDES:
+            value = parse_price(quote.get(side))
+            if value is not None:
+                prices[(product, side)] = value
+    return prices
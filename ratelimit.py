@@ -0,0 +1,237 @@
+import asyncio
+import math
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Tuple
+
+# ==============================================================================
+# RATE LIMITING + LOAD SHEDDING (token bucket ต่อ client + ตัดงานตามลำดับความสำคัญเมื่อ event loop ช้า)
+# ==============================================================================
+# ลำดับความสำคัญของ route (เลขน้อย = สำคัญกว่า, ถูกตัดทีหลัง)
+PRIORITY_CRITICAL = 0   # /health, /ready: ไม่จำกัด ไม่ตัดเด็ดขาด
+PRIORITY_OPERATOR = 1   # endpoint ที่ต้องใช้ token: หัก token ก่อนตรวจสิทธิ์ (กันเดา token), ผ่านสิทธิ์แล้วคืนให้
+PRIORITY_READ = 2       # อ่าน cache (pre-encoded) ทั่วไป
+PRIORITY_BULK = 3       # history / export / analytics: แพงกว่า -> ใช้ token มากกว่า, ถูกตัดก่อน
+PRIORITY_NAMES = {
+    PRIORITY_CRITICAL: "critical", PRIORITY_OPERATOR: "operator", PRIORITY_READ: "read", PRIORITY_BULK: "bulk",
+}
+CHARGE_SCOPE_KEY = "aurum.admission"  # scope[...] = (bucket key, token ที่หักไป) -> ใช้ตอน refund()
+
+
+class TokenBucketTable:
+    """
+    Token bucket ต่อ client ในตารางขนาดคงที่
+    - tokens / เวลาเติมล่าสุด เก็บใน array('d') ต่อ slot (16 bytes ต่อ client) + dict key -> slot แบบ LRU
+    - ตารางเต็ม -> client ที่เงียบนานสุดถูกแทนที่ (กลับมาใหม่ได้ bucket เต็ม ซึ่งก็คือสถานะของคนที่เงียบไปนานอยู่แล้ว)
+    - take() คำนวณเติม token แบบ lazy ตอนถูกเรียก ไม่มี background sweep
+    """
+
+    def __init__(self, rate_per_second: float, burst: float, max_clients: int = 65536):
+        self.rate = rate_per_second
+        self.burst = burst
+        self.max_clients = max_clients
+        self._slots: "OrderedDict[str, int]" = OrderedDict()
+        self._tokens = array("d", bytes(8 * max_clients))
+        self._stamps = array("d", bytes(8 * max_clients))
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    def give(self, key: str, amount: float):
+        """คืน token (ไม่เกิน burst) ให้ client ที่ยังอยู่ในตาราง"""
+        slot = self._slots.get(key)
+        if slot is not None:
+            self._tokens[slot] = min(self.burst, self._tokens[slot] + amount)
+
+    def take(self, key: str, cost: float = 1.0, now: Optional[float] = None) -> float:
+        """หัก token -> 0 = ผ่าน, มากกว่า 0 = ต้องรออีกกี่วินาที (ไม่หัก token)"""
+        if now is None:
+            now = time.monotonic()
+        slots = self._slots
+        slot = slots.get(key)
+        if slot is None:
+            if len(slots) < self.max_clients:
+                slot = len(slots)
+            else:
+                _, slot = slots.popitem(last=False)
+                self.evictions += 1
+            slots[key] = slot
+            tokens = self.burst
+        else:
+            slots.move_to_end(key)
+            tokens = min(self.burst, self._tokens[slot] + (now - self._stamps[slot]) * self.rate)
+        self._stamps[slot] = now
+        if tokens >= cost:
+            self._tokens[slot] = tokens - cost
+            return 0.0
+        self._tokens[slot] = tokens
+        return (cost - tokens) / self.rate
+
+
+class LagMonitor:
+    """
+    วัดความหน่วงของ event loop: นอน interval แล้วดูว่าตื่นช้ากว่ากำหนดเท่าไร
+    - ค่าขึ้นทันทีเมื่อเจอ lag สูง, ลดลงแบบค่อยเป็นค่อยไป (ไม่แกว่งเปิด/ปิดการตัดงานทุกรอบ)
+    """
+
+    def __init__(self, interval_seconds: float = 0.1, decay: float = 0.8):
+        self.interval = interval_seconds
+        self.decay = decay
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def observe(self, sample: float):
+        self.lag = sample if sample > self.lag else self.lag * self.decay + sample * (1 - self.decay)
+        self.max_lag = max(self.max_lag, sample)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.observe(max(0.0, loop.time() - expected))
+
+
+class AdmissionControl:
+    """
+    ตัดสินว่า request ผ่านหรือไม่ (เรียกทุก request จึงต้องถูก: prefix match + dict lookup + เลขคณิต)
+    1) load shedding: lag >= shed_lag -> ตัด bulk, >= 2x -> ตัด read, >= 4x -> ตัด operator (critical ไม่ถูกตัด)
+    2) rate limit: token bucket ต่อ API key (ถ้าเป็น key ที่รู้จัก) หรือ IP
+    """
+
+    def __init__(self, table: TokenBucketTable, monitor: LagMonitor,
+                 routes: Sequence[Tuple[str, int]], costs: Dict[int, float],
+                 shed_lag_seconds: float = 0.25, api_keys: Iterable[str] = (), api_key_multiplier: float = 10.0,
+                 api_key_header: str = "x-api-key", trust_forwarded: bool = False, enabled: bool = True):
+        self.table = table
+        self.monitor = monitor
+        self.routes = list(routes)  # [(path prefix, priority)] ตัวแรกที่ตรงชนะ
+        self.costs = costs
+        self.shed_lag_seconds = shed_lag_seconds
+        self.api_keys = frozenset(api_keys)
+        self.api_key_multiplier = api_key_multiplier
+        self.api_key_header = api_key_header.lower().encode("latin-1")
+        self.trust_forwarded = trust_forwarded
+        self.enabled = enabled
+        self.stats: Dict[str, Dict[str, int]] = {
+            name: {"allowed": 0, "limited": 0, "shed": 0} for name in PRIORITY_NAMES.values()
+        }
+
+    def classify(self, path: str) -> int:
+        for prefix, priority in self.routes:
+            if path == prefix or path.startswith(prefix + "/"):
+                return priority
+        return PRIORITY_READ
+
+    def shed_level(self) -> int:
+        """priority ที่มากกว่าหรือเท่าค่านี้ถูกตัด (4 = ไม่ตัดอะไรเลย)"""
+        if self.shed_lag_seconds <= 0:
+            return PRIORITY_BULK + 1
+        lag = self.monitor.lag
+        if lag >= 4 * self.shed_lag_seconds:
+            return PRIORITY_OPERATOR
+        if lag >= 2 * self.shed_lag_seconds:
+            return PRIORITY_READ
+        if lag >= self.shed_lag_seconds:
+            return PRIORITY_BULK
+        return PRIORITY_BULK + 1
+
+    def client_key(self, scope: Dict[str, Any]) -> Tuple[str, float]:
+        """-> (key ของ bucket, ตัวหารค่า token) - API key ที่รู้จักได้ bucket ของตัวเองและโควต้ามากกว่า"""
+        forwarded = None
+        for name, value in scope["headers"]:
+            if name == self.api_key_header and self.api_keys:
+                key = value.decode("latin-1").strip()
+                if key in self.api_keys:
+                    return "key:" + key, self.api_key_multiplier
+            elif name == b"x-forwarded-for" and self.trust_forwarded:
+                forwarded = value
+        if forwarded is not None:
+            # ตัวขวาสุดคือที่ proxy ของเราเห็น (ตัวซ้ายสุด client ปลอมได้)
+            return "ip:" + forwarded.decode("latin-1").rsplit(",", 1)[-1].strip(), 1.0
+        client = scope.get("client")
+        return "ip:" + (client[0] if client else "unknown"), 1.0
+
+    def check(self, scope: Dict[str, Any]) -> Optional[Tuple[str, float]]:
+        """None = ผ่าน, (เหตุผล, Retry-After วินาที) = ปฏิเสธ"""
+        priority = self.classify(scope["path"])
+        counters = self.stats[PRIORITY_NAMES[priority]]
+        if priority == PRIORITY_CRITICAL or not self.enabled:
+            counters["allowed"] += 1
+            return None
+        if priority >= self.shed_level():
+            counters["shed"] += 1
+            return "Server busy, try again shortly", max(1.0, self.monitor.lag * 4)
+        cost = self.costs.get(priority, 1.0)
+        if cost > 0:
+            key, multiplier = self.client_key(scope)
+            wait = self.table.take(key, cost / multiplier)
+            if wait > 0:
+                counters["limited"] += 1
+                return "Too many requests", wait
+            scope[CHARGE_SCOPE_KEY] = (key, cost / multiplier)
+        counters["allowed"] += 1
+        return None
+
+    def refund(self, scope: Dict[str, Any]):
+        """คืน token ของ request นี้ (เช่น ผ่านการตรวจ token ผู้ดูแลแล้ว) -> จำกัดเฉพาะความพยายามที่ล้มเหลว"""
+        charged = scope.pop(CHARGE_SCOPE_KEY, None)
+        if charged is not None:
+            self.table.give(*charged)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "rate_per_minute": round(self.table.rate * 60, 2),
+            "burst": self.table.burst,
+            "clients": len(self.table),
+            "max_clients": self.table.max_clients,
+            "evictions": self.table.evictions,
+            "loop_lag_ms": round(self.monitor.lag * 1000, 1),
+            "max_loop_lag_ms": round(self.monitor.max_lag * 1000, 1),
+            "shedding": [name for priority, name in PRIORITY_NAMES.items() if priority >= self.shed_level()],
+            "requests": self.stats,
+        }
+
+
+class AdmissionMiddleware:
+    """ASGI middleware (ไม่ใช้ BaseHTTPMiddleware: ไม่ห่อ body / ไม่สร้าง task เพิ่มต่อ request)"""
+
+    def __init__(self, app, control: AdmissionControl):
+        self.app = app
+        self.control = control
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rejected = self.control.check(scope)
+        if rejected is None:
+            await self.app(scope, receive, send)
+            return
+        detail, retry_after = rejected
+        body = ('{"detail":"%s"}' % detail).encode("utf-8")
+        headers: List[Tuple[bytes, bytes]] = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"retry-after", str(math.ceil(retry_after)).encode("latin-1")),
+            (b"cache-control", b"no-store"),
+        ]
+        await send({"type": "http.response.start", "status": 429, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
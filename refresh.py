@@ -0,0 +1,117 @@
+import asyncio
+import time
+from typing import Dict, Any, Awaitable, Callable, FrozenSet, Iterable, Optional, Set, Tuple
+
+# ==============================================================================
+# SINGLE-FLIGHT REFRESH (รวมคำขอ scrape ที่มาพร้อมกันให้เหลือ browser run เดียว)
+# ==============================================================================
+
+
+class Flight:
+    __slots__ = ("scopes", "future", "callers", "started_at")
+
+    def __init__(self, scopes: Set[str]):
+        self.scopes = scopes
+        self.future: "asyncio.Future[Any]" = asyncio.get_running_loop().create_future()
+        # caller อาจถูก cancel หมดแล้ว -> mark exception ว่าถูกอ่านแล้ว (กัน warning "never retrieved")
+        self.future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.callers = 0
+        self.started_at: Optional[float] = None
+
+
+class RefreshCoordinator:
+    """
+    ทุกการ scrape (scheduler tick, POST /api/refresh, startup) ผ่านที่นี่
+    - มีรอบที่กำลังวิ่งและครอบคลุม scope ที่ขอ -> รอผลของรอบนั้น (ไม่เปิด browser ซ้ำ)
+    - ไม่ครอบคลุม -> รวม scope เข้ารอบถัดไป (pending) ที่เริ่มทันทีหลังรอบปัจจุบันจบ
+    - ทุกคนที่รอรอบเดียวกันได้ผลลัพธ์ (หรือ exception) ตัวเดียวกัน
+    - admit() / retry_after(): guard ระยะห่างขั้นต่ำระหว่างรอบต่อ scope สำหรับคำขอจากภายนอก
+    """
+
+    def __init__(self, runner: Callable[[FrozenSet[str]], Awaitable[Any]], min_interval_seconds: float = 30.0):
+        self._runner = runner
+        self.min_interval_seconds = min_interval_seconds
+        self._current: Optional[Flight] = None
+        self._pending: Optional[Flight] = None
+        self._last_started: Dict[str, float] = {}
+        # event loop ถือแค่ weak reference ของ task -> เก็บไว้เองจนรอบจบ (ไม่งั้นรอบที่ไม่มีใครรออาจถูก GC ทิ้ง)
+        self._tasks: Set["asyncio.Task[None]"] = set()
+        self.stats = {"runs": 0, "coalesced": 0, "rejected": 0}
+
+    @property
+    def busy(self) -> bool:
+        return self._current is not None
+
+    def retry_after(self, scopes: Iterable[str]) -> float:
+        """วินาทีที่ต้องรอก่อนขอ scope นี้ได้อีก (0 = ได้เลย, การขอเกาะรอบที่มีอยู่แล้วไม่นับ)"""
+        scopes = set(scopes)
+        for flight in (self._current, self._pending):
+            if flight is not None and scopes <= flight.scopes:
+                return 0.0
+        now = time.monotonic()
+        wait = 0.0
+        for scope in scopes:
+            last = self._last_started.get(scope)
+            if last is not None:
+                wait = max(wait, last + self.min_interval_seconds - now)
+        return wait
+
+    def admit(self, scopes: Iterable[str]) -> float:
+        """เหมือน retry_after() แต่นับคำขอที่ถูกปฏิเสธไว้ใน stats"""
+        wait = self.retry_after(scopes)
+        if wait > 0:
+            self.stats["rejected"] += 1
+        return wait
+
+    async def run(self, scopes: Iterable[str]) -> Tuple[Any, bool]:
+        """รอผลของรอบที่ครอบคลุม scopes -> (ผลลัพธ์, coalesced = เกาะรอบของคนอื่น)"""
+        scopes = set(scopes)
+        flight = self._current
+        if flight is None:
+            flight = Flight(scopes)
+            self._start(flight)
+        elif not scopes <= flight.scopes:
+            if self._pending is None:
+                self._pending = Flight(set())
+            flight = self._pending
+            flight.scopes |= scopes
+        flight.callers += 1
+        coalesced = flight.callers > 1
+        if coalesced:
+            self.stats["coalesced"] += 1
+        # shield: caller ถูก cancel (client ตัดการเชื่อมต่อ) แต่รอบที่แชร์กันยังวิ่งต่อ
+        return await asyncio.shield(flight.future), coalesced
+
+    def _start(self, flight: Flight):
+        self._current = flight
+        flight.started_at = time.monotonic()
+        for scope in flight.scopes:
+            self._last_started[scope] = flight.started_at
+        self.stats["runs"] += 1
+        task = asyncio.create_task(self._execute(flight))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, flight: Flight):
+        try:
+            result = await self._runner(frozenset(flight.scopes))
+        except Exception as e:
+            flight.future.set_exception(e)
+        else:
+            flight.future.set_result(result)
+        finally:
+            if not flight.future.done():
+                flight.future.cancel()
+            self._current = None
+            if self._pending is not None:
+                pending, self._pending = self._pending, None
+                self._start(pending)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "busy": self.busy,
+            "running": sorted(self._current.scopes) if self._current else [],
+            "queued": sorted(self._pending.scopes) if self._pending else [],
+            "min_interval_seconds": self.min_interval_seconds,
+            **self.stats,
+        }
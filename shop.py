@@ -1,18 +1,23 @@
 import asyncio
-from playwright.async_api import Page, BrowserContext, TimeoutError
-from typing import Dict, Any, List
+from typing import Dict, Any, List, TYPE_CHECKING
+
+# import เฉพาะตอนเช็ค type -> import shop.py ไม่ต้องโหลด Playwright
+if TYPE_CHECKING:
+    from playwright.async_api import Page, BrowserContext
+    from browsers import BrowserSession
 
 TIMEOUT_MS = 60000
 
 
 # --- Optimized Resource Blocker ---
-async def block_heavy_resources(page: Page):
+# fallback() -> ส่งต่อให้ route ระดับ context (AssetCache: denylist + cache JS) แทนการยิงออก network ตรงๆ
+async def block_heavy_resources(page: "Page"):
     await page.route("**/*", lambda route: route.abort() 
         if route.request.resource_type in ["image", "media", "font", "stylesheet"] 
-        else route.continue_()
+        else route.fallback()
     )
 
-async def scrape_aurora(context: BrowserContext) -> Dict[str, Any]:
+async def scrape_aurora(context: "BrowserContext") -> Dict[str, Any]:
     """ร้านที่ 1: Aurora"""
     url = "https://www.aurora.co.th/price/gold_pricelist/ราคาทองวันนี้"
     print(f"   >> Starting Aurora")
@@ -70,7 +75,7 @@ async def scrape_aurora(context: BrowserContext) -> Dict[str, Any]:
         
     return result
 
-async def scrape_mts_gold(context: BrowserContext) -> Dict[str, Any]:
+async def scrape_mts_gold(context: "BrowserContext") -> Dict[str, Any]:
     """ร้านที่ 2: MTS Gold"""
     url = "https://www.mtsgold.co.th/mts-price-sm/"
     print(f"   >> Starting MTS Gold ({url})")
@@ -125,7 +130,7 @@ async def scrape_mts_gold(context: BrowserContext) -> Dict[str, Any]:
         
     return result
 
-async def scrape_hua_seng_heng(context: BrowserContext) -> Dict[str, Any]:
+async def scrape_hua_seng_heng(context: "BrowserContext") -> Dict[str, Any]:
     """ร้านที่ 3: Hua Seng Heng"""
     url = "https://www.huasengheng.com"
     print(f"   >> Starting Hua Seng Heng ({url})")
@@ -189,7 +194,7 @@ async def scrape_hua_seng_heng(context: BrowserContext) -> Dict[str, Any]:
 
     return result
 
-async def scrape_chin_hua_heng(context: BrowserContext) -> Dict[str, Any]:
+async def scrape_chin_hua_heng(context: "BrowserContext") -> Dict[str, Any]:
     """ร้านที่ 4: Chin Hua Heng"""
     url = "https://chinhuaheng.com/gold"
     print(f"   >> Starting Chin Hua Heng ({url})")
@@ -248,7 +253,7 @@ async def scrape_chin_hua_heng(context: BrowserContext) -> Dict[str, Any]:
 
     return result
 
-async def scrape_ausiris(context: BrowserContext) -> Dict[str, Any]:
+async def scrape_ausiris(context: "BrowserContext") -> Dict[str, Any]:
     """ร้านที่ 5: Ausiris"""
     url = "http://www.ausiris.co.th/content/index/goldprice.html"
     print(f"   >> Starting Ausiris ({url})")
@@ -306,17 +311,29 @@ async def scrape_ausiris(context: BrowserContext) -> Dict[str, Any]:
 
     return result
 
-async def scrape_all_shops(context: BrowserContext) -> List[Dict[str, Any]]:
+# key ของแต่ละร้าน (ใช้เลือก browser backend ผ่าน BROWSER_ROUTES) -> ฟังก์ชัน scrape
+SHOP_SCRAPERS = {
+    "aurora": ("Aurora", scrape_aurora),
+    "mts_gold": ("MTS Gold", scrape_mts_gold),
+    "hua_seng_heng": ("Hua Seng Heng", scrape_hua_seng_heng),
+    "chin_hua_heng": ("Chin Hua Heng", scrape_chin_hua_heng),
+    "ausiris": ("Ausiris", scrape_ausiris),
+}
+
+async def scrape_shop(session: "BrowserSession", source: str) -> Dict[str, Any]:
+    name, scraper = SHOP_SCRAPERS[source]
+    try:
+        context = await session.context(source)
+    except Exception as e:
+        print(f"   [X] {name} Browser Error: {e}")
+        return {"name": name, "data": {}, "error": str(e)}
+    return await scraper(context)
+
+async def scrape_all_shops(session: "BrowserSession") -> List[Dict[str, Any]]:
     print("\n>> Starting Parallel Scraping for 5 Shops...")
     start_time = asyncio.get_event_loop().time()
     
-    results = await asyncio.gather(
-        scrape_aurora(context),
-        scrape_mts_gold(context),
-        scrape_hua_seng_heng(context),
-        scrape_chin_hua_heng(context),
-        scrape_ausiris(context)
-    )
+    results = await asyncio.gather(*(scrape_shop(session, source) for source in SHOP_SCRAPERS))
     
     end_time = asyncio.get_event_loop().time()
     duration = end_time - start_time
@@ -0,0 +1,71 @@
+import dataclasses
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Dict, Any, Optional, Tuple
+
+# ==============================================================================
+# IMMUTABLE CACHE SNAPSHOT (ข้อมูลทั้งชุดของ 1 version -> สลับ reference ทีเดียว)
+# ==============================================================================
+Rows = Tuple[Dict[str, Any], ...]
+
+# Field ที่ถูกเขียนลงไฟล์สำหรับ Warm Start (market_status คำนวณใหม่เสมอ ไม่ต้องเก็บ)
+# version เก็บด้วย -> หลัง restart นับต่อจากเดิม (since_version ของ client ไม่ชี้ไปที่ข้อมูลคนละชุด)
+PERSISTED_FIELDS = ("version", "gold_bar_data", "jewelry_percent", "shop_data", "last_updated", "source_type")
+
+
+def _freeze(value: Any) -> Any:
+    return tuple(value) if isinstance(value, list) else value
+
+
+def latest_row(gold_bar_data: Rows, source_type: str) -> Dict[str, Any]:
+    # เว็บ Classic เรียงใหม่ -> เก่า, เว็บใหม่เรียงเก่า -> ใหม่ (source_type มาคู่กับแถวเสมอ)
+    if not gold_bar_data:
+        return {}
+    if source_type == "Classic Website":
+        return gold_bar_data[0]
+    return gold_bar_data[-1]
+
+
+@dataclass(frozen=True)
+class CacheSnapshot:
+    """
+    ข้อมูลทุกอย่างที่ API เสิร์ฟ ณ version หนึ่ง
+    - ห้ามแก้ไข (รวมถึง dict ของแต่ละแถว): สร้างชุดใหม่ด้วย evolve() แล้วสลับ reference เท่านั้น
+    - Reader หยิบ reference ครั้งเดียวต่อ request -> ได้ข้อมูลจากรอบเดียวกันเสมอ ไม่ต้อง lock / copy
+    """
+    version: int = 0
+    gold_bar_data: Rows = ()          # ประวัติราคาทองคำแท่ง (ลำดับตามเว็บต้นทาง)
+    jewelry_percent: Rows = ()        # ราคาทองรูปพรรณ (เฉพาะ %)
+    shop_data: Rows = ()              # ข้อมูลจากร้านทอง
+    last_updated: Optional[str] = None
+    market_status: str = "Initializing..."
+    source_type: str = "None"         # New Website / Classic Website / None
+    warm_start: bool = False          # True = มาจากไฟล์ตอน boot (ยังไม่ได้ scrape ใหม่)
+    cursor: Optional[str] = None      # head cursor ของ HistoryStore ณ version นี้
+    shop_comparison: Optional[Dict[str, Any]] = None  # ShopComparison.rebuild() ของ version นี้ (ไม่ลงไฟล์)
+
+    def evolve(self, **changes: Any) -> "CacheSnapshot":
+        """สร้าง snapshot ใหม่ (version + 1) จากชุดเดิม + field ที่เปลี่ยน"""
+        changes = {key: _freeze(value) for key, value in changes.items()}
+        return dataclasses.replace(self, version=self.version + 1, **changes)
+
+    def touch(self, **changes: Any) -> "CacheSnapshot":
+        """snapshot ใหม่ที่ version เดิม: เปลี่ยนได้แค่ field ที่ไม่ใช่ข้อมูล (เช่น last_updated ตอนตารางไม่เปลี่ยน)"""
+        return dataclasses.replace(self, **changes)
+
+    @property
+    def has_gold_data(self) -> bool:
+        return bool(self.gold_bar_data)
+
+    @cached_property
+    def latest_gold(self) -> Dict[str, Any]:
+        return latest_row(self.gold_bar_data, self.source_type)
+
+    @cached_property
+    def recent_history(self) -> Rows:
+        if self.source_type == "Classic Website":
+            return self.gold_bar_data[:20]
+        return self.gold_bar_data[-20:]
+
+    def persisted(self) -> Dict[str, Any]:
+        return {key: getattr(self, key) for key in PERSISTED_FIELDS}
@@ -0,0 +1,191 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+# ==============================================================================
+# DURABLE STATE STORE (In-memory + Write-behind ลงไฟล์แบบ atomic)
+# ==============================================================================
+_DELETED = object()
+
+
+def write_json_atomic(path: str, payload: Any, indent: Optional[int] = None):
+    """เขียนไฟล์ลง .tmp แล้ว os.replace ทับ (ไม่มีทางเจอไฟล์ที่เขียนค้างครึ่งๆ)"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class StateStore:
+    """
+    Key-value state ที่อ่าน/เขียนใน memory เป็นหลัก (ไม่ block event loop)
+    - Write-behind: thread เบื้องหลังเขียน snapshot ทั้งก้อนหลังจาก debounce_seconds
+    - Atomic: เขียนผ่าน .tmp + os.replace เสมอ
+    - Journal (optional): ทุกการเปลี่ยนแปลงถูก append ลง <path>.journal ทันที
+      ตอน boot จะ replay journal ทับ snapshot -> crash แล้วเสียข้อมูลน้อยที่สุด
+    """
+
+    def __init__(self, path: str, defaults: Optional[Dict[str, Any]] = None, debounce_seconds: float = 1.0,
+                 journal: bool = False, name: str = "State", indent: Optional[int] = None, autoload: bool = True):
+        self.path = path
+        self.journal_path = f"{path}.journal" if journal else None
+        self.debounce_seconds = debounce_seconds
+        self.name = name
+        self.indent = indent
+
+        self._data: Dict[str, Any] = dict(defaults or {})
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()  # กัน flush() กับ writer thread เขียนไฟล์ชนกัน
+        self._journal_queue: List[Tuple[str, Any]] = []
+        self._dirty_since: Optional[float] = None
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+        if autoload:
+            self.load()
+
+    # --- Read (memory only) ---
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._data.get(key, default)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            return dict(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    # --- Write (memory + schedule) ---
+    def update(self, **changes: Any):
+        self._apply(list(changes.items()))
+
+    def set(self, key: str, value: Any):
+        self._apply([(key, value)])
+
+    def delete(self, key: str):
+        self._apply([(key, _DELETED)])
+
+    def _apply(self, changes: List[Tuple[str, Any]]):
+        with self._cond:
+            for key, value in changes:
+                if value is _DELETED:
+                    self._data.pop(key, None)
+                else:
+                    self._data[key] = value
+            if self.journal_path:
+                self._journal_queue.extend(changes)
+            if self._dirty_since is None:
+                self._dirty_since = time.monotonic()
+            self._ensure_writer()
+            self._cond.notify()
+
+    def flush(self):
+        """เขียน snapshot ทันที (ใช้ตอน shutdown)"""
+        with self._cond:
+            data = dict(self._data) if self._dirty_since is not None else None
+            self._dirty_since = None
+            self._journal_queue = []
+        if data is not None:
+            self._write_snapshot(data)
+
+    def close(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+        with self._cond:
+            self._stopping = False
+
+    # --- Background Writer ---
+    def _ensure_writer(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not (self._stopping or self._journal_queue or self._dirty_since is not None):
+                    self._cond.wait()
+                if self._stopping:
+                    return
+
+                entries, self._journal_queue = self._journal_queue, []
+                remaining = self.debounce_seconds - (time.monotonic() - self._dirty_since)
+                data = None
+                if remaining <= 0:
+                    data = dict(self._data)
+                    self._dirty_since = None
+                elif not entries:
+                    # รอ debounce ให้ครบ (ถ้ามีการเปลี่ยนแปลงเข้ามาระหว่างรอ จะตื่นมา append journal ก่อน)
+                    self._cond.wait(remaining)
+                    continue
+
+            if data is not None:
+                self._write_snapshot(data)
+            elif entries:
+                self._append_journal(entries)
+
+    def _write_snapshot(self, data: Dict[str, Any]):
+        try:
+            with self._io_lock:
+                write_json_atomic(self.path, data, indent=self.indent)
+                # snapshot ครอบคลุมทุกอย่างใน journal แล้ว -> เริ่ม journal ใหม่
+                if self.journal_path and os.path.exists(self.journal_path):
+                    os.remove(self.journal_path)
+        except Exception as e:
+            print(f"⚠️ [{self.name}] Save failed: {e}")
+
+    def _append_journal(self, entries: List[Tuple[str, Any]]):
+        try:
+            lines = []
+            for key, value in entries:
+                record = {"k": key, "d": 1} if value is _DELETED else {"k": key, "v": value}
+                lines.append(json.dumps(record, ensure_ascii=False))
+            with self._io_lock, open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write("\n".join(lines) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception as e:
+            print(f"⚠️ [{self.name}] Journal append failed: {e}")
+
+    # --- Recovery ---
+    def load(self):
+        """อ่าน snapshot + replay journal (autoload=False -> ผู้สร้างเรียกเองตอนพร้อม เช่นใน lifespan)"""
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._data.update(json.load(f))
+                print(f"✅ [{self.name}] Loaded state from {self.path}")
+        except Exception as e:
+            print(f"⚠️ [{self.name}] Load failed: {e}")
+
+        if not self.journal_path or not os.path.exists(self.journal_path):
+            return
+        replayed = 0
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # บรรทัดสุดท้ายเขียนไม่จบตอน crash -> หยุดที่นี่
+                    if record.get("d"):
+                        self._data.pop(record["k"], None)
+                    else:
+                        self._data[record["k"]] = record.get("v")
+                    replayed += 1
+        except Exception as e:
+            print(f"⚠️ [{self.name}] Journal replay failed: {e}")
+        if replayed:
+            print(f"♻️ [{self.name}] Replayed {replayed} journal entries")
+            # compact journal -> snapshot เมื่อ writer เริ่มทำงาน
+            self._dirty_since = time.monotonic() - self.debounce_seconds
+            self._ensure_writer()
@@ -0,0 +1,134 @@
+import datetime
+
+import numpy as np
+
+from analytics import AnalyticsEngine, PriceSeries, ema_fill, row_timestamp, point_key
+
+# ตรวจคณิตของ SMA / EMA / แท่งเทียน เทียบกับการคำนวณตรงๆ แบบวน loop
+# Run: python test_analytics.py  (หรือ pytest test_analytics.py)
+
+
+def sample_rows(days: int = 3, rounds: int = 40):
+    rows = []
+    for day in range(days):
+        for round_no in range(1, rounds + 1):
+            bar = 41000 + (day * rounds + round_no) * 37 % 900 // 50 * 50
+            rows.append({
+                "date": f"{17 + day:02d}/10/2569",
+                # 2 รอบต่อนาที -> เวลาซ้ำกันได้ แต่ (วันที่, รอบที่) ไม่ซ้ำ
+                "time": f"{9 + round_no // 120:02d}:{round_no // 2 % 60:02d}",
+                "round": str(round_no),
+                "bullion_buy": f"{bar - 100:,.2f}",
+                "bullion_sell": f"{bar:,.2f}",
+                "ornament_buy": f"{(bar - 100) * 0.98:,.2f}",
+                "ornament_sell": f"{bar + 500:,.2f}",
+            })
+    return rows
+
+
+def naive_ema(prices, span):
+    alpha = 2.0 / (span + 1)
+    values = []
+    for price in prices:
+        values.append(price if not values else values[-1] + alpha * (price - values[-1]))
+    return values
+
+
+def naive_candles(ts, prices, seconds):
+    candles = {}
+    for t, price in zip(ts, prices):
+        start = (t + 7 * 3600) // seconds * seconds - 7 * 3600
+        candle = candles.setdefault(start, [price, price, price, price, 0])
+        candle[1] = max(candle[1], price)
+        candle[2] = min(candle[2], price)
+        candle[3] = price
+        candle[4] += 1
+    return [[start, *values] for start, values in candles.items()]
+
+
+def candle_rows(series: PriceSeries, resolution: str):
+    candles = series.candles[resolution]
+    return [list(values) for values in zip(candles.starts, candles.open, candles.high, candles.low,
+                                           candles.close, candles.rounds)]
+
+
+def test_ema_closed_form_matches_recurrence():
+    prices = 41000 + np.cumsum(np.random.default_rng(7).normal(0, 50, 20000))
+    for span in (2, 5, 12, 26, 200):
+        out = np.empty(len(prices))
+        ema_fill(prices, span, out)
+        np.testing.assert_allclose(out, naive_ema(prices.tolist(), span), rtol=1e-12)
+
+
+def test_rounds_in_same_minute_are_separate_points():
+    rows = sample_rows(days=1, rounds=4)
+    assert row_timestamp(rows[1]) == row_timestamp(rows[2])
+    assert point_key(rows[1]) != point_key(rows[2])
+    engine = AnalyticsEngine()
+    engine.ingest(rows)
+    assert engine.get("gold_bar_965", "sell").n == 4
+
+
+def test_sma_ema_and_candles_match_naive():
+    rows = sample_rows()
+    engine = AnalyticsEngine()
+    engine.ingest(rows)
+    series = engine.get("gold_bar_965", "sell")
+    prices = [float(row["bullion_sell"].replace(",", "")) for row in rows]
+    ts = [row_timestamp(row) for row in rows]
+
+    indicators = engine.indicators("gold_bar_965", "sell", [5], 50)
+    expected_sma = [round(sum(prices[i - 4:i + 1]) / 5, 2) for i in range(len(prices) - 50, len(prices))]
+    assert indicators["sma"]["5"] == expected_sma
+    assert indicators["ema"]["12"] == [round(v, 2) for v in naive_ema(prices, 12)[-50:]]
+    for resolution, seconds in (("5m", 300), ("1h", 3600), ("1d", 86400)):
+        assert candle_rows(series, resolution) == naive_candles(ts, prices, seconds)
+
+    daily = engine.daily("gold_bar_965", "sell", 7)
+    assert [day["rounds"] for day in daily] == [40, 40, 40]
+    first_day = prices[:40]
+    assert daily[0]["volatility"] == round(float(np.diff(first_day).std()), 2)
+
+
+def test_revising_last_point_matches_rebuild():
+    rows = sample_rows(days=1)
+    engine = AnalyticsEngine()
+    engine.ingest(rows)
+    series = engine.get("gold_bar_965", "sell")
+    open_day = series.candles["1d"].starts[-1]
+
+    # แก้ราคารอบล่าสุด (รอบเดิม) สองครั้ง: ขึ้นเป็น high ใหม่ แล้วลงเป็น low ใหม่
+    for price in ("45,000.00", "39,000.00"):
+        revised = dict(rows[-1], bullion_sell=price)
+        assert series.append(point_key(revised), row_timestamp(revised), float(price.replace(",", ""))) is False
+
+    reference = PriceSeries()
+    reference.load(series.keys.copy(), series.ts.copy(), series.prices.copy())
+    assert series.n == len(rows)
+    assert series.candles["1d"].starts == [open_day]
+    for resolution in series.candles:
+        assert candle_rows(series, resolution) == candle_rows(reference, resolution)
+    np.testing.assert_allclose(series.sma(5, 10), reference.sma(5, 10))
+    for span in series._ema:
+        np.testing.assert_allclose(series.ema(span, 10), reference.ema(span, 10))
+
+
+def test_out_of_order_rows_rebuild():
+    rows = sample_rows(days=2, rounds=10)
+    engine = AnalyticsEngine()
+    engine.ingest(rows[10:])
+    engine.ingest(rows[:10])  # ย้อนวัน -> rebuild
+    series = engine.get("ornament_965", "sell")
+    keys = series.keys.tolist()
+    assert keys == sorted(keys) and len(keys) == 20
+    day = datetime.date(2026, 10, 17).toordinal()
+    assert keys[0] == point_key({"date": "17/10/2569", "round": "1"}) and keys[0] // 1000 == day
+
+
+if __name__ == "__main__":
+    test_ema_closed_form_matches_recurrence()
+    test_rounds_in_same_minute_are_separate_points()
+    test_sma_ema_and_candles_match_naive()
+    test_revising_last_point_matches_rebuild()
+    test_out_of_order_rows_rebuild()
+    print("✅ Analytics tests passed")
@@ -0,0 +1,35 @@
+from content_hash import ContentHashes
+from snapshot import CacheSnapshot
+
+# การข้าม extract เมื่อ hash ตาราง Gold Traders ไม่เปลี่ยน (ผูกกับ source ของข้อมูลใน cache)
+# Run: python test_content_hash.py  (หรือ pytest test_content_hash.py)
+
+
+def test_source_switch_forgets_hashes():
+    hashes = ContentHashes()
+    hashes.commit({"new:gold": "10:a:b", "new:jewelry": "5:c:d"}, "New Website")
+    assert hashes.unchanged("new:gold", "10:a:b")
+    # เว็บใหม่ล่ม -> ได้แถวจากเว็บเก่า -> hash ของเว็บใหม่ใช้ไม่ได้แล้ว
+    hashes.commit({"classic:gold": "12:e:f"}, "Classic Website")
+    assert hashes.known() == {"classic:gold": "12:e:f"}
+    # กลับมาเว็บใหม่ ตารางเหมือนเดิมเป๊ะ -> ต้อง extract ใหม่ (แถวใน cache เป็นของเว็บเก่า)
+    assert not hashes.unchanged("new:gold", "10:a:b")
+    # รอบที่ scrape ไม่ได้เลย (source None) -> ลืมทั้งหมด
+    hashes.commit({}, "None")
+    assert hashes.known() == {}
+    assert hashes.status()["skips"] == 1
+
+
+def test_touch_keeps_version():
+    cache = CacheSnapshot().evolve(gold_bar_data=[{"round": "1", "bullion_sell": "41,200.00"}], source_type="New Website")
+    touched = cache.touch(last_updated="2026-10-19 09:06:00")
+    assert touched.version == cache.version == 1
+    assert touched.last_updated == "2026-10-19 09:06:00" and cache.last_updated is None
+    assert touched.gold_bar_data == cache.gold_bar_data and touched.source_type == "New Website"
+    assert touched.evolve(last_updated="x").version == 2
+
+
+if __name__ == "__main__":
+    test_source_switch_forgets_hashes()
+    test_touch_keeps_version()
+    print("✅ Content hash tests passed")
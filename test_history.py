@@ -0,0 +1,153 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from history import HistoryStore
+from history_io import csv_chunk, csv_header, ndjson_chunk, read_csv_files
+
+# delta ตาม version + 410 หลัง log ถูกตัด / export -> import ได้ข้อมูลชุดเดิม / import ขณะที่ scrape ยังวิ่ง
+# (เทสต์ที่ต้องใช้ main.py รันใน process แยก: state ทุกไฟล์อยู่ใน tmp_dir)
+# Run: python test_history.py  (หรือ pytest test_history.py)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def gold_row(day: int, round_no: int, sell: float):
+    return {
+        "date": f"{day:02d}/10/2569", "time": f"{9 + round_no // 6:02d}:{round_no % 6 * 10:02d}", "round": str(round_no),
+        "bullion_buy": f"{sell - 100:,.2f}", "bullion_sell": f"{sell:,.2f}",
+        "ornament_buy": f"{sell - 900:,.2f}", "ornament_sell": f"{sell + 500:,.2f}",
+        "gold_spot": "2,650.10", "thb": "32.85", "change": "0",
+    }
+
+
+# ?since_version=N ผ่าน HTTP: log ยาวเกิน max_log -> version เก่าตอบ 410, version ตั้งแต่ floor ได้ delta
+DELTA_AFTER_COMPACTION = """
+import json, sys
+from fastapi.testclient import TestClient
+import main
+
+main.HISTORY.max_log = 4
+for row in json.loads(sys.argv[2]):  # เหมือน update_all_data: ingest ที่ version ถัดไป แล้ว publish
+    main.HISTORY.ingest([row], main.GLOBAL_CACHE.version + 1)
+    main.publish_cache(cursor=main.HISTORY.head)
+client = TestClient(main.app)
+gone = client.get("/api/history", params={"since_version": 1})
+fresh = client.get("/api/history", params={"since_version": main.HISTORY.floor})
+print(json.dumps({"floor": main.HISTORY.floor, "version": main.GLOBAL_CACHE.version,
+                  "gone": [gone.status_code, gone.json()["detail"]],
+                  "fresh": [fresh.status_code, [row["round"] for row in fresh.json()["data"]]]}))
+"""
+
+# scrape รอบใหม่ ingest เข้ามาระหว่างที่ analytics rebuild อยู่ใน thread จน log ถูก compact ผ่าน version ของ import
+IMPORT_DURING_COMPACTION = """
+import asyncio, json, sys
+import main
+from analytics import AnalyticsEngine
+
+late = json.loads(sys.argv[2])
+main.HISTORY.max_log = 4
+
+
+class ScrapeDuringLoad(AnalyticsEngine):
+    loads = 0
+
+    def load(self, rows):
+        ScrapeDuringLoad.loads += 1
+        if ScrapeDuringLoad.loads == 1:
+            for row in late:
+                main.HISTORY.ingest([row], main.GLOBAL_CACHE.version + 1)
+                main.publish_cache(cursor=main.HISTORY.head)
+        super().load(rows)
+
+
+main.AnalyticsEngine = ScrapeDuringLoad
+result = asyncio.run(main.import_history_files([sys.argv[1]]))
+series = main.ANALYTICS.get("gold_bar_965", "sell")
+print(json.dumps({"result": result, "loads": ScrapeDuringLoad.loads, "points": len(series.keys),
+                  "last_price": float(series.prices[-1]), "floor": main.HISTORY.floor}))
+"""
+
+
+def run_main(script: str, archive, rows):
+    """รัน script ที่ import main ใน process แยก: argv = (path ของ CSV archive, rows เป็น JSON) -> JSON บรรทัดสุดท้าย"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "archive.csv")
+        with open(path, "wb") as f:
+            f.write(csv_header() + csv_chunk(archive))
+        env = dict(os.environ,
+                   CACHE_SNAPSHOT_FILE=os.path.join(tmp_dir, "cache_snapshot.json"),
+                   NOTIFICATION_STATE_FILE=os.path.join(tmp_dir, "notification_state.json"),
+                   ALERTS_STATE_FILE=os.path.join(tmp_dir, "alerts_state.json"),
+                   WEBHOOKS_STATE_FILE=os.path.join(tmp_dir, "webhooks_state.json"),
+                   ASSET_CACHE_DIR=os.path.join(tmp_dir, "asset_cache"),
+                   HISTORY_ARCHIVE_DIR=os.path.join(tmp_dir, "history_archive"),
+                   SCRAPER_MODE="off", RATE_LIMIT_PER_MINUTE="0")
+        result = subprocess.run(
+            [sys.executable, "-c", script, path, json.dumps(rows)],
+            cwd=BASE_DIR, env=env, capture_output=True, text=True, timeout=60
+        )
+        assert result.returncode == 0, result.stderr
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_since_version_after_compaction():
+    history = HistoryStore(max_log=4)
+    for version, round_no in enumerate(range(1, 7), start=1):
+        history.ingest([gold_row(19, round_no, 42000.0 + round_no)], version)
+    # log เกิน 4 -> ตัดครึ่งเก่า: version ที่ต่ำกว่า floor ตอบ delta ไม่ได้
+    assert history.floor == 3
+    assert history.since_version(2) is None
+    assert [row["round"] for row in history.since_version(3)] == ["4", "5", "6"]
+    assert history.since_version(6) == []
+    # แถวเดิมที่ถูกแก้ย้อนหลังกลับมาอยู่ใน delta อีกครั้ง
+    history.ingest([gold_row(19, 2, 42100.0)], 7)
+    assert [row["bullion_sell"] for row in history.since_version(6)] == ["42,100.00"]
+
+
+def test_since_version_410_over_http():
+    outcome = run_main(DELTA_AFTER_COMPACTION, [], [gold_row(19, round_no, 42000.0 + round_no) for round_no in range(1, 7)])
+    assert outcome["floor"] > 1
+    status, detail = outcome["gone"]
+    assert status == 410 and f"valid {outcome['floor']}-{outcome['version']}" in detail
+    assert outcome["fresh"][0] == 200 and outcome["fresh"][1] == ["4", "5", "6"]
+
+
+def test_export_import_round_trip():
+    source = HistoryStore()
+    rows = [gold_row(day, round_no, 41000.0 + day * 10 + round_no) for day in (18, 19) for round_no in range(1, 5)]
+    rows[3]["change"] = '+50, "แก้ไข"'  # comma / quote ต้องผ่าน CSV ได้
+    source.ingest(rows, 1)
+    chunks = list(source.iter_range(chunk_size=3))
+    assert [len(chunk) for chunk in chunks] == [3, 3, 2]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "export.csv")
+        with open(path, "wb") as f:
+            f.write(csv_header() + b"".join(csv_chunk(chunk) for chunk in chunks))
+        imported = read_csv_files([path])
+    target = HistoryStore()
+    assert target.bulk_load(imported, 1) == len(rows)
+    assert target.rows == source.rows and target.keys == source.keys
+    assert target.bulk_load(imported, 2) == 0  # import ซ้ำไม่เปลี่ยนอะไร
+    assert [json.loads(line) for line in ndjson_chunk(source.rows).decode("utf-8").splitlines()] == source.rows
+
+
+def test_import_while_log_is_compacted():
+    archive = [gold_row(day, round_no, 41000.0 + day * 10 + round_no) for day in (1, 2) for round_no in range(1, 4)]
+    late = [gold_row(19, round_no, 42000.0 + round_no) for round_no in range(1, 7)]
+    outcome = run_main(IMPORT_DURING_COMPACTION, archive, late)
+    assert outcome["result"]["rows_imported"] == len(archive)
+    assert outcome["result"]["history_rows"] == len(archive) + len(late)
+    assert outcome["floor"] > 0   # log ถูกตัดระหว่าง rebuild จริง
+    assert outcome["loads"] == 2  # since_version -> None -> load ใหม่ทั้งชุด (ไม่ TypeError)
+    assert outcome["points"] == len(archive) + len(late)
+    assert outcome["last_price"] == 42006.0
+
+
+if __name__ == "__main__":
+    test_since_version_after_compaction()
+    test_since_version_410_over_http()
+    test_export_import_round_trip()
+    test_import_while_log_is_compacted()
+    print("✅ History tests passed")
@@ -1,58 +1,67 @@
 import asyncio
-from playwright.async_api import async_playwright
+import os
 import time
 
-async def test_lightpanda():
-    print("🚀 Starting Lightpanda Connectivity Test...")
-    
-    async with async_playwright() as p:
+import pytest
+
+from browsers import BrowserPool
+
+# ทดสอบ CDP endpoint จริง (ใช้ backend เดียวกับ production ผ่าน BrowserPool) -> ข้ามเมื่อไม่ได้ตั้ง CDP_URL
+# - Lightpanda:  docker run -d --name lightpanda -p 9222:9222 lightpanda/browser:nightly
+# - Chromium:    chromium --headless --remote-debugging-port=9222 --remote-debugging-address=127.0.0.1
+# Run: CDP_URL=http://127.0.0.1:9222 python test_lightpanda.py  (หรือ pytest test_lightpanda.py -s)
+CDP_URL = os.getenv("CDP_URL", "")
+PRICE_URL = "https://www.goldtraders.or.th/updatepricelist"
+TROUBLESHOOTING = """💡 Troubleshooting tips:
+1. Ensure Docker Desktop is running.
+2. Ensure Lightpanda container (docker start lightpanda) or Chromium with --remote-debugging-port is running
+3. Check if port 9222 is being blocked."""
+
+
+async def scrape_price_table(cdp_url: str):
+    """ต่อ CDP -> เปิดหน้าราคาสมาคมฯ -> คืน (status ของ backend, ข้อความแต่ละ cell ของแถวแรก, จำนวนแถว, วินาที)"""
+    pool = BrowserPool({"remote": [cdp_url]}, routes={"goldtraders": "remote"}, default="remote")
+    try:
+        print(f"🔗 Connecting via CDP ({cdp_url})...")
+        await pool.start()
+        backend = pool.status()["backends"]["remote"]
+        if not backend["healthy"]:
+            return backend, [], 0, 0.0
+
+        context = await pool.new_context("goldtraders")
         try:
-            # Connect to Lightpanda running in Docker
-            # Make sure you've run: docker run -d --name lightpanda -p 9222:9222 lightpanda/browser:nightly
-            print("🔗 Connecting to Lightpanda via CDP (ws://127.0.0.1:9222)...")
-            browser = await p.chromium.connect_over_cdp("http://127.0.0.1:9222")
-            print("✅ Connected successfully!")
-            
-            context = await browser.new_context()
             page = await context.new_page()
-            
-            url = "https://www.goldtraders.or.th/updatepricelist"
-            print(f"🌐 Navigating to {url}...")
-            
-            start_time = time.time()
-            await page.goto(url, timeout=60000)
-            
-            # Wait for the table to load
-            print("⏳ Waiting for table to load...")
+            print(f"🌐 Navigating to {PRICE_URL}...")
+            started_at = time.time()
+            await page.goto(PRICE_URL, timeout=60000)
             await page.wait_for_selector("table tbody tr", timeout=30000)
-            
-            # Extract data
             rows = await page.locator("table tbody tr").all()
-            print(f"📊 Found {len(rows)} rows in the price table.")
-            
-            if len(rows) > 0:
-                first_row = rows[0]
-                cells = await first_row.locator("td").all()
-                if len(cells) >= 5:
-                    texts = [await cell.inner_text() for cell in cells]
-                    print("\n--- Latest Gold Price Data ---")
-                    print(f"Date: {texts[0]}")
-                    print(f"Time: {texts[1]}")
-                    print(f"Sell (Bullion): {texts[4]}")
-                    print(f"Buy (Bullion): {texts[3]}")
-                    print("------------------------------\n")
-            
-            end_time = time.time()
-            print(f"⏱️ Scraping completed in {end_time - start_time:.2f} seconds.")
-            
-            await browser.close()
-            
-        except Exception as e:
-            print(f"❌ Test Failed: {e}")
-            print("\n💡 Troubleshooting tips:")
-            print("1. Ensure Docker Desktop is running.")
-            print("2. Ensure Lightpanda container is running: docker start lightpanda")
-            print("3. Check if port 9222 is being blocked.")
+            cells = await rows[0].locator("td").all() if rows else []
+            texts = [await cell.inner_text() for cell in cells]
+            return backend, texts, len(rows), time.time() - started_at
+        finally:
+            await context.close()
+    finally:
+        await pool.stop()
+
+
+def test_remote_cdp_scrape():
+    if not CDP_URL:
+        pytest.skip("CDP_URL is not set (needs a running Lightpanda / Chromium with remote debugging)")
+    try:
+        backend, texts, row_count, elapsed = asyncio.run(scrape_price_table(CDP_URL))
+    except Exception:
+        print(TROUBLESHOOTING)
+        raise
+    assert backend["healthy"], backend["endpoints"][0]["last_error"]
+    print(f"📊 Found {row_count} rows in the price table ({elapsed:.2f}s)")
+    assert row_count > 0
+    assert len(texts) >= 5, texts
+    print(f"Date: {texts[0]}  Time: {texts[1]}  Buy (Bullion): {texts[3]}  Sell (Bullion): {texts[4]}")
+
 
 if __name__ == "__main__":
-    asyncio.run(test_lightpanda())
+    if not CDP_URL:
+        raise SystemExit("Set CDP_URL, e.g. CDP_URL=http://127.0.0.1:9222 python test_lightpanda.py")
+    test_remote_cdp_scrape()
+    print("✅ Remote CDP test passed")
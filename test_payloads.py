@@ -0,0 +1,60 @@
+import gzip
+import itertools
+
+from payloads import PayloadCache, etag_matches
+
+# ETag / If-None-Match / การเลือก Content-Encoding ของ body ที่ encode ไว้แล้ว
+# Run: python test_payloads.py  (หรือ pytest test_payloads.py)
+
+
+def board_builder():
+    """payload ที่ข้อมูลคงที่ แต่ age_seconds / stale เปลี่ยนทุกครั้งที่ build (เหมือน build_board_payload)"""
+    ages = itertools.count(10)
+
+    def build():
+        age = next(ages)
+        return {"status": "success", "version": 7, "stale": age > 11, "age_seconds": age,
+                "history": [{"round": str(i), "bullion_sell": "41,200.00"} for i in range(40)]}
+    return build
+
+
+def test_not_modified_across_rebuild():
+    payloads = PayloadCache(max_age_seconds=0)  # อายุครบทุกครั้ง -> build ใหม่ทุก request
+    build = board_builder()
+    first = payloads.get("board", 7, build)
+    etag = first.etag_for("gzip")
+    rebuilt = payloads.get("board", 7, build)
+    assert rebuilt is not first and rebuilt.bodies["identity"] != first.bodies["identity"]
+    # client ส่ง ETag เดิมกลับมาหลัง build ใหม่ -> ยังตรง (304)
+    assert rebuilt.etag_for("gzip") == etag
+    assert etag_matches(f'"other", {etag}', rebuilt.etag_for("gzip"))
+    assert not etag_matches(etag, rebuilt.etag_for(None))  # representation อื่นต้องไม่ตรง
+    # ข้อมูลเปลี่ยน (version ใหม่) -> ETag ใหม่
+    changed = payloads.get("board", 8, build)
+    assert not etag_matches(etag, changed.etag_for("gzip"))
+
+
+def test_etag_matches_list_and_weak_forms():
+    assert etag_matches('W/"abc-gzip"', 'W/"abc-gzip"')
+    assert etag_matches('"abc-gzip"', 'W/"abc-gzip"')
+    assert etag_matches('"x", W/"abc-gzip" , "y"', 'W/"abc-gzip"')
+    assert etag_matches("*", 'W/"abc-gzip"')
+    assert not etag_matches('"abc-br"', 'W/"abc-gzip"')
+    assert not etag_matches("", 'W/"abc-gzip"')
+
+
+def test_select_by_q_value_then_size():
+    payload = PayloadCache(min_size=0).get("board", 1, board_builder())
+    assert payload.select("")[1] is None
+    assert payload.select("gzip;q=1, br;q=0.5")[1] == "gzip"
+    assert payload.select("identity;q=0, gzip")[1] == "gzip"
+    assert payload.select("*;q=0") == (payload.bodies["identity"], None)
+    body, encoding = payload.select("gzip")
+    assert encoding == "gzip" and gzip.decompress(body) == payload.bodies["identity"]
+
+
+if __name__ == "__main__":
+    test_not_modified_across_rebuild()
+    test_etag_matches_list_and_weak_forms()
+    test_select_by_q_value_then_size()
+    print("✅ Payload tests passed")
@@ -0,0 +1,124 @@
+import asyncio
+import json
+
+from ratelimit import (
+    PRIORITY_BULK, PRIORITY_CRITICAL, PRIORITY_OPERATOR, PRIORITY_READ,
+    AdmissionControl, AdmissionMiddleware, LagMonitor, TokenBucketTable,
+)
+
+# token bucket / การแทนที่ client ในตาราง / ระดับการตัดงาน / response 429 ของ middleware
+# Run: python test_ratelimit.py  (หรือ pytest test_ratelimit.py)
+ROUTES = [
+    ("/health", PRIORITY_CRITICAL),
+    ("/api/refresh", PRIORITY_OPERATOR),
+    ("/api/history", PRIORITY_BULK),
+]
+COSTS = {PRIORITY_OPERATOR: 5.0, PRIORITY_READ: 1.0, PRIORITY_BULK: 5.0}
+
+
+def scope(path: str, ip: str = "203.0.113.7", headers=()):
+    return {"type": "http", "path": path, "client": (ip, 40000), "headers": list(headers)}
+
+
+def control(rate_per_second: float = 1.0, burst: float = 2.0, **kwargs) -> AdmissionControl:
+    return AdmissionControl(TokenBucketTable(rate_per_second, burst), LagMonitor(), ROUTES, COSTS, **kwargs)
+
+
+def test_token_bucket_refill_and_wait():
+    table = TokenBucketTable(rate_per_second=2.0, burst=3.0)
+    assert [table.take("a", now=100.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert table.take("a", now=100.0) == 0.5          # ขาด 1 token ที่อัตรา 2/วินาที
+    assert table.take("a", now=100.5) == 0.0          # เติมครบ 1 token แล้ว
+    assert table.take("a", cost=3.0, now=200.0) == 0.0  # เงียบนาน -> เติมไม่เกิน burst
+    assert table.take("b", cost=4.0, now=200.0) == 0.5  # cost มากกว่า burst -> ไม่หัก token, บอกเวลารอ
+    assert table.take("b", cost=3.0, now=200.0) == 0.0
+
+
+def test_table_evicts_least_recently_seen():
+    table = TokenBucketTable(rate_per_second=1.0, burst=1.0, max_clients=2)
+    table.take("a", now=0.0)
+    table.take("b", now=0.0)
+    table.take("a", now=0.0)          # a ถูกใช้ล่าสุด -> b เงียบนานสุด
+    table.take("c", now=0.0)          # ตารางเต็ม -> แทนที่ b
+    assert len(table) == 2 and table.evictions == 1
+    assert table.take("a", now=0.0) > 0   # a ยังอยู่ (token หมด)
+    assert table.take("b", now=0.0) == 0  # b กลับมาได้ bucket เต็ม (แทนที่ c)
+    assert table.evictions == 2
+
+
+def test_shedding_levels():
+    admission = control(burst=100.0, shed_lag_seconds=0.1)
+    paths = {"critical": "/health", "operator": "/api/refresh", "read": "/api/latest", "bulk": "/api/history/export"}
+    expected = {
+        0.0: set(),
+        0.1: {"bulk"},
+        0.2: {"bulk", "read"},
+        0.4: {"bulk", "read", "operator"},
+    }
+    for lag, shed in expected.items():
+        admission.monitor.lag = lag
+        rejected = {name for name, path in paths.items() if admission.check(scope(path))}
+        assert rejected == shed, (lag, rejected)
+        assert admission.status()["shedding"] == sorted(shed, key=["operator", "read", "bulk"].index)
+
+
+def test_operator_routes_charge_until_authenticated():
+    admission = control(burst=10.0)
+    # ผู้ดูแลตัวจริง: ผ่านสิทธิ์แล้ว refund ทุกครั้ง -> ยิงติดกันกี่ครั้งก็ไม่โดน 429
+    for _ in range(5):
+        request = scope("/api/refresh")
+        assert admission.check(request) is None
+        admission.refund(request)
+    # คนเดา token: ไม่มี refund -> โดนจำกัดหลัง burst / 5
+    guesses = [admission.check(scope("/api/refresh", ip="198.51.100.9")) for _ in range(3)]
+    assert guesses[:2] == [None, None] and guesses[2][0] == "Too many requests"
+    assert admission.stats["operator"]["limited"] == 1
+    # refund ไม่เกิน burst และ request ที่ไม่ได้หักไม่คืนอะไร
+    admission.refund(scope("/api/refresh"))
+    detail, retry_after = admission.check(scope("/api/latest", ip="198.51.100.9"))
+    assert detail == "Too many requests" and 0.9 < retry_after <= 1.0
+
+
+def test_api_key_gets_own_bucket():
+    admission = control(burst=5.0, api_keys=["partner"])
+    assert admission.check(scope("/api/history")) is None
+    assert admission.check(scope("/api/history")) is not None       # IP: 5 token ต่อ bulk request
+    keyed = scope("/api/history", headers=[(b"x-api-key", b"partner")])
+    assert [admission.check(keyed) for _ in range(10)] == [None] * 10  # cost / 10
+
+
+def test_middleware_returns_429_with_retry_after():
+    admission = control(rate_per_second=0.4, burst=1.0)
+    sent = []
+    reached = []
+
+    async def app(scope, receive, send):
+        reached.append(scope["path"])
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        middleware = AdmissionMiddleware(app, admission)
+        await middleware(scope("/api/latest"), None, send)
+        await middleware(scope("/api/latest"), None, send)
+
+    asyncio.run(run())
+    assert reached == ["/api/latest"]
+    start, body = sent
+    headers = dict(start["headers"])
+    assert start["status"] == 429
+    assert headers[b"retry-after"] == b"3"                          # 2.5 วินาที ปัดขึ้น
+    assert headers[b"cache-control"] == b"no-store"
+    assert int(headers[b"content-length"]) == len(body["body"])
+    assert json.loads(body["body"]) == {"detail": "Too many requests"}
+
+
+if __name__ == "__main__":
+    test_token_bucket_refill_and_wait()
+    test_table_evicts_least_recently_seen()
+    test_shedding_levels()
+    test_operator_routes_charge_until_authenticated()
+    test_api_key_gets_own_bucket()
+    test_middleware_returns_429_with_retry_after()
+    print("✅ Rate limit tests passed")
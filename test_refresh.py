@@ -0,0 +1,86 @@
+import asyncio
+import gc
+
+from refresh import RefreshCoordinator
+
+# single-flight: คำขอที่มาพร้อมกันรวมเป็น browser run เดียว / scope ที่ไม่ครอบคลุมรวมเข้ารอบถัดไป / cooldown
+# Run: python test_refresh.py  (หรือ pytest test_refresh.py)
+
+
+class Runner:
+    """runner จำลอง: จด scope ของแต่ละรอบ แล้วรอจนเทสต์ปล่อย"""
+
+    def __init__(self, fail: bool = False):
+        self.calls = []
+        self.release = asyncio.Event()
+        self.fail = fail
+
+    async def __call__(self, scopes):
+        self.calls.append(sorted(scopes))
+        await self.release.wait()
+        if self.fail:
+            raise RuntimeError("browser crashed")
+        return f"run {len(self.calls)}"
+
+
+async def run_coalescing():
+    runner = Runner()
+    refresh = RefreshCoordinator(runner, min_interval_seconds=30)
+    first = asyncio.ensure_future(refresh.run({"goldtraders"}))
+    await asyncio.sleep(0)
+    same = [asyncio.ensure_future(refresh.run({"goldtraders"})) for _ in range(4)]
+    # scope ที่รอบปัจจุบันไม่ครอบคลุม -> รวมกันเป็นรอบถัดไปรอบเดียว
+    wider = [asyncio.ensure_future(refresh.run(scopes)) for scopes in ({"shops"}, {"goldtraders", "shops"})]
+    await asyncio.sleep(0)
+    status = refresh.status()
+    runner.release.set()
+    results = await asyncio.gather(first, *same, *wider)
+    return runner.calls, status, results, refresh
+
+
+def test_concurrent_requests_share_one_run():
+    calls, status, results, refresh = asyncio.run(run_coalescing())
+    assert calls == [["goldtraders"], ["goldtraders", "shops"]]
+    assert status["running"] == ["goldtraders"] and status["queued"] == ["goldtraders", "shops"]
+    assert results[0] == ("run 1", False)
+    assert results[1:5] == [("run 1", True)] * 4
+    assert results[5:] == [("run 2", False), ("run 2", True)]
+    assert refresh.stats == {"runs": 2, "coalesced": 5, "rejected": 0}
+    assert refresh.status()["busy"] is False
+    # คำขอจากภายนอกหลังรอบจบ -> ต้องรอ cooldown ต่อ scope
+    assert 29 < refresh.admit({"goldtraders"}) <= 30
+    assert refresh.stats["rejected"] == 1
+
+
+async def run_cancelled_callers():
+    runner = Runner(fail=True)
+    refresh = RefreshCoordinator(runner)
+    callers = [asyncio.ensure_future(refresh.run({"goldtraders"})) for _ in range(2)]
+    await asyncio.sleep(0)
+    for caller in callers:
+        caller.cancel()
+    await asyncio.gather(*callers, return_exceptions=True)
+    gc.collect()  # ไม่มีใครรอแล้ว -> task ของรอบต้องไม่ถูก GC ทิ้งกลางทาง
+    assert refresh.busy and len(refresh._tasks) == 1
+    waiter = asyncio.ensure_future(refresh.run({"goldtraders"}))
+    await asyncio.sleep(0)
+    runner.release.set()
+    try:
+        await waiter
+    except RuntimeError as e:
+        error = str(e)
+    await asyncio.sleep(0)
+    return runner.calls, error, refresh
+
+
+def test_flight_survives_cancelled_callers_and_shares_errors():
+    calls, error, refresh = asyncio.run(run_cancelled_callers())
+    assert calls == [["goldtraders"]]     # คนที่มาทีหลังเกาะรอบเดิม ไม่เปิด browser ใหม่
+    assert error == "browser crashed"     # ได้ exception ตัวเดียวกับรอบนั้น
+    assert not refresh.busy and not refresh._tasks
+
+
+if __name__ == "__main__":
+    test_concurrent_requests_share_one_run()
+    test_flight_survives_cancelled_callers_and_shares_errors()
+    print("✅ Refresh tests passed")
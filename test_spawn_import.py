@@ -0,0 +1,57 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# worker ของ WorkerPool ใช้ multiprocessing แบบ spawn -> ตอนรัน `python main.py` ทุก worker import main.py ซ้ำเป็น __mp_main__
+# ต้องไม่อ่าน/replay/compact ไฟล์ state, ไม่คืน alert/webhook และไม่โหลด calendar ใน process ลูก (ทำใน lifespan เท่านั้น)
+# Run: python test_spawn_import.py  (หรือ pytest test_spawn_import.py)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# สิ่งที่ multiprocessing.spawn ทำกับ script ของ process แม่ใน process ลูก
+SPAWN_IMPORT = "import runpy, sys; runpy.run_path(sys.argv[1], run_name='__mp_main__'); print('imported')"
+
+
+def test_spawn_reimport_leaves_state_files_alone():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        alert = ["device-token", "สมาคมค้าทองคำ", "gold_bar_965", "sell", "above", 41000.0]
+        files = {
+            "alerts_state.json": json.dumps({"1": alert}),
+            "alerts_state.json.journal": json.dumps({"k": "2", "v": alert}) + "\n",
+            "notification_state.json": json.dumps({"last_gold_bar_sell": "41,200.00"}),
+            "notification_state.json.journal": json.dumps({"k": "last_update_time", "v": "09:05"}) + "\n",
+            "webhooks_state.json": "{}",
+            "cache_snapshot.json": "{}",
+            "market_calendar.json": "{}",
+        }
+        for name, content in files.items():
+            with open(os.path.join(tmp_dir, name), "w", encoding="utf-8") as f:
+                f.write(content)
+        env = dict(os.environ,
+                   CACHE_SNAPSHOT_FILE=os.path.join(tmp_dir, "cache_snapshot.json"),
+                   NOTIFICATION_STATE_FILE=os.path.join(tmp_dir, "notification_state.json"),
+                   ALERTS_STATE_FILE=os.path.join(tmp_dir, "alerts_state.json"),
+                   WEBHOOKS_STATE_FILE=os.path.join(tmp_dir, "webhooks_state.json"),
+                   MARKET_CALENDAR_FILE=os.path.join(tmp_dir, "market_calendar.json"),
+                   ASSET_CACHE_DIR=os.path.join(tmp_dir, "asset_cache"),
+                   HISTORY_ARCHIVE_DIR=os.path.join(tmp_dir, "history_archive"),
+                   SCRAPER_MODE="off")
+        result = subprocess.run(
+            [sys.executable, "-c", SPAWN_IMPORT, os.path.join(BASE_DIR, "main.py")],
+            cwd=BASE_DIR, env=env, capture_output=True, text=True, timeout=60
+        )
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.strip().splitlines()[-1] == "imported"
+        for marker in ("[Calendar]", "[NotifState]", "[AlertState]", "[WebhookState]", "[Snapshot]"):
+            assert marker not in result.stdout, result.stdout
+        # journal ยังอยู่ครบ (ไม่ถูก replay + compact ทิ้งโดย process ลูก) และไม่มีไฟล์ใหม่เกิดขึ้น
+        assert sorted(os.listdir(tmp_dir)) == sorted(files)
+        for name, content in files.items():
+            with open(os.path.join(tmp_dir, name), encoding="utf-8") as f:
+                assert f.read() == content, name
+
+
+if __name__ == "__main__":
+    test_spawn_reimport_leaves_state_files_alone()
+    print("✅ Spawn import test passed")
@@ -0,0 +1,229 @@
+import asyncio
+import json
+import os
+import time
+
+from webhooks import SIGNATURE_HEADER, PriceChange, PublicAddressBackend, WebhookHub, verify
+
+# ยิง webhook 1 รอบราคาเปลี่ยนไปยัง receiver จำลองในเครื่อง แล้ววัด latency จนผู้รับครบทุกตัว
+# Run: python test_webhooks.py  (หรือ pytest test_webhooks.py)
+ENDPOINTS = int(os.getenv("WEBHOOK_BENCH_ENDPOINTS", "1000"))
+RECEIVER_SERVERS = 20  # endpoint กระจายอยู่บนหลาย port (หลาย host ในการใช้งานจริง)
+DELIVERY_BUDGET_SECONDS = float(os.getenv("WEBHOOK_BUDGET_SECONDS", "5"))
+
+
+class Receivers:
+    """HTTP/1.1 server ขนาดเล็ก (keep-alive) ที่ตอบตาม script ต่อ path และจด request ที่ได้รับ"""
+
+    def __init__(self):
+        self.servers = []
+        self.received = {}          # path -> [(headers, body, เวลาที่ได้รับ)]
+        self.scripts = {}           # path -> list ของ status ที่จะตอบตามลำดับ (หมดแล้วตอบ 200)
+        self.arrived = asyncio.Event()
+        self.expected = 0
+
+    async def start(self, count: int):
+        for _ in range(count):
+            self.servers.append(await asyncio.start_server(self._handle, "127.0.0.1", 0, backlog=1024))
+        return [server.sockets[0].getsockname()[1] for server in self.servers]
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode().split("\r\n")
+                path = lines[0].split(" ")[1]
+                headers = {k.lower(): v.strip() for k, _, v in (line.partition(":") for line in lines[1:] if line)}
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+                script = self.scripts.get(path)
+                status = script.pop(0) if script else 200
+                if status == 200:
+                    self.received.setdefault(path, []).append((headers, body, time.monotonic()))
+                    if sum(len(v) for v in self.received.values()) >= self.expected:
+                        self.arrived.set()
+                writer.write(f"HTTP/1.1 {status} X\r\nContent-Length: 0\r\n\r\n".encode())
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def close(self):
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+
+
+async def run_benchmark(endpoints: int = ENDPOINTS):
+    receivers = Receivers()
+    ports = await receivers.start(RECEIVER_SERVERS)
+    hub = WebhookHub(concurrency=100, base_backoff_seconds=0.05, allow_private_targets=True)
+    subscriptions = [
+        hub.add(f"http://127.0.0.1:{ports[i % len(ports)]}/hook/{i}", products=["gold_bar_965"])
+        for i in range(endpoints)
+    ]
+    receivers.expected = endpoints
+
+    # รอบแรกจำราคาอย่างเดียว, รอบที่สองราคาเปลี่ยน -> ยิง
+    hub.on_prices("goldtraders", {("gold_bar_965", "sell"): 41200.0, ("ornament_965", "sell"): 41700.0})
+    changes = hub.on_prices("goldtraders", {("gold_bar_965", "sell"): 41300.0, ("ornament_965", "sell"): 41800.0})
+    started_at = time.monotonic()
+    queued = hub.publish(changes, version=2)
+    await asyncio.wait_for(receivers.arrived.wait(), timeout=30)
+    elapsed = time.monotonic() - started_at
+
+    latencies = sorted(entries[0][2] - started_at for entries in receivers.received.values())
+    headers, body, _ = receivers.received["/hook/0"][0]
+    payload = json.loads(body)
+    signed = verify(subscriptions[0].secret, headers[SIGNATURE_HEADER.lower()], body)
+    await hub.close()
+    await receivers.close()
+    return {
+        "queued": queued,
+        "delivered": len(receivers.received),
+        "elapsed": elapsed,
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[int(len(latencies) * 0.95)],
+        "payload": payload,
+        "signed": signed,
+    }
+
+
+async def run_retry_scenario():
+    receivers = Receivers()
+    port = (await receivers.start(1))[0]
+    receivers.scripts = {"/flaky": [503, 500], "/gone": [410], "/bad": [400]}
+    removed = []
+    hub = WebhookHub(base_backoff_seconds=0.05, on_remove=removed.append, allow_private_targets=True)
+    flaky = hub.add(f"http://127.0.0.1:{port}/flaky")
+    gone = hub.add(f"http://127.0.0.1:{port}/gone")
+    hub.add(f"http://127.0.0.1:{port}/bad")
+    hub.add(f"http://127.0.0.1:{port}/shops-only", sources=["Hua Seng Heng"])
+    receivers.expected = 1
+
+    hub.publish([PriceChange("goldtraders", "gold_bar_965", "sell", 41200.0, 41300.0)])
+    await hub.flush(timeout=10)
+    result = {
+        "flaky": [int(headers["x-aurum-attempt"]) for headers, _, _ in receivers.received.get("/flaky", [])],
+        "removed": removed,
+        "gone_id": gone.id,
+        "flaky_id": flaky.id,
+        "shops_only": receivers.received.get("/shops-only"),
+        "stats": hub.status(),
+    }
+    await hub.close()
+    await receivers.close()
+    return result
+
+
+async def run_full_queue_scenario():
+    receivers = Receivers()
+    port = (await receivers.start(1))[0]
+    receivers.scripts = {"/slow": [503]}
+    hub = WebhookHub(max_queue=2, base_backoff_seconds=0.3, allow_private_targets=True)
+    hub.add(f"http://127.0.0.1:{port}/slow")
+    receivers.expected = 3
+
+    for i in range(5):
+        hub.publish([PriceChange("goldtraders", "gold_bar_965", "sell", 41200.0 + i, 41300.0 + i)], version=i)
+        if i == 0:
+            await asyncio.sleep(0.1)  # ครั้งแรกได้ 503 -> งานแรกรอ retry อยู่ระหว่างที่งานใหม่ล้นคิว
+    await hub.flush(timeout=10)
+    result = {
+        "versions": [json.loads(body)["version"] for _, body, _ in receivers.received.get("/slow", [])],
+        "attempts": [int(headers["x-aurum-attempt"]) for headers, _, _ in receivers.received.get("/slow", [])],
+        "stats": hub.status(),
+    }
+    await hub.close()
+    await receivers.close()
+    return result
+
+
+async def run_rebinding_scenario():
+    """subscription ผ่าน check_target ตอนสมัครไปแล้ว แต่ตอนส่ง host ชี้เข้าเครื่องตัวเอง (DNS rebinding)"""
+    receivers = Receivers()
+    port = (await receivers.start(1))[0]
+    hub = WebhookHub(max_attempts=2, base_backoff_seconds=0.01)
+    hub.add(f"http://127.0.0.1:{port}/literal")
+    hub.add(f"http://localhost:{port}/rebound")
+    hub.publish([PriceChange("goldtraders", "gold_bar_965", "sell", 41200.0, 41300.0)])
+    await hub.flush(timeout=10)
+    result = {"received": receivers.received, "stats": hub.status()}
+    await hub.close()
+    await receivers.close()
+    return result
+
+
+class RecordingBackend:
+    def __init__(self):
+        self.connects = []
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        self.connects.append((host, port))
+        return "stream"
+
+
+async def check_targets(hub: WebhookHub, urls):
+    return [hub.validate(url, None, None, None, 0) or await hub.check_target(url) for url in urls]
+
+
+def test_webhook_delivery_to_many_endpoints():
+    result = asyncio.run(run_benchmark())
+    print(f"⏱️ {result['delivered']}/{result['queued']} webhooks delivered in {result['elapsed']:.3f}s "
+          f"(p50 {result['p50'] * 1000:.0f} ms, p95 {result['p95'] * 1000:.0f} ms)")
+    assert result["queued"] == ENDPOINTS
+    assert result["delivered"] == ENDPOINTS
+    assert result["signed"] is True
+    # filter products=["gold_bar_965"] -> ไม่มีราคารูปพรรณใน body
+    assert [change["product"] for change in result["payload"]["changes"]] == ["gold_bar_965"]
+    assert result["elapsed"] < DELIVERY_BUDGET_SECONDS
+
+
+def test_webhook_retry_gone_and_filters():
+    result = asyncio.run(run_retry_scenario())
+    assert result["flaky"] == [3]                    # 503, 500 แล้วสำเร็จในครั้งที่ 3
+    assert result["removed"] == [result["gone_id"]]  # 410 -> ยกเลิก subscription
+    assert result["shops_only"] is None              # filter ร้าน ไม่ได้รับราคาสมาคมฯ
+    assert result["stats"]["delivered"] == 1
+    assert result["stats"]["failed"] == 1            # 400 ไม่ retry
+    assert result["stats"]["retries"] == 2
+
+
+def test_full_queue_keeps_inflight_delivery():
+    result = asyncio.run(run_full_queue_scenario())
+    # งานที่กำลัง retry ไม่หลุด, งานที่รอเก่าสุด (version 1, 2) หลุดแทน
+    assert result["versions"] == [0, 3, 4]
+    assert result["attempts"] == [2, 1, 1]
+    assert result["stats"]["dropped"] == 2
+    assert result["stats"]["backlog"] == 0
+
+
+def test_private_targets_rejected():
+    blocked = ["http://127.0.0.1:8080/hook", "http://localhost/hook", "http://[::1]/hook", "http://[::ffff:10.0.0.1]/",
+               "http://169.254.169.254/latest/meta-data", "http://10.1.2.3/", "http://192.168.1.10/", "http://0.0.0.0/",
+               "ftp://example.com/hook"]
+    errors = asyncio.run(check_targets(WebhookHub(), blocked))
+    assert all(errors), list(zip(blocked, errors))
+    assert WebhookHub().validate("https://93.184.216.34/hook", None, None, None, 0) is None
+    assert asyncio.run(check_targets(WebhookHub(allow_private_targets=True), ["http://127.0.0.1:8080/hook"])) == [None]
+
+
+
+def test_private_address_blocked_at_connect_time():
+    result = asyncio.run(run_rebinding_scenario())
+    assert result["received"] == {}
+    assert result["stats"]["delivered"] == 0
+    assert result["stats"]["failed"] == 2
+    # IP สาธารณะ -> ต่อไปยัง IP ที่ตรวจแล้ว (pin) ด้วย backend เดิม
+    inner = RecordingBackend()
+    assert asyncio.run(PublicAddressBackend(inner).connect_tcp("93.184.216.34", 443)) == "stream"
+    assert inner.connects == [("93.184.216.34", 443)]
+
+
+if __name__ == "__main__":
+    test_webhook_delivery_to_many_endpoints()
+    test_webhook_retry_gone_and_filters()
+    test_full_queue_keeps_inflight_delivery()
+    test_private_targets_rejected()
+    test_private_address_blocked_at_connect_time()
+    print("✅ Webhook tests passed")
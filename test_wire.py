@@ -0,0 +1,153 @@
+import gzip
+import json
+import os
+import time
+
+import msgpack
+
+import wire
+from payloads import encode_json
+from prices import parse_price
+
+# เทียบ JSON (ปัจจุบัน) กับ msgpack view: ขนาด body (raw / gzip) + decode กลับได้ข้อมูลชุดเดียวกัน
+# เวลา encode / decode พิมพ์ไว้ดูเท่านั้น (ไม่ assert: ขึ้นกับเครื่อง / load ตอนรันเทสต์)
+# Run: python test_wire.py  (หรือ pytest test_wire.py -s)
+HISTORY_ROWS = int(os.getenv("WIRE_BENCH_ROWS", "5000"))
+REPEAT = int(os.getenv("WIRE_BENCH_REPEAT", "20"))
+
+
+def sample_rows(count: int):
+    rows = []
+    for i in range(count):
+        day, round_no = divmod(i, 30)
+        bar = 41000 + (i * 37) % 900 // 50 * 50
+        rows.append({
+            "date": f"{1 + day % 28:02d}/{1 + day // 28 % 12:02d}/2569",
+            "time": f"{9 + round_no // 4:02d}:{round_no % 4 * 15:02d}",
+            "round": str(round_no + 1),
+            "bullion_buy": f"{bar - 100:,.2f}",
+            "bullion_sell": f"{bar:,.2f}",
+            "ornament_buy": f"{(bar - 100) * 0.98:,.2f}",
+            "ornament_sell": f"{bar + 500:,.2f}",
+            "gold_spot": f"{2650 + i % 97 * 0.37:,.2f}",
+            "thb": f"{32.5 + i % 13 * 0.01:.2f}",
+            "change": "+50" if i % 3 == 0 else ("-50" if i % 3 == 1 else "0"),
+        })
+    return rows
+
+
+def sample_payloads():
+    rows = sample_rows(HISTORY_ROWS)
+    meta = {"source": "New Website", "cursor": "2026-10-19:30", "version": 42, "stale": False,
+            "age_seconds": 12, "updated_at": "2026-10-19 12:00:00"}
+    shops = [{
+        "name": name,
+        "data": {"gold_bar_965": {"buy": "41,100.00", "sell": "41,250.00"},
+                 "ornament_965": {"buy": "40,277.68", "sell": "42,300.00"}},
+        "error": None,
+    } for name in ("Aurora", "MTS Gold", "Hua Seng Heng", "Chin Hua Heng", "Ausiris")]
+    board = {
+        "status": "success", "market_status": "Open", **meta,
+        "latest": rows[-1], "history": rows[-20:],
+        "jewelry": [{"type": f"ทองรูปพรรณ 96.5% แบบ {i}", "buy": "96.5%", "sell": "-"} for i in range(6)],
+        "shops": shops,
+        "counts": {"history": len(rows), "jewelry": 6, "shops": len(shops)},
+    }
+    history = {"count": len(rows), **meta, "data": rows}
+    return {"board": (board, wire.board), "history": (history, wire.history)}
+
+
+def client_decode_json(body: bytes):
+    """สิ่งที่แอปต้องทำกับ JSON: parse แล้วแปลงราคาจากข้อความ "41,200.00" เป็นตัวเลขทุก cell"""
+    payload = json.loads(body)
+    rows = payload.get("data") or payload.get("history")
+    return [{key: parse_price(value) for key, value in row.items() if key not in ("date", "time")} for row in rows]
+
+
+def timed(fn, *args) -> float:
+    started = time.perf_counter()
+    for _ in range(REPEAT):
+        fn(*args)
+    return (time.perf_counter() - started) / REPEAT
+
+
+def run_benchmark():
+    results = {}
+    for name, (payload, view) in sample_payloads().items():
+        json_body = encode_json(payload)
+        binary_body = wire.encode_msgpack(view(payload))
+        decoded = msgpack.unpackb(binary_body)
+        results[name] = {
+            "json_bytes": len(json_body),
+            "msgpack_bytes": len(binary_body),
+            "json_gzip": len(gzip.compress(json_body, 6)),
+            "msgpack_gzip": len(gzip.compress(binary_body, 6)),
+            "json_encode": timed(encode_json, payload),
+            "msgpack_encode": timed(lambda: wire.encode_msgpack(view(payload))),
+            "json_decode": timed(client_decode_json, json_body),
+            "msgpack_decode": timed(msgpack.unpackb, binary_body),
+            "decoded": decoded,
+            "payload": payload,
+        }
+    return results
+
+
+def test_msgpack_smaller_and_round_trips():
+    results = run_benchmark()
+    print(f"\n{'payload':<8} {'json':>9} {'msgpack':>9} {'json.gz':>9} {'mp.gz':>8} "
+          f"{'enc json':>9} {'enc mp':>9} {'dec json':>9} {'dec mp':>9}")
+    for name, r in results.items():
+        print(f"{name:<8} {r['json_bytes']:>9,} {r['msgpack_bytes']:>9,} {r['json_gzip']:>9,} {r['msgpack_gzip']:>8,} "
+              f"{r['json_encode'] * 1000:>7.2f}ms {r['msgpack_encode'] * 1000:>7.2f}ms "
+              f"{r['json_decode'] * 1000:>7.2f}ms {r['msgpack_decode'] * 1000:>7.2f}ms")
+
+    for name, r in results.items():
+        assert r["msgpack_bytes"] < r["json_bytes"] / 2, name
+        assert r["msgpack_gzip"] < r["json_gzip"], name
+        view = sample_payloads()[name][1]
+        assert r["decoded"] == view(r["payload"]), name  # decode แล้วได้ view เดิมทุก field
+
+    # ข้อมูลตรงกับ JSON: ราคาเป็นสตางค์, history เป็น column
+    history = results["history"]
+    columns = history["decoded"]["data"]
+    last = history["payload"]["data"][-1]
+    assert history["decoded"]["schema"] == wire.WIRE_SCHEMA_VERSION
+    assert len(columns["bullion_sell"]) == HISTORY_ROWS
+    assert columns["bullion_sell"][-1] == round(parse_price(last["bullion_sell"]) * wire.PRICE_SCALE)
+    # ราคาทุก cell ตรงกับที่ client JSON parse ได้
+    json_rows = client_decode_json(encode_json(history["payload"]))
+    for name in ("bullion_buy", "bullion_sell", "ornament_buy", "ornament_sell", "gold_spot", "thb", "change"):
+        assert columns[name] == [round(row[name] * wire.PRICE_SCALE) for row in json_rows], name
+    assert columns["round"][-1] == int(last["round"])
+    assert columns["date"][-1] == last["date"]
+    board = results["board"]["decoded"]
+    assert board["shops"][0]["quotes"]["ornament_965"] == [4027768, 4230000]
+    assert board["jewelry"]["buy"][0] == 9650 and board["jewelry"]["sell"][0] is None
+
+
+def test_small_endpoint_views():
+    gold = wire.gold({"status": "success", "bullion_buy": "41,100.00", "ornament_buy": "40,277.68", "stale": False})
+    assert gold == {"status": "success", "bullion_buy": 4110000, "ornament_buy": 4027768, "stale": False, "schema": 1}
+    jewelry = msgpack.unpackb(wire.encode_msgpack(wire.jewelry({"count": 2, "data": [
+        {"type": "ทองรูปพรรณ 96.5%", "buy": "96.5%", "sell": "-"}, {"type": "ทองคำแท่ง", "buy": "99.5%", "sell": "100%"},
+    ]})))
+    assert jewelry["data"] == {"type": ["ทองรูปพรรณ 96.5%", "ทองคำแท่ง"], "buy": [9650, 9950], "sell": [None, 10000]}
+    shops = wire.shop_list({"count": 1, "data": sample_payloads()["board"][0]["shops"][:1]})
+    assert shops["data"][0]["quotes"]["gold_bar_965"] == [4110000, 4125000]
+    candles = {"count": 1, "data": [{"ts": "2026-10-19T09:00:00+07:00", "open": 41200.0, "close": 41250.0}]}
+    assert msgpack.unpackb(wire.encode_msgpack(wire.numeric(candles))) == {**candles, "schema": 1}
+
+
+def test_accept_negotiation():
+    assert wire.wants_msgpack("application/msgpack")
+    assert wire.wants_msgpack("application/x-msgpack, application/json;q=0.5")
+    assert not wire.wants_msgpack("application/msgpack;q=0.5, application/json")
+    assert not wire.wants_msgpack("*/*")
+    assert not wire.wants_msgpack("application/json")
+
+
+if __name__ == "__main__":
+    test_msgpack_smaller_and_round_trips()
+    test_small_endpoint_views()
+    test_accept_negotiation()
+    print("✅ Wire format tests passed")
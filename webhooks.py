@@ -0,0 +1,479 @@
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import random
+import secrets
+import socket
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Any, Callable, Deque, FrozenSet, Iterable, List, Optional, Tuple, TYPE_CHECKING
+from urllib.parse import urlsplit
+
+from alerts import FeedKey
+from prices import PRODUCTS, SIDES
+
+# import เฉพาะตอนเช็ค type -> httpx โหลดตอนส่ง webhook ครั้งแรก (ไม่ถ่วง startup)
+if TYPE_CHECKING:
+    import httpx
+
+# ==============================================================================
+# WEBHOOKS (push ราคาที่เปลี่ยนให้ partner แบบ server-to-server)
+# ==============================================================================
+EVENT_PRICE_CHANGED = "price.changed"
+SIGNATURE_HEADER = "X-Aurum-Signature"
+USER_AGENT = "aurum-thai-webhooks/1.0"
+PRIVATE_TARGET_ERROR = "URL must not point to a loopback, link-local or private address"
+
+
+def is_public_address(address: str) -> bool:
+    """IP ที่ส่ง webhook ไปได้: ไม่ใช่ loopback / link-local (metadata ของ cloud) / private / reserved"""
+    try:
+        ip = ipaddress.ip_address(address.split("%", 1)[0])
+    except ValueError:
+        return False
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+class PublicAddressBackend:
+    """
+    network backend ของ httpcore ที่ resolve ชื่อ host เองตอน connect แล้วต่อไปยัง IP ที่ตรวจแล้วเท่านั้น
+    - check_target() ตอนสมัครกัน DNS rebinding ไม่ได้ (ชื่อเดิมชี้ไป 127.0.0.1 / 169.254.169.254 ทีหลังได้)
+      -> ตรวจซ้ำทุกครั้งที่เปิด connection ใหม่ และ pin IP นั้น (TLS ยังใช้ชื่อ host เดิมเป็น SNI / ตรวจ cert)
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def connect_tcp(self, host: str, port: int, timeout: Optional[float] = None, local_address: Optional[str] = None,
+                          socket_options=None):
+        import httpcore
+        try:
+            infos = await asyncio.wait_for(
+                asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM), timeout
+            )
+        except (OSError, UnicodeError, asyncio.TimeoutError) as e:
+            raise httpcore.ConnectError(f"{host} does not resolve: {e}") from e
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        if not addresses or not all(is_public_address(address) for address in addresses):
+            raise httpcore.ConnectError(f"{host}: {PRIVATE_TARGET_ERROR}")
+        for i, address in enumerate(addresses):
+            try:
+                return await self.backend.connect_tcp(address, port, timeout=timeout, local_address=local_address,
+                                                      socket_options=socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout):
+                if i == len(addresses) - 1:
+                    raise
+
+    async def connect_unix_socket(self, path: str, timeout: Optional[float] = None, socket_options=None):
+        import httpcore
+        raise httpcore.ConnectError("Unix sockets are not allowed for webhooks")
+
+    async def sleep(self, seconds: float):
+        await self.backend.sleep(seconds)
+
+
+def sign(secret: str, timestamp: int, body: bytes) -> str:
+    """'t=<unix>,v1=<hex HMAC-SHA256 ของ "<t>." + body>' (ผู้รับตรวจ t ไม่เก่าเกินไปเพื่อกัน replay)"""
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def verify(secret: str, header: str, body: bytes, tolerance_seconds: int = 300,
+           now: Optional[float] = None) -> bool:
+    """ฝั่งผู้รับ: ตรวจ signature + อายุของ timestamp"""
+    parts = dict(part.split("=", 1) for part in header.split(",") if "=" in part)
+    try:
+        timestamp = int(parts["t"])
+    except (KeyError, ValueError):
+        return False
+    if abs((now or time.time()) - timestamp) > tolerance_seconds:
+        return False
+    return hmac.compare_digest(sign(secret, timestamp, body), f"t={timestamp},v1={parts.get('v1', '')}")
+
+
+@dataclass(frozen=True, slots=True)
+class PriceChange:
+    source: str         # "goldtraders" หรือชื่อร้าน
+    product: str
+    side: str
+    previous: float
+    price: float
+
+    @property
+    def feed(self) -> FeedKey:
+        return (self.source, self.product, self.side)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "source": self.source,
+            "product": self.product,
+            "side": self.side,
+            "price": self.price,
+            "previous": self.previous,
+            "change": round(self.price - self.previous, 2),
+        }
+
+
+@dataclass(slots=True)
+class Subscription:
+    id: int
+    url: str
+    secret: str
+    products: Optional[FrozenSet[str]] = None   # None = ทุกสินค้า
+    sources: Optional[FrozenSet[str]] = None    # None = สมาคมฯ + ทุกร้าน
+    sides: Optional[FrozenSet[str]] = None
+    min_change: float = 0.0                     # ส่งเมื่อราคาห่างจากที่ส่งครั้งก่อน >= เท่านี้ (บาท)
+    last_sent: Dict[FeedKey, float] = field(default_factory=dict)
+
+    def wants(self, change: PriceChange) -> bool:
+        if self.products is not None and change.product not in self.products:
+            return False
+        if self.sources is not None and change.source not in self.sources:
+            return False
+        if self.sides is not None and change.side not in self.sides:
+            return False
+        if self.min_change > 0:
+            reference = self.last_sent.get(change.feed, change.previous)
+            return abs(change.price - reference) >= self.min_change
+        return True
+
+    def to_record(self) -> List[Any]:
+        """รูปแบบกะทัดรัดสำหรับเก็บลง state store"""
+        return [self.url, self.secret, _listed(self.products), _listed(self.sources), _listed(self.sides),
+                self.min_change]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "url": self.url,
+            "products": _listed(self.products),
+            "sources": _listed(self.sources),
+            "sides": _listed(self.sides),
+            "min_change": self.min_change,
+        }
+
+
+def _listed(values: Optional[FrozenSet[str]]) -> Optional[List[str]]:
+    return sorted(values) if values is not None else None
+
+
+def _frozen(values: Optional[Iterable[str]]) -> Optional[FrozenSet[str]]:
+    return frozenset(values) if values else None
+
+
+@dataclass(slots=True)
+class Delivery:
+    event_id: str
+    body: bytes
+    created_at: float   # time.monotonic() ตอนราคาเปลี่ยน -> ใช้วัด latency
+    attempts: int = 0
+
+
+class EndpointQueue:
+    """คิวของ subscription เดียว: ส่งตามลำดับทีละงาน, ช่วง backoff ไม่ขวาง endpoint อื่น"""
+    __slots__ = ("pending", "inflight", "task", "failures")
+
+    def __init__(self, max_size: int):
+        self.pending: Deque[Delivery] = deque(maxlen=max_size)  # เต็ม -> งานที่รอเก่าสุดหลุด (ราคาใหม่กว่าสำคัญกว่า)
+        self.inflight: Optional[Delivery] = None  # งานที่กำลังส่ง / รอ retry อยู่นอก deque -> ไม่ถูกดันหลุดกลางทาง
+        self.task: Optional["asyncio.Task[None]"] = None
+        self.failures = 0
+
+    def __len__(self):
+        return len(self.pending) + (self.inflight is not None)
+
+
+class HostPool:
+    """client + ช่องส่งพร้อมกันของ 1 origin (scheme://host:port)"""
+    __slots__ = ("client", "semaphore")
+
+    def __init__(self, client: "httpx.AsyncClient", semaphore: asyncio.Semaphore):
+        self.client = client
+        self.semaphore = semaphore
+
+
+class WebhookHub:
+    """
+    Subscription store + change detection + delivery
+    - on_prices(): เทียบราคาเดิมต่อ feed แล้วคืน PriceChange (รอบแรกจำราคาอย่างเดียว)
+    - publish(): แต่ละ subscription ได้ 1 request ต่อรอบ (รวมทุกราคาที่ตรง filter), body เดียวกัน encode ครั้งเดียว
+    - ส่งผ่าน httpx.AsyncClient ต่อ host (keep-alive pool เล็ก ๆ) + semaphore ต่อ host และรวมทั้งระบบ
+      (pool เดียวที่มี request รอเป็นร้อยช้าลงแบบ O(n^2) ใน httpcore -> แยกต่อ host เร็วกว่าหลายเท่า)
+    - retry เฉพาะ 408 / 429 / 5xx / network error แบบ exponential backoff + jitter, 410 = ลบ subscription
+    """
+
+    def __init__(self, concurrency: int = 100, per_host: int = 10, timeout_seconds: float = 5.0,
+                 max_attempts: int = 5, max_queue: int = 100, base_backoff_seconds: float = 1.0, max_backoff_seconds: float = 300.0,
+                 max_subscriptions: int = 5000, allow_private_targets: bool = False,
+                 on_remove: Optional[Callable[[int], None]] = None):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout_seconds = timeout_seconds
+        self.max_attempts = max_attempts
+        self.max_queue = max_queue
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.max_subscriptions = max_subscriptions
+        self.allow_private_targets = allow_private_targets  # เปิดเฉพาะในเครือข่ายปิด / เทสต์
+        self.on_remove = on_remove
+        self._subscriptions: Dict[int, Subscription] = {}
+        self._queues: Dict[int, EndpointQueue] = {}
+        self._last_prices: Dict[FeedKey, float] = {}
+        self._next_id = 1
+        self._hosts: Dict[str, HostPool] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._latencies: Deque[float] = deque(maxlen=2000)
+        self.stats = {"events": 0, "queued": 0, "delivered": 0, "retries": 0, "failed": 0, "dropped": 0}
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+    # --- Subscription Store ---
+    def validate(self, url: str, products: Optional[List[str]], sources: Optional[List[str]],
+                 sides: Optional[List[str]], min_change: float) -> Optional[str]:
+        parts = urlsplit(url or "")
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            return "URL must be an absolute http(s) URL"
+        if not self.allow_private_targets:
+            host = parts.hostname.rstrip(".")
+            if host == "localhost" or host.endswith(".localhost"):
+                return PRIVATE_TARGET_ERROR
+            try:
+                ipaddress.ip_address(host)
+            except ValueError:
+                pass  # ชื่อ host -> ตรวจ IP ที่ resolve ได้ใน check_target()
+            else:
+                if not is_public_address(host):
+                    return PRIVATE_TARGET_ERROR
+        unknown = sorted(set(products or ()) - set(PRODUCTS))
+        if unknown:
+            return f"Unknown product(s) {', '.join(unknown)} (expected {', '.join(PRODUCTS)})"
+        unknown = sorted(set(sides or ()) - set(SIDES))
+        if unknown:
+            return f"Unknown side(s) {', '.join(unknown)} (expected buy/sell)"
+        if sources is not None and not all(sources):
+            return "Sources must be non-empty names"
+        if min_change < 0:
+            return "min_change must not be negative"
+        return None
+
+    async def check_target(self, url: str, timeout: float = 5.0) -> Optional[str]:
+        """resolve ชื่อ host แล้วตรวจทุก IP (กันชื่อที่ชี้เข้า 127.0.0.1 / 169.254.169.254 / เครือข่ายภายใน)"""
+        if self.allow_private_targets:
+            return None
+        parts = urlsplit(url)
+        try:
+            infos = await asyncio.wait_for(
+                asyncio.get_running_loop().getaddrinfo(parts.hostname, parts.port, type=socket.SOCK_STREAM), timeout
+            )
+        except (OSError, UnicodeError, asyncio.TimeoutError):
+            return f"URL host {parts.hostname} does not resolve"
+        if not infos or not all(is_public_address(info[4][0]) for info in infos):
+            return PRIVATE_TARGET_ERROR
+        return None
+
+    def add(self, url: str, products: Optional[Iterable[str]] = None, sources: Optional[Iterable[str]] = None,
+            sides: Optional[Iterable[str]] = None, min_change: float = 0.0, secret: Optional[str] = None,
+            subscription_id: Optional[int] = None) -> Subscription:
+        """secret / subscription_id ใช้ตอน restore จาก state store เท่านั้น (ปกติจะออกให้ใหม่)"""
+        if subscription_id is None and len(self._subscriptions) >= self.max_subscriptions:
+            raise ValueError(f"Too many webhooks (max {self.max_subscriptions})")
+        if subscription_id is None:
+            subscription_id = self._next_id
+        self._next_id = max(self._next_id, subscription_id + 1)
+        subscription = Subscription(
+            subscription_id, url, secret or secrets.token_hex(32),
+            _frozen(products), _frozen(sources), _frozen(sides), float(min_change)
+        )
+        self._subscriptions[subscription.id] = subscription
+        return subscription
+
+    def remove(self, subscription_id: int) -> bool:
+        if self._subscriptions.pop(subscription_id, None) is None:
+            return False
+        queue = self._queues.pop(subscription_id, None)
+        if queue is not None and queue.task is not None and queue.task is not asyncio.current_task():
+            queue.task.cancel()
+        if self.on_remove is not None:
+            self.on_remove(subscription_id)
+        return True
+
+    def subscriptions(self) -> List[Subscription]:
+        return [self._subscriptions[i] for i in sorted(self._subscriptions)]
+
+    # --- Change Detection ---
+    def on_prices(self, source: str, prices: Dict[Tuple[str, str], float]) -> List[PriceChange]:
+        """ป้อนราคาทั้งชุดของ source เดียว (ผลจาก association_prices / shop_prices) -> ราคาที่เปลี่ยน"""
+        changes = []
+        for (product, side), price in prices.items():
+            feed = (source, product, side)
+            previous = self._last_prices.get(feed)
+            self._last_prices[feed] = price
+            if previous is not None and previous != price:
+                changes.append(PriceChange(source, product, side, previous, price))
+        return changes
+
+    def publish(self, changes: List[PriceChange], **meta) -> int:
+        """จัดคิวส่งให้ทุก subscription ที่มีราคาตรง filter (ไม่รอผล) -> จำนวน delivery ที่เข้าคิว"""
+        if not changes or not self._subscriptions:
+            return 0
+        self.stats["events"] += 1
+        event_id = uuid.uuid4().hex
+        created_at = time.monotonic()
+        sent_at = int(time.time())
+        bodies: Dict[Tuple[int, ...], bytes] = {}
+        queued = 0
+        for subscription in self._subscriptions.values():
+            matched = tuple(i for i, change in enumerate(changes) if subscription.wants(change))
+            if not matched:
+                continue
+            body = bodies.get(matched)
+            if body is None:
+                # subscription ที่ filter ได้ชุดเดียวกันใช้ body เดียวกัน (ส่วนที่ต่างคือ signature)
+                body = bodies[matched] = json.dumps({
+                    "event": EVENT_PRICE_CHANGED,
+                    "id": event_id,
+                    "created": sent_at,
+                    "changes": [changes[i].to_dict() for i in matched],
+                    **meta,
+                }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            for i in matched:
+                subscription.last_sent[changes[i].feed] = changes[i].price
+            self._enqueue(subscription.id, Delivery(event_id, body, created_at))
+            queued += 1
+        self.stats["queued"] += queued
+        return queued
+
+    # --- Delivery ---
+    def _enqueue(self, subscription_id: int, delivery: Delivery):
+        queue = self._queues.get(subscription_id)
+        if queue is None:
+            queue = self._queues[subscription_id] = EndpointQueue(self.max_queue)
+        if len(queue.pending) == queue.pending.maxlen:
+            self.stats["dropped"] += 1  # หลุดเฉพาะงานที่ยังรอ ไม่ใช่งานที่กำลังส่ง (queue.inflight)
+        queue.pending.append(delivery)
+        if queue.task is None or queue.task.done():
+            queue.task = asyncio.create_task(self._drain(subscription_id, queue))
+
+    def _host_pool(self, url: str) -> "HostPool":
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        pool = self._hosts.get(origin)
+        if pool is None:
+            import httpx
+            if self._semaphore is None:
+                self._semaphore = asyncio.Semaphore(self.concurrency)
+            transport = httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(max_connections=self.per_host,
+                                    max_keepalive_connections=self.per_host, keepalive_expiry=60.0),
+            )
+            if not self.allow_private_targets:
+                # AsyncHTTPTransport ไม่เปิดให้ส่ง network_backend -> ห่อ backend ของ pool ที่สร้างไว้แล้ว
+                transport._pool._network_backend = PublicAddressBackend(transport._pool._network_backend)
+            pool = self._hosts[origin] = HostPool(
+                # ส่ง transport เอง -> httpx ไม่ใช้ proxy จาก env (proxy จะข้ามการตรวจ IP ข้างบน)
+                httpx.AsyncClient(
+                    timeout=self.timeout_seconds,
+                    transport=transport,
+                    headers={"User-Agent": USER_AGENT, "Content-Type": "application/json"},
+                ),
+                asyncio.Semaphore(self.per_host),
+            )
+        return pool
+
+    async def _drain(self, subscription_id: int, queue: EndpointQueue):
+        while queue.inflight is not None or queue.pending:
+            subscription = self._subscriptions.get(subscription_id)
+            if subscription is None:
+                return
+            if queue.inflight is None:
+                queue.inflight = queue.pending.popleft()
+            delivery = queue.inflight
+            delivery.attempts += 1
+            pool = self._host_pool(subscription.url)
+            # จองช่องของ host ก่อน -> host ที่ช้าไม่กินโควต้ารวมขณะรอคิวตัวเอง
+            async with pool.semaphore, self._semaphore:
+                status, retry_after = await self._post(pool.client, subscription, delivery)
+
+            if 200 <= status < 300:
+                queue.inflight = None
+                queue.failures = 0
+                self.stats["delivered"] += 1
+                self._latencies.append(time.monotonic() - delivery.created_at)
+                continue
+            if status == 410:
+                print(f"   🗑️ [Webhook] #{subscription_id} returned 410 Gone - unsubscribed")
+                self.remove(subscription_id)
+                return
+            retryable = status in (0, 408, 429) or status >= 500
+            if not retryable or delivery.attempts >= self.max_attempts:
+                queue.inflight = None
+                self.stats["failed"] += 1
+                print(f"   ⚠️ [Webhook] #{subscription_id} gave up on {delivery.event_id} "
+                      f"(status {status or 'network error'}, {delivery.attempts} attempts)")
+                continue
+
+            # backoff ต่อ endpoint (1, 2, 4, ... วินาที + jitter) หรือตาม Retry-After ของผู้รับ
+            queue.failures += 1
+            self.stats["retries"] += 1
+            delay = min(self.max_backoff_seconds, self.base_backoff_seconds * 2 ** (queue.failures - 1))
+            await asyncio.sleep(max(retry_after or 0.0, delay * random.uniform(0.8, 1.2)))
+
+    async def _post(self, client: "httpx.AsyncClient", subscription: Subscription,
+                    delivery: Delivery) -> Tuple[int, Optional[float]]:
+        """-> (HTTP status หรือ 0 ถ้า network error / timeout, Retry-After เป็นวินาที)"""
+        headers = {
+            SIGNATURE_HEADER: sign(subscription.secret, int(time.time()), delivery.body),
+            "X-Aurum-Event": EVENT_PRICE_CHANGED,
+            "X-Aurum-Delivery": delivery.event_id,
+            "X-Aurum-Attempt": str(delivery.attempts),
+        }
+        try:
+            response = await client.post(subscription.url, content=delivery.body, headers=headers)
+        except Exception:
+            return 0, None
+        retry_after = response.headers.get("retry-after")
+        try:
+            return response.status_code, float(retry_after) if retry_after else None
+        except ValueError:
+            return response.status_code, None
+
+    async def flush(self, timeout: Optional[float] = None):
+        """รอจนทุกคิวว่าง (ใช้ตอนปิดระบบ / ในเทสต์)"""
+        tasks = [queue.task for queue in self._queues.values() if queue.task is not None and not queue.task.done()]
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+
+    async def close(self, timeout: float = 5.0):
+        await self.flush(timeout)
+        for queue in self._queues.values():
+            if queue.task is not None:
+                queue.task.cancel()
+        for pool in self._hosts.values():
+            await pool.client.aclose()
+        self._hosts.clear()
+
+    def latency(self) -> Dict[str, Optional[float]]:
+        """latency ตั้งแต่ราคาเปลี่ยนจนผู้รับตอบ 2xx (ล่าสุดไม่เกิน 2,000 ครั้ง)"""
+        if not self._latencies:
+            return {"p50": None, "p95": None, "max": None}
+        ordered = sorted(self._latencies)
+        return {
+            "p50": round(ordered[len(ordered) // 2], 4),
+            "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+            "max": round(ordered[-1], 4),
+        }
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "subscriptions": len(self._subscriptions),
+            "backlog": sum(len(queue) for queue in self._queues.values()),
+            "latency_seconds": self.latency(),
+            **self.stats,
+        }
@@ -0,0 +1,168 @@
+from typing import Dict, Any, Iterable, List, Optional
+
+from compare import normalize_shop
+from payloads import parse_accept_encoding
+from prices import parse_price
+
+try:
+    import msgpack
+except ImportError:  # msgpack เป็น optional -> ถ้าไม่มีก็เสิร์ฟ JSON อย่างเดียว
+    msgpack = None
+
+# ==============================================================================
+# BINARY WIRE FORMAT (MessagePack สำหรับแอปมือถือ: ราคาเป็นจำนวนเต็ม, history แบบ columnar)
+# ==============================================================================
+# view ของ msgpack สร้างจาก payload JSON ตัวเดียวกันเสมอ -> ข้อมูลตรงกันทุก version, ต่างแค่รูปแบบ
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+WIRE_SCHEMA_VERSION = 1
+PRICE_SCALE = 100  # ราคาเป็นสตางค์ (41,200.00 -> 4120000), ราคารูปพรรณมีเศษสตางค์จึงใช้หน่วยบาทไม่ได้
+
+# (column, ชนิด) ของแถวประวัติราคาสมาคมฯ: str = ตามต้นทาง, int = จำนวนเต็ม, price = จำนวนเต็ม x PRICE_SCALE
+HISTORY_COLUMNS = (
+    ("date", "str"), ("time", "str"), ("round", "int"),
+    ("bullion_buy", "price"), ("bullion_sell", "price"), ("ornament_buy", "price"), ("ornament_sell", "price"),
+    ("gold_spot", "price"), ("thb", "price"), ("change", "price"),
+)
+JEWELRY_COLUMNS = (("type", "str"), ("buy", "price"), ("sell", "price"))
+
+
+def available() -> bool:
+    return msgpack is not None
+
+
+def wants_msgpack(accept: str) -> bool:
+    """เลือก msgpack เมื่อ client ขอชัดเจนและให้ q ไม่น้อยกว่า JSON (browser ส่ง */* -> ได้ JSON ตามเดิม)"""
+    if msgpack is None or "msgpack" not in accept:
+        return False
+    weights = parse_accept_encoding(accept)
+    binary = max(weights.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES)
+    return binary > 0 and binary >= weights.get("application/json", 0.0)
+
+
+def encode_msgpack(content: Any) -> bytes:
+    return msgpack.packb(content, use_bin_type=True)
+
+
+def scaled(value: Any) -> Optional[int]:
+    """"41,200.00" -> 4120000, "+50" -> 5000, "96.5%" -> 9650, อ่านไม่ได้ -> None"""
+    if isinstance(value, str):
+        value = value.rstrip("%")
+    number = parse_price(value)
+    return None if number is None else round(number * PRICE_SCALE)
+
+
+def _integer(value: Any) -> Optional[int]:
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+_CONVERTERS = {"str": lambda value: value, "int": _integer, "price": scaled}
+
+
+def columns(rows: Iterable[Dict[str, Any]], spec=HISTORY_COLUMNS) -> Dict[str, List[Any]]:
+    """[{date, time, ...}, ...] -> {"date": [...], "time": [...], ...} (ชื่อ key ส่งครั้งเดียว)"""
+    rows = list(rows)
+    return {name: [_CONVERTERS[kind](row.get(name)) for row in rows] for name, kind in spec}
+
+
+def row(values: Optional[Dict[str, Any]], spec=HISTORY_COLUMNS) -> Optional[Dict[str, Any]]:
+    if not values:
+        return None
+    return {name: _CONVERTERS[kind](values.get(name)) for name, kind in spec}
+
+
+def shops(results: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """ผลดิบของร้าน -> {"name", "quotes": {product: [buy, sell]}, "buy_back": [baht, gram] | None, "error"}"""
+    compact = []
+    for result in results:
+        shop = normalize_shop(result)
+        buy_back = shop["buy_back"]
+        compact.append({
+            "name": shop["name"],
+            "quotes": {
+                product: [scaled(quote["buy"]), scaled(quote["sell"])] for product, quote in shop["quotes"].items()
+            },
+            "buy_back": [scaled(buy_back["baht"]), scaled(buy_back["gram"])] if buy_back else None,
+            "error": shop["error"],
+        })
+    return compact
+
+
+# --- Views ต่อ endpoint (รับ payload JSON -> คืน dict สำหรับ msgpack) ---
+def board(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        **payload,
+        "schema": WIRE_SCHEMA_VERSION,
+        "latest": row(payload["latest"]),
+        "history": columns(payload["history"]),
+        "jewelry": columns(payload["jewelry"], JEWELRY_COLUMNS),
+        "shops": shops(payload["shops"]),
+    }
+
+
+def history(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return {**payload, "schema": WIRE_SCHEMA_VERSION, "data": columns(payload["data"])}
+
+
+def latest(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return {**payload, "schema": WIRE_SCHEMA_VERSION, "data": row(payload["data"])}
+
+
+def gold(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return {**payload, "schema": WIRE_SCHEMA_VERSION,
+            "bullion_buy": scaled(payload["bullion_buy"]), "ornament_buy": scaled(payload["ornament_buy"])}
+
+
+def jewelry(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return {**payload, "schema": WIRE_SCHEMA_VERSION, "data": columns(payload["data"], JEWELRY_COLUMNS)}
+
+
+def shop_list(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return {**payload, "schema": WIRE_SCHEMA_VERSION, "data": shops(payload["data"])}
+
+
+def numeric(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """payload ที่เป็นตัวเลขอยู่แล้ว (analytics / shops compare): field เหมือน JSON ทุกตัว"""
+    return {**payload, "schema": WIRE_SCHEMA_VERSION}
+
+
+def _describe(spec) -> Dict[str, str]:
+    return {name: kind for name, kind in spec}
+
+
+# เอกสาร schema ที่ GET /api/schema เสิร์ฟ (client ตรวจ "schema" ใน body ให้ตรงกับ version ที่รองรับ)
+SCHEMA = {
+    "schema": WIRE_SCHEMA_VERSION,
+    "media_type": MSGPACK_MEDIA_TYPE,
+    "negotiation": "Send Accept: application/msgpack. Responses without it (or when msgpack is unavailable) stay JSON.",
+    "types": {
+        "str": "string as published by the source",
+        "int": "integer or nil",
+        "price": f"integer = value x {PRICE_SCALE} (satang for THB, cents for USD spot, basis points for %) or nil",
+        "columns": "map of column name -> array, row i = index i of every array",
+    },
+    "price_scale": PRICE_SCALE,
+    "history_columns": _describe(HISTORY_COLUMNS),
+    "jewelry_columns": _describe(JEWELRY_COLUMNS),
+    "endpoints": {
+        "/api/board": {
+            "latest": "map (history_columns types)",
+            "history": "columns (history_columns)",
+            "jewelry": "columns (jewelry_columns)",
+            "shops": "array of {name, quotes: {product: [buy, sell]}, buy_back: [baht, gram] | nil, error}",
+            "other fields": "same as JSON",
+        },
+        "/api/history": {"data": "columns (history_columns), full and delta mode", "other fields": "same as JSON"},
+        "/api/latest": {"data": "map (history_columns types)", "other fields": "same as JSON"},
+        "/api/gold": {"bullion_buy": "price", "ornament_buy": "price", "other fields": "same as JSON"},
+        "/api/percent_jewelry": {"data": "columns (jewelry_columns)", "other fields": "same as JSON"},
+        "/api/shops": {"data": "same as /api/board shops", "other fields": "same as JSON"},
+        "/api/shops/compare": {"all fields": "same as JSON (already numeric)"},
+        "/api/analytics/candles": {"all fields": "same as JSON (already numeric)"},
+        "/api/analytics/indicators": {"all fields": "same as JSON (already numeric)"},
+        "/api/analytics/daily": {"all fields": "same as JSON (already numeric)"},
+    },
+}
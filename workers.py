@@ -0,0 +1,478 @@
+import asyncio
+import itertools
+import multiprocessing
+import os
+import signal
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, FrozenSet, Iterable, List, Optional, Set
+
+from asset_cache import AssetCache
+from browsers import BrowserPool
+from content_hash import ContentHashes
+from goldtraders import scrape_goldtraders
+from prices import ASSOCIATION_SOURCE
+from shop import scrape_all_shops
+
+# ==============================================================================
+# SCRAPER WORKERS (scrape ใน process ลูกที่มี browser ของตัวเอง -> API process แค่เสิร์ฟ cache)
+# ==============================================================================
+SHOPS_SCOPE = "shops"
+SCOPES = (ASSOCIATION_SOURCE, SHOPS_SCOPE)
+
+
+class ScraperUnavailable(RuntimeError):
+    """ไม่มี browser / worker ที่พร้อมทำงานในตอนนี้ (เช่น อยู่ในช่วง backoff หลัง crash)"""
+
+
+@dataclass(frozen=True)
+class ScraperSettings:
+    """ทุกอย่างที่ต้องใช้สร้าง browser + asset cache (pickle ส่งให้ process ลูกได้)"""
+    backends: Dict[str, List[str]]
+    routes: Dict[str, str]
+    connect_timeout_ms: int
+    asset_dir: str
+    asset_max_bytes: int
+    denylist: FrozenSet[str]
+    user_agent: str
+
+
+@dataclass(frozen=True)
+class WorkerLimits:
+    job_timeout_seconds: float = 300.0     # งานค้างเกินนี้ -> kill ทั้ง process group (รวม Chromium)
+    max_rss_bytes: int = 1024 * 1024 * 1024  # RSS รวมของ worker + Chromium ลูกๆ เกินนี้ -> restart หลังจบงาน
+    max_jobs: int = 500                    # recycle เป็นระยะ กัน memory ที่รั่วสะสมใน browser
+    nice: int = 5                          # ให้ API process ได้ CPU ก่อน
+    max_backoff_seconds: float = 60.0
+
+
+def parse_groups(spec: str) -> Dict[str, Set[str]]:
+    """'goldtraders;shops' -> worker ละ scope, 'goldtraders,shops' -> worker เดียวทำทั้งคู่"""
+    groups: Dict[str, Set[str]] = {}
+    for part in (spec or "").split(";"):
+        scopes = {scope.strip() for scope in part.split(",") if scope.strip() in SCOPES}
+        if scopes:
+            groups["+".join(sorted(scopes))] = scopes
+    assigned = set().union(*groups.values()) if groups else set()
+    for scope in SCOPES:
+        if scope not in assigned:
+            groups[scope] = {scope}
+    return groups
+
+
+def tree_rss_bytes(pid: int) -> Optional[int]:
+    """RSS รวมของ process + ลูกหลานทั้งหมด (Chromium, Playwright driver) จาก /proc (None = ไม่ใช่ Linux)"""
+    if not os.path.isdir("/proc"):
+        return None
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    children: Dict[int, List[int]] = {}
+    rss: Dict[int, int] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # field หลังชื่อ process (ชื่อมีช่องว่าง/วงเล็บได้): state, ppid, ..., rss (ลำดับที่ 21)
+        fields = stat[stat.rindex(")") + 2:].split()
+        children.setdefault(int(fields[1]), []).append(int(entry))
+        rss[int(entry)] = int(fields[21]) * page_size
+    if pid not in rss:
+        return None
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        total += rss.get(current, 0)
+        stack.extend(children.get(current, ()))
+    return total
+
+
+# ==============================================================================
+# ENGINE (browser + asset cache + การ scrape 1 รอบ: ใช้ได้ทั้งใน API process และใน worker)
+# ==============================================================================
+class ScrapeEngine:
+    def __init__(self, settings: ScraperSettings, asset_dir: Optional[str] = None):
+        self.settings = settings
+        self.browsers = BrowserPool(settings.backends, settings.routes, connect_timeout_ms=settings.connect_timeout_ms)
+        self.assets = AssetCache(asset_dir or settings.asset_dir, max_bytes=settings.asset_max_bytes,
+                                 denylist=settings.denylist)
+
+    async def start(self):
+        if self.browsers.running:
+            # ตื่นอยู่แล้ว -> แค่ health check / reconnect endpoint ที่หลุด
+            await self.browsers.check()
+            return
+        await self.browsers.start()
+
+    async def stop(self):
+        if not self.browsers.running:
+            return
+        print("💤 [System] Hibernate Mode... Shutting down Browser Engine")
+        await self.browsers.stop()
+
+    async def run(self, scopes: Iterable[str], source_type: str, hashes: ContentHashes) -> Dict[str, Any]:
+        """Scrape 1 รอบ -> {"gold": ผลจาก Gold Traders หรือ None, "shops": list ของร้าน หรือ None}"""
+        if not self.browsers.running:
+            raise ScraperUnavailable("Browser not running")
+        scopes = set(scopes)
+        result: Dict[str, Any] = {"gold": None, "shops": None}
+        # context ของรอบนี้ (1 ตัวต่อ backend ที่ถูกใช้) -> ปิดทั้งหมดใน finally
+        session = self.browsers.session(setup=self.assets.attach, user_agent=self.settings.user_agent)
+        try:
+            if ASSOCIATION_SOURCE in scopes:
+                result["gold"] = await scrape_goldtraders(session, source_type, hashes)
+            if SHOPS_SCOPE in scopes:
+                print("🏭 Scraping 5 Shops...")
+                try:
+                    result["shops"] = await scrape_all_shops(session)
+                except Exception as e:
+                    print(f"   ❌ Shop Scraping Error: {e}")
+            return result
+        finally:
+            # 🛡️ CLEANUP: Always close the context!
+            await session.close()
+            assets = self.assets.end_cycle()
+            if assets["hits"] or assets["misses"] or assets["blocked"]:
+                print(f"📦 [Assets] Saved {assets['bytes_saved'] / 1024:.0f} KB "
+                      f"(hit {assets['hits']} / miss {assets['misses']} / blocked {assets['blocked']})")
+
+    def status(self) -> Dict[str, Any]:
+        return {"browsers": self.browsers.status(), "assets": self.assets.status()}
+
+    def close(self):
+        self.assets.close()
+
+
+class InlineScraper:
+    """Scrape ใน API process เอง (แบบเดิม: SCRAPER_MODE=inline สำหรับเครื่องที่ RAM น้อย)"""
+
+    def __init__(self, settings: ScraperSettings):
+        self.engine = ScrapeEngine(settings)
+
+    async def start(self):
+        await self.engine.start()
+
+    async def hibernate(self):
+        await self.engine.stop()
+
+    async def scrape(self, scopes: Iterable[str], source_type: str, hashes: ContentHashes) -> Dict[str, Any]:
+        return await self.engine.run(scopes, source_type, hashes)
+
+    async def close(self):
+        await self.engine.stop()
+        self.engine.close()
+
+    def status(self) -> Dict[str, Any]:
+        return {"mode": "inline", **self.engine.status()}
+
+
+class DisabledScraper:
+    """SCRAPER_MODE=off: ไม่เปิด browser / ไม่ออก network เลย (เสิร์ฟจาก snapshot อย่างเดียว เช่น ตอนเทสต์)"""
+
+    async def start(self):
+        pass
+
+    async def hibernate(self):
+        pass
+
+    async def scrape(self, scopes: Iterable[str], source_type: str, hashes: ContentHashes) -> Dict[str, Any]:
+        raise ScraperUnavailable("Scraping disabled (SCRAPER_MODE=off)")
+
+    async def close(self):
+        pass
+
+    def status(self) -> Dict[str, Any]:
+        return {"mode": "off"}
+
+
+# ==============================================================================
+# WORKER PROCESS (ฝั่งลูก)
+# ==============================================================================
+def worker_main(name: str, conn, settings: ScraperSettings, nice: int):
+    """
+    Entry point ของ process ลูก: รับงานทาง Pipe ทีละงาน -> ตอบ (job_id, ok, ผลลัพธ์, status)
+    - process group ของตัวเอง: ฝั่ง API kill ทั้งกลุ่มได้ (Chromium ไม่ค้างเป็น orphan)
+    - Ctrl+C / SIGINT เป็นหน้าที่ของ API process (สั่ง exit ทาง Pipe)
+    """
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        os.nice(nice)
+    except (AttributeError, OSError):
+        pass
+    asyncio.run(_serve(name, conn, settings))
+
+
+async def _serve(name: str, conn, settings: ScraperSettings):
+    engine = ScrapeEngine(settings, asset_dir=os.path.join(settings.asset_dir, name))
+    try:
+        while True:
+            try:
+                job_id, kind, payload = await asyncio.to_thread(conn.recv)
+            except (EOFError, OSError):
+                break  # API process ปิด Pipe / ตายไปแล้ว
+            if kind == "exit":
+                break
+            try:
+                if kind == "scrape":
+                    await engine.start()
+                    hashes = ContentHashes(payload["known"])
+                    result = await engine.run(payload["scopes"], payload["source_type"], hashes)
+                    result["hash_counters"] = hashes.counters()
+                elif kind == "hibernate":
+                    await engine.stop()
+                    result = None
+                else:
+                    raise ValueError(f"Unknown job kind: {kind}")
+                reply = (job_id, True, result, engine.status())
+            except Exception as e:
+                reply = (job_id, False, f"{type(e).__name__}: {e}", engine.status())
+            conn.send(reply)
+    finally:
+        await engine.stop()
+        engine.close()
+
+
+# ==============================================================================
+# WORKER SUPERVISOR (ฝั่ง API process)
+# ==============================================================================
+class WorkerError(RuntimeError):
+    """Worker ตาย / งาน timeout / งานจบด้วย exception"""
+
+
+class ScraperWorker:
+    """
+    Process ลูก 1 ตัว + Pipe + การ restart
+    - ผลลัพธ์กลับมาทาง Pipe (pickle) -> อ่านด้วย loop.add_reader ไม่ต้องมี thread รอ
+    - ตายกลางงาน / timeout -> kill ทั้ง process group แล้ว spawn ใหม่ตอนงานถัดไป (backoff 2, 4, 8, ... วินาที)
+    - หลังจบงาน: RSS เกิน / ครบจำนวนงาน -> recycle
+    """
+
+    def __init__(self, name: str, scopes: Set[str], settings: ScraperSettings, limits: WorkerLimits):
+        self.name = name
+        self.scopes = scopes
+        self.settings = settings
+        self.limits = limits
+        self.process: Optional[multiprocessing.Process] = None
+        self.conn = None
+        self.spawns = 0
+        self.jobs = 0
+        self.failures = 0
+        self.retry_at = 0.0
+        self.last_error: Optional[str] = None
+        self.last_status: Optional[Dict[str, Any]] = None
+        self.rss_bytes: Optional[int] = None
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, "asyncio.Future[Any]"] = {}
+        self._lock = asyncio.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    def _spawn(self):
+        # spawn (ไม่ใช่ fork): process ลูกเริ่มสะอาด ไม่ติด event loop / thread ของ API ไปด้วย
+        context = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = context.Pipe()
+        process = context.Process(
+            target=worker_main, args=(self.name, child_conn, self.settings, self.limits.nice),
+            name=f"scraper-{self.name}", daemon=True
+        )
+        process.start()
+        child_conn.close()
+        self.process, self.conn = process, parent_conn
+        self.jobs = 0
+        self.spawns += 1
+        asyncio.get_running_loop().add_reader(parent_conn.fileno(), self._on_readable)
+        print(f"👷 [Worker] {self.name} started (pid {process.pid})")
+
+    def _on_readable(self):
+        conn = self.conn
+        try:
+            while conn.poll():
+                job_id, ok, payload, status = conn.recv()
+                self.last_status = status
+                future = self._pending.get(job_id)
+                if future is None or future.done():
+                    continue
+                if ok:
+                    future.set_result(payload)
+                else:
+                    future.set_exception(WorkerError(payload))
+        except (EOFError, OSError):
+            self._discard(f"exited (code {self.process.exitcode if self.process else None})")
+
+    def _discard(self, reason: str):
+        """ปิด Pipe + kill ทั้ง process group, งานที่ค้างอยู่ได้ WorkerError, ตั้ง backoff ก่อน spawn ใหม่"""
+        process, conn = self.process, self.conn
+        self.process, self.conn = None, None
+        if conn is not None:
+            try:
+                asyncio.get_running_loop().remove_reader(conn.fileno())
+            except (RuntimeError, ValueError, OSError):
+                pass
+            conn.close()
+        if process is not None:
+            kill_process_group(process)
+        self.failures += 1
+        self.last_error = reason
+        self.retry_at = time.monotonic() + min(self.limits.max_backoff_seconds, 2.0 ** self.failures)
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(WorkerError(f"{self.name} {reason}"))
+        self._pending.clear()
+        print(f"   ⚠️ [Worker] {self.name} {reason}")
+
+    async def ensure(self):
+        if self.alive:
+            return
+        if self.process is not None:
+            self._discard(f"exited (code {self.process.exitcode})")
+        if time.monotonic() < self.retry_at:
+            raise ScraperUnavailable(f"{self.name} restarting in {self.retry_at - time.monotonic():.0f}s")
+        self._spawn()
+
+    async def call(self, kind: str, payload: Any = None, timeout: Optional[float] = None) -> Any:
+        async with self._lock:
+            await self.ensure()
+            job_id = next(self._ids)
+            future = asyncio.get_running_loop().create_future()
+            self._pending[job_id] = future
+            try:
+                self.conn.send((job_id, kind, payload))
+                await asyncio.wait([future], timeout=timeout or self.limits.job_timeout_seconds)
+            except OSError as e:
+                self._discard(f"pipe broken ({e})")
+                raise WorkerError(f"{self.name} pipe broken")
+            finally:
+                self._pending.pop(job_id, None)
+            if not future.done():
+                self._discard(f"timed out after {timeout or self.limits.job_timeout_seconds:.0f}s")
+                raise WorkerError(f"{self.name} timed out")
+            if self.process is not None:
+                # worker ตอบกลับมาได้ (สำเร็จหรือ exception ในงาน) = process ยังปกติ
+                self.jobs += 1
+                self.failures = 0
+                await self._enforce_limits()
+            return future.result()
+
+    async def _enforce_limits(self):
+        if self.process is None:
+            return
+        self.rss_bytes = await asyncio.to_thread(tree_rss_bytes, self.process.pid)
+        if self.rss_bytes is not None and self.rss_bytes > self.limits.max_rss_bytes:
+            reason = f"RSS {self.rss_bytes / 1048576:.0f} MB > {self.limits.max_rss_bytes / 1048576:.0f} MB"
+        elif self.jobs >= self.limits.max_jobs:
+            reason = f"reached {self.jobs} jobs"
+        else:
+            return
+        print(f"♻️ [Worker] Recycling {self.name}: {reason}")
+        await self.stop()
+
+    async def hibernate(self):
+        if not self.alive:
+            return
+        try:
+            await self.call("hibernate", timeout=30)
+        except (WorkerError, ScraperUnavailable) as e:
+            print(f"   ⚠️ [Worker] {self.name} hibernate failed: {e}")
+
+    async def stop(self, grace_seconds: float = 10.0):
+        """สั่ง exit ทาง Pipe (worker ปิด browser เอง) -> เกินเวลาค่อย kill"""
+        process, conn = self.process, self.conn
+        if process is None:
+            return
+        self.process, self.conn = None, None
+        try:
+            asyncio.get_running_loop().remove_reader(conn.fileno())
+            conn.send((0, "exit", None))
+        except (RuntimeError, ValueError, OSError):
+            pass
+        await asyncio.to_thread(process.join, grace_seconds)
+        kill_process_group(process)
+        conn.close()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "scopes": sorted(self.scopes),
+            "pid": self.process.pid if self.alive else None,
+            "alive": self.alive,
+            "spawns": self.spawns,
+            "jobs": self.jobs,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "rss_mb": round(self.rss_bytes / 1048576, 1) if self.rss_bytes is not None else None,
+            **(self.last_status or {}),
+        }
+
+
+def kill_process_group(process: multiprocessing.Process):
+    """kill worker + ทุก process ในกลุ่มของมัน (Chromium) แม้ตัว worker จะออกไปแล้วก็ตาม"""
+    if process.pid is None:
+        return
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(process.pid, signal.SIGKILL)  # worker ตั้ง pgid = pid ของตัวเอง
+        elif process.exitcode is None:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+    process.join(timeout=5)
+
+
+class WorkerPool:
+    """
+    Worker process ต่อกลุ่ม scope (ค่าเริ่มต้น: Gold Traders 1 ตัว, ร้านทอง 1 ตัว -> ใช้ได้ 2 core, พังแยกกัน)
+    - scrape(): ส่งงานให้ทุก worker ที่เกี่ยวข้องพร้อมกัน แล้วรวมผล
+    - worker ตัวไหนพัง -> scope นั้นถือว่าล้มเหลวรอบนี้ (ตัวอื่นยังได้ผลปกติ)
+    """
+
+    def __init__(self, settings: ScraperSettings, groups: Dict[str, Set[str]],
+                 limits: Optional[WorkerLimits] = None):
+        limits = limits or WorkerLimits()
+        self.workers = {name: ScraperWorker(name, scopes, settings, limits) for name, scopes in groups.items()}
+
+    async def start(self):
+        # spawn ตอนมีงานจริง (ใน call) -> ไม่ต้องทำอะไรล่วงหน้า
+        return
+
+    async def hibernate(self):
+        await asyncio.gather(*(worker.hibernate() for worker in self.workers.values()))
+
+    async def scrape(self, scopes: Iterable[str], source_type: str, hashes: ContentHashes) -> Dict[str, Any]:
+        scopes = set(scopes)
+        calls = {}
+        for name, worker in self.workers.items():
+            wanted = scopes & worker.scopes
+            if wanted:
+                calls[name] = worker.call("scrape", {
+                    "scopes": wanted,
+                    "source_type": source_type,
+                    "known": hashes.known(),
+                })
+        replies = await asyncio.gather(*calls.values(), return_exceptions=True)
+
+        result: Dict[str, Any] = {"gold": None, "shops": None}
+        unavailable = 0
+        for name, reply in zip(calls, replies):
+            if isinstance(reply, BaseException):
+                if isinstance(reply, ScraperUnavailable):
+                    unavailable += 1
+                print(f"   ❌ [Worker] {name}: {reply}")
+                continue
+            hashes.absorb(reply.pop("hash_counters", {}))
+            for key, value in reply.items():
+                if value is not None:
+                    result[key] = value
+        if calls and unavailable == len(calls):
+            raise ScraperUnavailable("No scraper worker available")
+        return result
+
+    async def close(self):
+        await asyncio.gather(*(worker.stop() for worker in self.workers.values()))
+
+    def status(self) -> Dict[str, Any]:
+        return {"mode": "process", "workers": {name: worker.status() for name, worker in self.workers.items()}}